@@ -21,6 +21,8 @@ export default function App() {
     script,
     downloadUrl,
     previewUrl,
+    videoInfo,
+    previewAssets,
     errorMessage,
     generate,
     reset,
@@ -188,6 +190,8 @@ export default function App() {
                   key="result"
                   previewUrl={previewUrl}
                   downloadUrl={downloadUrl}
+                  videoInfo={videoInfo}
+                  previewAssets={previewAssets}
                   onReset={reset}
                 />
               )}
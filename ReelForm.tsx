@@ -6,9 +6,11 @@ import React, { useState } from 'react'
 import { motion } from 'framer-motion'
 import {
   Sparkles, Mic, Image, Music, Clock, Languages,
-  Subtitles, ChevronDown, Zap
+  Subtitles, ChevronDown, Zap, Film
 } from 'lucide-react'
-import type { ReelRequest, VideoStyle, VoiceGender, MusicGenre } from '../services/api'
+import type {
+  ReelRequest, VideoStyle, VoiceGender, MusicGenre, ExportProfile
+} from '../services/api'
 
 interface ReelFormProps {
   onSubmit: (request: ReelRequest) => void
@@ -31,6 +33,13 @@ const MUSIC_OPTIONS: { value: MusicGenre; label: string; emoji: string }[] = [
   { value: 'none', label: 'Sin música', emoji: '🔇' },
 ]
 
+const EXPORT_PROFILES: { value: ExportProfile; label: string }[] = [
+  { value: 'balanced', label: 'Equilibrado (recomendado)' },
+  { value: 'quality', label: 'Máxima calidad' },
+  { value: 'compact', label: 'Compacto (subida móvil)' },
+  { value: 'fast', label: 'Rápido' },
+]
+
 const TOPIC_SUGGESTIONS = [
   '5 hábitos que cambiarán tu vida para siempre',
   'Cómo ganar dinero mientras duermes',
@@ -47,6 +56,7 @@ export function ReelForm({ onSubmit, isLoading }: ReelFormProps) {
   const [music, setMusic] = useState<MusicGenre>('upbeat')
   const [duration, setDuration] = useState(30)
   const [addSubtitles, setAddSubtitles] = useState(true)
+  const [exportProfile, setExportProfile] = useState<ExportProfile>('balanced')
   const [showAdvanced, setShowAdvanced] = useState(false)
 
   const handleSubmit = (e: React.FormEvent) => {
@@ -61,6 +71,7 @@ export function ReelForm({ onSubmit, isLoading }: ReelFormProps) {
       music,
       duration_seconds: duration,
       add_subtitles: addSubtitles,
+      export_profile: exportProfile,
     })
   }
 
@@ -286,6 +297,23 @@ export function ReelForm({ onSubmit, isLoading }: ReelFormProps) {
                 <option value="en">🇺🇸 English</option>
               </select>
             </div>
+
+            <div className="flex items-center gap-3">
+              <label className="flex items-center gap-2 text-xs font-medium text-white/60">
+                <Film className="w-3.5 h-3.5" />
+                Exportación
+              </label>
+              <select
+                value={exportProfile}
+                onChange={(e) => setExportProfile(e.target.value as ExportProfile)}
+                disabled={isLoading}
+                className="input-dark py-2 text-xs flex-1"
+              >
+                {EXPORT_PROFILES.map(({ value, label }) => (
+                  <option key={value} value={value}>{label}</option>
+                ))}
+              </select>
+            </div>
           </motion.div>
         )}
       </div>
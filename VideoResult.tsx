@@ -2,20 +2,59 @@
  * Componente de resultado final: reproductor de video y botón de descarga.
  */
 
-import React, { useRef, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import { motion } from 'framer-motion'
 import { Download, Play, Pause, RotateCcw, Share2, Instagram } from 'lucide-react'
 import { toast } from 'react-hot-toast'
+import type { VideoOutput, PreviewAssets } from '../services/api'
 
 interface VideoResultProps {
   previewUrl: string
   downloadUrl: string
+  videoInfo?: VideoOutput | null
+  previewAssets?: PreviewAssets | null
   onReset: () => void
 }
 
-export function VideoResult({ previewUrl, downloadUrl, onReset }: VideoResultProps) {
+export function VideoResult({
+  previewUrl, downloadUrl, videoInfo, previewAssets, onReset
+}: VideoResultProps) {
   const videoRef = useRef<HTMLVideoElement>(null)
   const [isPlaying, setIsPlaying] = useState(false)
+  const hlsUrl = previewAssets?.hls_url
+
+  // Vista previa HLS: Safari la reproduce de forma nativa, el resto con
+  // hls.js (cargado solo si hace falta); sin HLS se usa el MP4 completo
+  useEffect(() => {
+    const video = videoRef.current
+    if (!video) return
+    if (!hlsUrl) {
+      video.src = previewUrl
+      return
+    }
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+      video.src = hlsUrl
+      return
+    }
+
+    let hls: { destroy: () => void } | null = null
+    let cancelled = false
+    import('hls.js').then(({ default: Hls }) => {
+      if (cancelled) return
+      if (!Hls.isSupported()) {
+        video.src = previewUrl
+        return
+      }
+      const player = new Hls()
+      player.loadSource(hlsUrl)
+      player.attachMedia(video)
+      hls = player
+    })
+    return () => {
+      cancelled = true
+      hls?.destroy()
+    }
+  }, [hlsUrl, previewUrl])
 
   const togglePlay = () => {
     if (!videoRef.current) return
@@ -77,7 +116,8 @@ export function VideoResult({ previewUrl, downloadUrl, onReset }: VideoResultPro
 
           <video
             ref={videoRef}
-            src={previewUrl}
+            poster={previewAssets?.poster_url}
+            preload="metadata"
             className="w-full h-full object-cover"
             loop
             playsInline
@@ -133,6 +173,11 @@ export function VideoResult({ previewUrl, downloadUrl, onReset }: VideoResultPro
           <Download className="w-5 h-5" />
           Descargar Reel (MP4)
         </button>
+        {videoInfo && (
+          <p className="text-center text-xs text-white/40">
+            {(videoInfo.size_bytes / 1e6).toFixed(1)} MB · {videoInfo.bitrate_kbps} kbps
+          </p>
+        )}
 
         {/* Acciones secundarias */}
         <div className="grid grid-cols-2 gap-3">
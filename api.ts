@@ -16,6 +16,8 @@ const api = axios.create({
 export type VideoStyle = 'cinematic' | 'vibrant' | 'minimal' | 'dark'
 export type VoiceGender = 'male' | 'female'
 export type MusicGenre = 'none' | 'upbeat' | 'ambient' | 'dramatic' | 'motivational'
+export type ReelFormat = '9:16' | '4:5' | '1:1'
+export type ExportProfile = 'quality' | 'balanced' | 'compact' | 'fast'
 
 export interface ReelRequest {
   topic: string
@@ -25,6 +27,12 @@ export interface ReelRequest {
   music: MusicGenre
   duration_seconds: number
   add_subtitles: boolean
+  formats?: ReelFormat[]
+  extra_languages?: string[]
+  export_profile?: ExportProfile
+  max_file_mb?: number
+  callback_url?: string
+  callback_events?: JobStatus[]
 }
 
 export interface ScriptScene {
@@ -52,16 +60,59 @@ export type JobStatus =
   | 'composing_video'
   | 'completed'
   | 'failed'
+  | 'cancelled'
+
+export interface VideoOutput {
+  format: ReelFormat
+  profile: ExportProfile
+  size_bytes: number
+  duration_seconds: number
+  bitrate_kbps: number
+}
+
+export interface PreviewAssets {
+  hls_url: string
+  poster_url: string
+  thumbnail_url: string
+}
+
+export interface WebhookDelivery {
+  event: string
+  url: string
+  attempts: number
+  delivered: boolean
+  status_code: number | null
+  error: string | null
+  delivered_at: string | null
+}
+
+export interface LanguageVariant {
+  language: string
+  script: ReelScript | null
+  download_url: string | null
+  download_urls: Partial<Record<ReelFormat, string>>
+  outputs: Partial<Record<ReelFormat, VideoOutput>>
+  error: string | null
+}
 
 export interface ReelJob {
   job_id: string
+  version: number
   status: JobStatus
   progress: number
   message: string
   download_url: string | null
+  download_urls: Partial<Record<ReelFormat, string>>
+  outputs: Partial<Record<ReelFormat, VideoOutput>>
+  preview: PreviewAssets | null
   script: ReelScript | null
+  language: string | null
+  variants: Record<string, LanguageVariant>
   error: string | null
   created_at: string | null
+  queue_position: number | null
+  eta_seconds: number | null
+  webhooks: WebhookDelivery[]
 }
 
 export interface HealthStatus {
@@ -93,6 +144,28 @@ export async function getJobStatus(jobId: string): Promise<ReelJob> {
   return response.data
 }
 
+/**
+ * Cambios del trabajo desde la versión `since`: null si no hubo (304);
+ * si los hubo, solo los campos modificados más job_id y version.
+ */
+export async function getJobStatusChanges(
+  jobId: string,
+  since: number
+): Promise<Partial<ReelJob> | null> {
+  const response = await api.get(`/status/${jobId}`, {
+    params: { since },
+    validateStatus: (status) => status === 200 || status === 304,
+  })
+  return response.status === 304 ? null : response.data
+}
+
+/**
+ * Cancela un trabajo en curso.
+ */
+export async function cancelJob(jobId: string): Promise<void> {
+  await api.post(`/job/${jobId}/cancel`)
+}
+
 /**
  * Retorna la URL de descarga del video.
  */
@@ -107,6 +180,18 @@ export function getPreviewUrl(jobId: string): string {
   return `${BASE_URL}/preview/${jobId}`
 }
 
+/**
+ * Retorna las URLs de la vista previa empaquetada (HLS, póster y miniatura).
+ */
+export function getPreviewAssets(jobId: string): PreviewAssets {
+  const base = `${BASE_URL}/preview/${jobId}`
+  return {
+    hls_url: `${base}/index.m3u8`,
+    poster_url: `${base}/poster.jpg`,
+    thumbnail_url: `${base}/thumb.gif`,
+  }
+}
+
 /**
  * Verifica el estado de salud del servidor y APIs configuradas.
  */
@@ -117,7 +202,9 @@ export async function checkHealth(): Promise<HealthStatus> {
 
 /**
  * Polling del estado de un trabajo hasta que termine.
- * Llama al callback onUpdate con cada actualización.
+ * Llama al callback onUpdate con cada actualización. Tras la primera
+ * consulta completa solo se piden los cambios (`since`), así las
+ * consultas sin novedades no transfieren el guion ni el resto del trabajo.
  */
 export async function pollJobStatus(
   jobId: string,
@@ -125,9 +212,16 @@ export async function pollJobStatus(
   intervalMs: number = 2000
 ): Promise<ReelJob> {
   return new Promise((resolve, reject) => {
+    let job: ReelJob | null = null
     const interval = setInterval(async () => {
       try {
-        const job = await getJobStatus(jobId)
+        if (job === null) {
+          job = await getJobStatus(jobId)
+        } else {
+          const changes = await getJobStatusChanges(jobId, job.version)
+          if (changes === null) return
+          job = { ...job, ...changes }
+        }
         onUpdate(job)
 
         if (job.status === 'completed') {
@@ -136,6 +230,9 @@ export async function pollJobStatus(
         } else if (job.status === 'failed') {
           clearInterval(interval)
           reject(new Error(job.error || 'Error desconocido en la generación'))
+        } else if (job.status === 'cancelled') {
+          clearInterval(interval)
+          reject(new Error('La generación fue cancelada'))
         }
       } catch (error) {
         clearInterval(interval)
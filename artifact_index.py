@@ -0,0 +1,159 @@
+"""
+Índice de los archivos de cada trabajo (SQLite embebido).
+Guarda ruta, tipo y tamaño de los videos, vistas previas, ZIP de lotes y
+directorios temporales de cada trabajo. Borrar un trabajo o aplicar la
+retención (max_file_age_hours) consulta el índice en lugar de recorrer
+directorios, así el coste no crece con el número de trabajos en disco.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from app.config import settings
+from app.services.executors import run_io
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_job ON artifacts(job_id);
+CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts(created_at);
+"""
+
+
+# Índices ya inicializados (WAL y esquema) en este proceso
+_initialized: set[str] = set()
+_init_lock = threading.Lock()
+
+
+def index_path() -> str:
+    return os.path.join(settings.temp_dir, "artifacts.sqlite3")
+
+
+def _initialize(conn: sqlite3.Connection, path: str) -> None:
+    """Activa WAL (persiste en el archivo) y crea el esquema, una vez por proceso."""
+    with _init_lock:
+        if path in _initialized:
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(path)
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    """Conexión al índice (una por operación, desde el pool de E/S)."""
+    path = index_path()
+    if path not in _initialized:
+        os.makedirs(settings.temp_dir, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        _initialize(conn, path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _size(path: str) -> int:
+    """Tamaño de un archivo o, si es un directorio, de todo su contenido."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def record_sync(job_id: str, paths: list[str], kind: str, from_mtime: bool = False) -> None:
+    """
+    Versión bloqueante de record() (para código que ya corre en el pool de E/S).
+    Con `from_mtime` la antigüedad es la fecha de modificación de cada archivo
+    en vez de ahora (archivos ya existentes, p. ej. al migrar).
+    """
+    rows = []
+    now = time.time()
+    for path in paths:
+        try:
+            created_at = os.stat(path).st_mtime if from_mtime else now
+            rows.append((path, job_id, kind, _size(path), created_at))
+        except FileNotFoundError:
+            continue
+    if not rows:
+        return
+    with _connect() as conn:
+        # Si la ruta ya estaba se actualiza el tamaño pero conserva su antigüedad
+        conn.executemany(
+            """INSERT INTO artifacts (path, job_id, kind, size_bytes, created_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET size_bytes = excluded.size_bytes""",
+            rows
+        )
+
+
+async def record(job_id: str, paths: list[str], kind: str) -> None:
+    """
+    Registra archivos o directorios de un trabajo con su tamaño actual.
+    Los que no existen se omiten.
+
+    Args:
+        kind: "output", "preview", "archive" o "temp"
+    """
+    await run_io(record_sync, job_id, paths, kind)
+
+
+def _artifacts(job_id: str) -> list[tuple[str, str, int]]:
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT path, kind, size_bytes FROM artifacts WHERE job_id = ?", (job_id,)
+        ).fetchall()
+
+
+async def artifacts(job_id: str) -> list[tuple[str, str, int]]:
+    """Archivos registrados de un trabajo: (ruta, tipo, tamaño)."""
+    return await run_io(_artifacts, job_id)
+
+
+def _forget(job_id: str) -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+
+
+async def forget(job_id: str) -> None:
+    """Quita del índice los archivos de un trabajo (ya borrados)."""
+    await run_io(_forget, job_id)
+
+
+def _expired_jobs(max_age_seconds: float) -> list[str]:
+    cutoff = time.time() - max_age_seconds
+    with _connect() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT DISTINCT job_id FROM artifacts WHERE created_at < ?", (cutoff,)
+        )]
+
+
+async def expired_jobs(max_age_seconds: float) -> list[str]:
+    """Trabajos con algún archivo registrado hace más de `max_age_seconds`."""
+    return await run_io(_expired_jobs, max_age_seconds)
+
+
+def _totals() -> tuple[int, int]:
+    with _connect() as conn:
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM artifacts"
+        ).fetchone()
+    return count, size
+
+
+async def totals() -> tuple[int, int]:
+    """(número de archivos, bytes) registrados en el índice."""
+    return await run_io(_totals)
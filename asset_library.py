@@ -0,0 +1,259 @@
+"""
+Biblioteca local de imágenes ya obtenidas.
+Cada imagen que llega de DALL-E o Pexels se guarda (por hash de contenido)
+junto con las palabras clave normalizadas de su visual_prompt, el estilo y
+la fuente (que determina su licencia) en un índice invertido SQLite. Antes
+de llamar a los proveedores se busca una imagen de un prompt parecido: si
+la similitud supera asset_library_min_score se reutiliza sin coste ni espera.
+"""
+
+import os
+import math
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.config import settings
+from app.services.executors import run_io
+from app.services.metrics import metrics
+
+
+# Palabras sin valor para buscar (inglés, idioma de los visual_prompt)
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "for", "with", "and", "or", "to",
+    "by", "from", "is", "are", "its", "their", "into", "over", "under", "while",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT UNIQUE NOT NULL,
+    path TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    style TEXT NOT NULL,
+    source TEXT NOT NULL,
+    keyword_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    keyword TEXT NOT NULL,
+    asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+    PRIMARY KEY (keyword, asset_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS assets_style ON assets(style);
+CREATE INDEX IF NOT EXISTS assets_last_used ON assets(last_used);
+"""
+
+
+def library_dir() -> str:
+    return settings.asset_library_dir
+
+
+def extract_keywords(text: str) -> list[str]:
+    """
+    Palabras clave normalizadas de un prompt, en orden y sin repetir:
+    minúsculas, sin acentos ni puntuación y sin palabras vacías.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+    words = [w for w in text.split() if w not in STOP_WORDS and len(w) > 1]
+    return list(dict.fromkeys(words))
+
+
+# Índices ya inicializados (WAL y esquema) en este proceso
+_initialized: set[str] = set()
+_init_lock = threading.Lock()
+
+
+def _initialize(conn: sqlite3.Connection, path: str) -> None:
+    """Activa WAL (persiste en el archivo) y crea el esquema, una vez por proceso."""
+    with _init_lock:
+        if path in _initialized:
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(path)
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    """Conexión al índice (una por operación, desde el pool de E/S)."""
+    path = os.path.join(library_dir(), "index.sqlite3")
+    if path not in _initialized:
+        os.makedirs(library_dir(), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        _initialize(conn, path)
+        conn.execute("PRAGMA foreign_keys=ON")   # Es por conexión: siempre
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _link(source: str, dest: str) -> None:
+    """Hard link de `source` en `dest` (copia si están en discos distintos)."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+def _find(keywords: list[str], style: str, exclude: set[int]) -> Optional[tuple]:
+    """Mejor imagen del estilo para las palabras clave: (id, ruta, fuente, similitud)."""
+    if not keywords:
+        return None
+
+    with _connect() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+        marks = ",".join("?" * len(keywords))
+        # Frecuencia de documento de cada palabra, para pesarlas con IDF
+        df = dict(conn.execute(
+            f"SELECT keyword, COUNT(*) FROM keywords WHERE keyword IN ({marks}) GROUP BY keyword",
+            keywords
+        ).fetchall())
+        candidates = conn.execute(
+            f"""SELECT a.id, a.path, a.source, a.keyword_count, group_concat(k.keyword, ' ')
+                FROM keywords k JOIN assets a ON a.id = k.asset_id
+                WHERE k.keyword IN ({marks}) AND a.style = ?
+                GROUP BY a.id""",
+            (*keywords, style)
+        ).fetchall()
+
+    def idf(word: str) -> float:
+        return math.log(1 + total / df.get(word, 1))
+
+    # Coseno entre conjuntos de palabras pesadas con IDF; las palabras de la
+    # imagen que no están en el prompt cuentan con un peso medio
+    query_weight = sum(idf(w) ** 2 for w in keywords)
+    mean_weight = query_weight / len(keywords)
+    best = None
+    for asset_id, path, source, count, matched in candidates:
+        if asset_id in exclude:
+            continue
+        shared = matched.split()
+        shared_weight = sum(idf(w) ** 2 for w in shared)
+        asset_weight = shared_weight + (count - len(shared)) * mean_weight
+        score = shared_weight / math.sqrt(query_weight * asset_weight)
+        if best is None or score > best[3]:
+            best = (asset_id, path, source, score)
+    return best
+
+
+def _lookup(
+    visual_prompt: str,
+    style: str,
+    dest: str,
+    exclude: set[int]
+) -> Optional[tuple[int, str]]:
+    match = _find(extract_keywords(visual_prompt), style, exclude)
+    if match is None or match[3] < settings.asset_library_min_score:
+        return None
+
+    asset_id, path, source, score = match
+    try:
+        _link(path, dest)
+    except FileNotFoundError:
+        # Archivo borrado a mano: se quita del índice
+        with _connect() as conn:
+            conn.execute("DELETE FROM assets WHERE id = ?", (asset_id,))
+        return None
+
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE assets SET uses = uses + 1, last_used = ? WHERE id = ?",
+            (time.time(), asset_id)
+        )
+    print(f"[AssetLibrary] Reutilizada imagen {asset_id} de {source} (similitud {score:.2f})")
+    return asset_id, source
+
+
+async def lookup(
+    visual_prompt: str,
+    style: str,
+    dest: str,
+    exclude: Optional[set[int]] = None
+) -> Optional[tuple[int, str]]:
+    """
+    Busca en la biblioteca una imagen para el prompt y, si la similitud
+    supera el umbral, la enlaza en `dest`.
+
+    Args:
+        exclude: IDs ya usados en este reel (para no repetir imagen)
+
+    Returns:
+        (id de la imagen, fuente) o None si no hay una parecida
+    """
+    try:
+        result = await run_io(_lookup, visual_prompt, style, dest, exclude or set())
+    except (OSError, sqlite3.Error) as e:
+        print(f"[AssetLibrary] Búsqueda fallida: {e}")
+        result = None
+    metrics.increment("asset_library_hits" if result else "asset_library_misses")
+    return result
+
+
+def _store(image_path: str, visual_prompt: str, style: str, source: str) -> int:
+    with open(image_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    keywords = extract_keywords(visual_prompt)
+    path = os.path.join(library_dir(), digest[:2], f"{digest}.png")
+    if not os.path.exists(path):
+        _link(image_path, path)
+
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute("SELECT id FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+        if row:
+            return row[0]
+        asset_id = conn.execute(
+            """INSERT INTO assets
+               (sha256, path, prompt, style, source, keyword_count, created_at, last_used)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (digest, path, visual_prompt, style, source, len(keywords), now, now)
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO keywords (keyword, asset_id) VALUES (?, ?)",
+            [(word, asset_id) for word in keywords]
+        )
+        _evict(conn)
+    return asset_id
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    """Quita las imágenes usadas hace más tiempo si se supera asset_library_max_assets."""
+    excess = conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0] - settings.asset_library_max_assets
+    if excess <= 0:
+        return
+    for asset_id, path in conn.execute(
+        "SELECT id, path FROM assets ORDER BY last_used LIMIT ?", (excess,)
+    ).fetchall():
+        conn.execute("DELETE FROM assets WHERE id = ?", (asset_id,))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def store(image_path: str, visual_prompt: str, style: str, source: str) -> Optional[int]:
+    """
+    Añade a la biblioteca una imagen obtenida de un proveedor.
+    Es opcional: si falla, el trabajo sigue con su imagen.
+
+    Returns:
+        ID de la imagen en la biblioteca (el existente si ya estaba)
+    """
+    try:
+        return await run_io(_store, image_path, visual_prompt, style, source)
+    except (OSError, sqlite3.Error) as e:
+        print(f"[AssetLibrary] No se pudo guardar {image_path}: {e}")
+        return None
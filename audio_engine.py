@@ -0,0 +1,214 @@
+"""
+Motor de audio en proceso.
+Decodifica cada clip de narración a PCM una sola vez, los une con fundidos
+cruzados cortos, mezcla la cama musical con ducking (la música baja cuando
+hay voz) y escribe una única pista que luego se codifica una sola vez.
+Así no hay concat con `-c copy` entre MP3 de distintos proveedores ni
+recodificaciones intermedias.
+"""
+
+import wave
+from typing import Optional
+from app.config import settings
+from app.services.executors import run_io
+from app.services.processes import ffmpeg_output
+
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# Duración mínima de un clip en la mezcla: una escena sin voz (clip vacío)
+# se rellena con silencio para que su imagen siga apareciendo
+MIN_CLIP_SECONDS = 0.5
+
+
+async def decode(path: str):
+    """Decodifica cualquier audio a PCM float32 estéreo 44.1 kHz, forma (muestras, 2)."""
+    import numpy as np
+
+    raw = await ffmpeg_output([
+        "ffmpeg", "-v", "error",
+        "-i", path,
+        "-f", "f32le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE),
+        "pipe:1"
+    ])
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+async def load_music(path: str):
+    """
+    Cama musical ya normalizada (WAV 16 bits estéreo 44.1 kHz de la
+    biblioteca): se lee directo con wave y NumPy, sin lanzar FFmpeg. Si el
+    archivo tiene otro formato se decodifica como cualquier audio.
+    """
+    try:
+        return await run_io(read_wav, path)
+    except (wave.Error, ValueError):
+        return await decode(path)
+
+
+async def render_mix(
+    narration_files: list[str],
+    music_pcm_path: Optional[str],
+    output_wav: str
+) -> list[float]:
+    """
+    Genera la pista final (narración + música con ducking) como WAV.
+
+    Returns:
+        Duración en segundos de cada clip de narración dentro de la mezcla
+    """
+    clips = [await decode(path) for path in narration_files]
+    music = await load_music(music_pcm_path) if music_pcm_path else None
+
+    # El cálculo es NumPy vectorizado (libera el GIL): basta con un hilo
+    return await run_io(_mix_to_file, clips, music, output_wav)
+
+
+def _mix_to_file(clips: list, music, output_wav: str) -> list[float]:
+    voice, clip_durations = concat_crossfade(
+        clips, settings.audio_crossfade_ms / 1000
+    )
+    mix = voice
+    if music is not None and len(music):
+        bed = music_bed(music, len(voice))
+        mix = voice + duck(bed, voice, settings.music_ducking_db)
+
+    write_wav(output_wav, limit(mix))
+    return clip_durations
+
+
+def concat_crossfade(clips: list, crossfade: float) -> tuple:
+    """
+    Une los clips solapando `crossfade` segundos con un fundido de igual
+    potencia, para que no se oigan clics ni silencios en las costuras.
+    Los clips vacíos o muy cortos se completan con silencio: siempre hay
+    una duración por clip, alineada con las imágenes de las escenas.
+
+    Returns:
+        (audio, duración efectiva de cada clip en la mezcla)
+    """
+    import numpy as np
+
+    if not clips:
+        return np.zeros((0, CHANNELS), dtype=np.float32), []
+
+    fade = int(crossfade * SAMPLE_RATE)
+    min_length = max(int(MIN_CLIP_SECONDS * SAMPLE_RATE), 2 * fade + 1)
+    clips = [
+        c if len(c) >= min_length
+        else np.concatenate([c, np.zeros((min_length - len(c), CHANNELS), dtype=np.float32)])
+        for c in clips
+    ]
+    total = sum(len(c) for c in clips) - fade * (len(clips) - 1)
+    out = np.zeros((max(total, 1), CHANNELS), dtype=np.float32)
+
+    t = np.linspace(0.0, np.pi / 2, fade, dtype=np.float32)[:, None]
+    fade_in, fade_out = np.sin(t), np.cos(t)
+
+    position = 0
+    durations = []
+    for i, clip in enumerate(clips):
+        clip = clip.copy()
+        overlap = min(fade, len(clip))
+        if i > 0 and overlap:
+            clip[:overlap] *= fade_in[:overlap]
+        if i < len(clips) - 1 and overlap:
+            clip[-overlap:] *= fade_out[-overlap:]
+
+        out[position:position + len(clip)] += clip
+        step = len(clip) - (fade if i < len(clips) - 1 else 0)
+        durations.append(round(step / SAMPLE_RATE, 3))
+        position += step
+
+    return out, durations
+
+
+def music_bed(music, length: int, fade_in: float = 1.0, fade_out: float = 2.0):
+    """Repite la música hasta `length` muestras y le aplica fundido de entrada y salida."""
+    import numpy as np
+
+    repeats = -(-length // len(music))
+    bed = np.tile(music, (repeats, 1))[:length].copy()
+
+    fade_in_n = min(int(fade_in * SAMPLE_RATE), length // 4)
+    fade_out_n = min(int(fade_out * SAMPLE_RATE), length // 4)
+    if fade_in_n:
+        bed[:fade_in_n] *= np.linspace(0.0, 1.0, fade_in_n, dtype=np.float32)[:, None]
+    if fade_out_n:
+        bed[-fade_out_n:] *= np.linspace(1.0, 0.0, fade_out_n, dtype=np.float32)[:, None]
+    return bed
+
+
+def duck(
+    music,
+    voice,
+    depth_db: float,
+    threshold_db: float = -40.0,
+    attack: float = 0.05,
+    release: float = 0.4,
+    block: float = 0.01
+):
+    """
+    Ducking tipo sidechain: la voz controla la ganancia de la música.
+    Se mide el nivel de la voz en bloques de 10 ms; sobre el umbral, la
+    música baja hasta `depth_db`, con ataque rápido y liberación lenta.
+    """
+    import numpy as np
+
+    block_n = int(block * SAMPLE_RATE)
+    n_blocks = -(-len(voice) // block_n)
+    padded = np.zeros((n_blocks * block_n, CHANNELS), dtype=np.float32)
+    padded[:len(voice)] = voice
+
+    rms = np.sqrt(np.mean(padded.reshape(n_blocks, -1) ** 2, axis=1) + 1e-12)
+    level_db = 20 * np.log10(rms)
+    # Reducción objetivo por bloque: 0 dB sin voz, depth_db con voz clara
+    target_db = depth_db * np.clip((level_db - threshold_db) / 10.0, 0.0, 1.0)
+
+    # Envolvente con ataque/liberación (recursión de un polo, un paso por bloque)
+    attack_coef = np.exp(-block / attack)
+    release_coef = np.exp(-block / release)
+    gain_db = np.empty(n_blocks, dtype=np.float32)
+    current = 0.0
+    for i, target in enumerate(target_db):
+        coef = attack_coef if target < current else release_coef
+        current = target + coef * (current - target)
+        gain_db[i] = current
+
+    # Interpolar la ganancia por bloque a cada muestra
+    centers = (np.arange(n_blocks) + 0.5) * block_n
+    gain = 10 ** (np.interp(np.arange(len(music)), centers, gain_db) / 20)
+    return music * gain[:, None].astype(np.float32)
+
+
+def limit(audio, ceiling: float = 0.98):
+    """Evita la saturación escalando la mezcla si algún pico supera el techo."""
+    import numpy as np
+
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    return audio * (ceiling / peak) if peak > ceiling else audio
+
+
+def read_wav(path: str):
+    """Lee un WAV 16 bits estéreo 44.1 kHz como PCM float32, forma (muestras, 2)."""
+    import numpy as np
+
+    with wave.open(path, "rb") as wav:
+        if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != (CHANNELS, 2, SAMPLE_RATE):
+            raise ValueError(f"{path} no es PCM 16 bits estéreo a {SAMPLE_RATE} Hz")
+        frames = wav.readframes(wav.getnframes())
+    pcm = np.frombuffer(frames, dtype="<i2").reshape(-1, CHANNELS)
+    return pcm.astype(np.float32) / 32768.0
+
+
+def write_wav(path: str, audio) -> None:
+    """Escribe PCM float como WAV 16 bits estéreo."""
+    import numpy as np
+
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
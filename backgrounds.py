@@ -0,0 +1,229 @@
+"""
+Fondos procedurales para escenas sin imagen de proveedor.
+Se calculan con operaciones vectorizadas de NumPy (gradiente lineal, radial,
+ruido suave y tarjeta de texto difuminada) y se guardan una sola vez por
+variante, paleta y resolución como fotograma RGB crudo, que el compositor
+pasa directo a FFmpeg (demuxer rawvideo) sin codificar ni decodificar PNG.
+Las tarjetas de texto son únicas de cada escena: se escriben en el
+directorio del trabajo y se borran con él, sin pasar por el caché.
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+from typing import Dict, Optional
+from app.config import settings
+from app.models.reel import VideoStyle
+from app.services.executors import run_cpu
+
+
+# Paletas de colores (inicio, fin) para los fondos
+PALETTES = [
+    [(48, 25, 52), (89, 57, 161)],    # Púrpura
+    [(26, 35, 126), (21, 101, 192)],   # Azul
+    [(27, 94, 32), (56, 142, 60)],     # Verde
+    [(183, 28, 28), (229, 57, 53)],    # Rojo
+    [(230, 81, 0), (255, 143, 0)],     # Naranja
+]
+
+# Variante de fondo según el estilo visual del reel
+STYLE_VARIANTS = {
+    VideoStyle.CINEMATIC: "radial",
+    VideoStyle.VIBRANT: "linear",
+    VideoStyle.MINIMAL: "text_card",
+    VideoStyle.DARK: "noise",
+}
+
+RAW_EXTENSION = ".rgb"
+
+# Fotogramas sin texto ya renderizados: clave -> ruta del archivo crudo.
+# Acotado por variantes x paletas x resoluciones (el texto no entra en la clave)
+_frames: Dict[str, str] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def background_frame(
+    variant: str,
+    palette_index: int,
+    width: int,
+    height: int,
+    text: str = "",
+    work_dir: Optional[str] = None
+) -> str:
+    """
+    Devuelve la ruta del fondo pedido como fotograma RGB crudo.
+    Los fondos sin texto se calculan la primera vez y después salen del
+    caché (memoria y disco). La tarjeta de texto se renderiza en `work_dir`
+    (el directorio del trabajo), que se borra con el trabajo.
+    """
+    palette = palette_index % len(PALETTES)
+    text = text if variant == "text_card" else ""
+
+    if text:
+        if work_dir is None:
+            raise ValueError("La tarjeta de texto necesita el directorio del trabajo")
+        text_hash = hashlib.sha1(text.encode()).hexdigest()[:10]
+        path = os.path.join(
+            work_dir, f"{variant}_{palette}_{width}x{height}_{text_hash}{RAW_EXTENSION}"
+        )
+        if not os.path.exists(path):
+            await run_cpu(render_to_file, path, variant, palette, width, height, text)
+        return path
+
+    key = f"{variant}_{palette}_{width}x{height}_notext"
+    if key in _frames:
+        return _frames[key]
+
+    if key not in _locks:
+        _locks[key] = asyncio.Lock()
+    async with _locks[key]:
+        path = os.path.join(settings.temp_dir, "backgrounds", key + RAW_EXTENSION)
+        if not os.path.exists(path):
+            # Cálculo en el pool de procesos: el event loop no se entera
+            await run_cpu(render_to_file, path, variant, palette, width, height, text)
+        _frames[key] = path
+
+    return path
+
+
+def is_raw_frame(path: str) -> bool:
+    return path.endswith(RAW_EXTENSION)
+
+
+def raw_input_args(path: str) -> list[str]:
+    """Opciones de entrada de FFmpeg para leer un fotograma crudo."""
+    width, height = re.search(r"_(\d+)x(\d+)_", os.path.basename(path)).groups()
+    return ["-f", "rawvideo", "-pix_fmt", "rgb24", "-video_size", f"{width}x{height}"]
+
+
+def render_to_file(
+    path: str,
+    variant: str,
+    palette_index: int,
+    width: int,
+    height: int,
+    text: str = ""
+) -> None:
+    """Renderiza el fondo y lo escribe de forma atómica (corre en otro proceso)."""
+    frame = render(variant, palette_index, width, height, text)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.part"
+    with open(partial_path, "wb") as f:
+        f.write(frame.tobytes())
+    os.replace(partial_path, path)
+
+
+def render(variant: str, palette_index: int, width: int, height: int, text: str = ""):
+    """Renderiza un fondo como array (alto, ancho, 3) uint8."""
+    import numpy as np
+
+    start, end = (np.array(c, dtype=np.float32) for c in PALETTES[palette_index % len(PALETTES)])
+
+    if variant == "radial":
+        # Centro claro que se oscurece hacia las esquinas (viñeta)
+        y = np.linspace(-1.0, 1.0, height, dtype=np.float32)[:, None]
+        x = np.linspace(-1.0, 1.0, width, dtype=np.float32)[None, :] * (width / height)
+        t = np.clip(np.sqrt(x * x + y * y) / np.sqrt(1 + (width / height) ** 2), 0, 1)
+        t = 1.0 - t
+    elif variant == "noise":
+        t = _smooth_noise(height, width, seed=palette_index)
+    else:
+        # Lineal vertical (también la base de la tarjeta de texto): basta
+        # con calcular una columna y repetirla a lo ancho
+        t = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+
+    frame = start + (end - start) * t[..., None]
+
+    if variant == "text_card" and text:
+        frame = _draw_text_card(np.broadcast_to(frame, (height, width, 3)), text)
+
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(np.broadcast_to(frame, (height, width, 3)))
+
+
+def _smooth_noise(height: int, width: int, seed: int, cells: int = 6):
+    """Ruido de valor suave (interpolación bilineal de una rejilla aleatoria) con grano fino."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    grid_h = cells * height // min(height, width) + 2
+    grid_w = cells * width // min(height, width) + 2
+    grid = rng.random((grid_h, grid_w), dtype=np.float32)
+
+    gy = np.linspace(0, grid_h - 1.001, height, dtype=np.float32)
+    gx = np.linspace(0, grid_w - 1.001, width, dtype=np.float32)
+    y0, x0 = gy.astype(np.int32), gx.astype(np.int32)
+    fy = (gy - y0)[:, None]
+    fx = (gx - x0)[None, :]
+    fy, fx = fy * fy * (3 - 2 * fy), fx * fx * (3 - 2 * fx)   # Suavizado smoothstep
+
+    top = grid[y0][:, x0] * (1 - fx) + grid[y0][:, x0 + 1] * fx
+    bottom = grid[y0 + 1][:, x0] * (1 - fx) + grid[y0 + 1][:, x0 + 1] * fx
+    noise = top * (1 - fy) + bottom * fy
+
+    grain = rng.random((height, width), dtype=np.float32) * 0.06
+    return np.clip(noise * 0.94 + grain, 0, 1)
+
+
+def _draw_text_card(frame, text: str):
+    """Tarjeta translúcida centrada con el texto nítido sobre su sombra difuminada."""
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    height, width = frame.shape[:2]
+    font_size = max(24, width // 16)
+    try:
+        font = ImageFont.truetype("DejaVuSans-Bold.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default(size=font_size)
+
+    # Ajustar el texto a líneas que quepan en el 80% del ancho
+    mask = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if draw.textlength(candidate, font=font) > width * 0.8 and line:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    lines.append(line)
+    lines = lines[:6]
+
+    line_height = int(font_size * 1.3)
+    top = (height - line_height * len(lines)) // 2
+    for i, content in enumerate(lines):
+        line_width = draw.textlength(content, font=font)
+        draw.text(((width - line_width) / 2, top + i * line_height), content, fill=255, font=font)
+
+    text_mask = np.asarray(mask, dtype=np.float32) / 255.0
+
+    # Tarjeta: banda oscura translúcida de bordes suaves detrás del texto
+    pad = font_size
+    card = np.zeros((height, width), dtype=np.float32)
+    card[max(0, top - pad):top + line_height * len(lines) + pad, width // 20:width - width // 20] = 0.45
+    card = _box_blur(card, font_size // 2)
+
+    shadow = _box_blur(text_mask, max(2, font_size // 8))
+    frame = frame * (1 - card[..., None])
+    frame = frame * (1 - 0.6 * shadow[..., None])
+    return frame * (1 - text_mask[..., None]) + 255.0 * text_mask[..., None]
+
+
+def _box_blur(image, radius: int):
+    """Desenfoque de caja separable con sumas acumuladas (coste independiente del radio)."""
+    import numpy as np
+
+    if radius < 1:
+        return image
+    size = 2 * radius + 1
+    for axis in (0, 1):
+        padded = np.pad(image, [(radius + 1, radius) if a == axis else (0, 0) for a in (0, 1)], mode="edge")
+        summed = np.cumsum(padded, axis=axis, dtype=np.float32)
+        if axis == 0:
+            image = (summed[size:] - summed[:-size]) / size
+        else:
+            image = (summed[:, size:] - summed[:, :-size]) / size
+    return image
@@ -0,0 +1,99 @@
+"""
+Benchmark de arranque en frío del backend.
+Lanza uvicorn varias veces y mide:
+  - tiempo hasta la primera respuesta HTTP
+  - tiempo hasta que /api/ready responde 200 (servicios cargados)
+  - tiempo hasta el primer trabajo (sale de la cola y empieza a procesarse,
+    o termina del todo con --complete)
+
+Uso (desde backend/):
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 3 --job --complete
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import httpx
+
+
+def _wait_for(client: httpx.Client, path: str, deadline: float) -> float:
+    """Espera hasta que `path` responda 200. Retorna el instante en que lo hizo."""
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{path} no respondió a tiempo")
+
+
+def _first_job(client: httpx.Client, complete: bool, deadline: float) -> float:
+    """Lanza un reel y espera a que empiece a procesarse (o termine)."""
+    response = client.post("/api/generate", json={
+        "topic": "Tres consejos para dormir mejor",
+        "duration_seconds": 15
+    })
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+
+    while time.perf_counter() < deadline:
+        status = client.get(f"/api/status/{job_id}").json()["status"]
+        if status in ("failed", "cancelled"):
+            raise RuntimeError(f"El trabajo terminó con estado {status}")
+        if status == "completed" or (not complete and status != "pending"):
+            return time.perf_counter()
+        time.sleep(0.05)
+    raise TimeoutError("El trabajo no avanzó a tiempo")
+
+
+def run_once(port: int, job: bool, complete: bool, timeout: float) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = started + timeout
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            result = {"first_response": _wait_for(client, "/", deadline) - started}
+            result["ready"] = _wait_for(client, "/api/ready", deadline) - started
+            if job:
+                result["first_job"] = _first_job(client, complete, deadline) - started
+            return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--job", action="store_true", help="Medir también el primer trabajo")
+    parser.add_argument("--complete", action="store_true",
+                        help="Esperar a que el primer trabajo termine (requiere API keys)")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        result = run_once(args.port, args.job or args.complete, args.complete, args.timeout)
+        runs.append(result)
+        print(f"Ejecución {i + 1}: " + "  ".join(f"{k}={v:.3f}s" for k, v in result.items()))
+
+    print("\nMediana:")
+    for metric in runs[0]:
+        values = [r[metric] for r in runs]
+        print(f"  {metric:<15} {statistics.median(values):.3f}s "
+              f"(min {min(values):.3f}s, max {max(values):.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,29 @@ Lee variables de entorno con valores por defecto seguros.
 """
 
 import os
+from functools import cached_property
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
+
+
+def _parse_tenant_weights(value: str) -> Dict[str, float]:
+    """"tenantA=3,tenantB=1" -> {"tenantA": 3.0, "tenantB": 1.0}; ValueError si está mal formado."""
+    weights = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        tenant, sep, weight = item.partition("=")
+        try:
+            parsed = float(weight) if sep and tenant.strip() else None
+        except ValueError:
+            parsed = None
+        if parsed is None or not parsed > 0:
+            raise ValueError(
+                f"TENANT_WEIGHTS: '{item.strip()}' no es 'tenant=peso' con peso positivo"
+            )
+        weights[tenant.strip()] = max(0.01, parsed)
+    return weights
 
 
 class Settings(BaseSettings):
@@ -16,6 +37,12 @@ class Settings(BaseSettings):
     stability_api_key: str = ""
     pexels_api_key: str = ""
 
+    # Narración: "scene" (una petición por escena) o "script" (todo el guion en
+    # una petición con marcas de tiempo; si falla, vuelve a "scene")
+    tts_mode: str = "scene"
+    tts_stub: bool = False                # Voz local de prueba (silencio con tiempos simulados)
+    script_stub: bool = False             # Guion local de prueba (sin GPT), para pruebas de carga
+
     # Servidor
     host: str = "0.0.0.0"
     port: int = 8000
@@ -29,12 +56,72 @@ class Settings(BaseSettings):
     temp_dir: str = "/tmp/reel_ai"
     output_dir: str = "/tmp/reel_ai/output"
     max_file_age_hours: int = 24
+    sharded_layout: bool = True           # Archivos de cada trabajo en output_dir/ab/cd/ (ver migrate_layout.py)
+    render_cache_enabled: bool = True     # Reutilizar renders idénticos (misma huella)
+    asset_library_dir: str = "/tmp/reel_ai/assets"  # Biblioteca de imágenes ya obtenidas
+    asset_library: str = "record"         # "off", "record" (solo guardar) o "reuse" (guardar y reutilizar)
+    asset_library_min_score: float = 0.75  # Similitud mínima (0-1) para reutilizar una imagen
+    asset_library_max_assets: int = 5000  # Al superarlo se borran las usadas hace más tiempo
+    idempotency_ttl_seconds: int = 86400  # Vigencia de las claves Idempotency-Key
 
     # Video
     video_width: int = 1080
     video_height: int = 1920
     video_fps: int = 30
     video_duration_max: int = 60
+    preview_packaging: bool = True        # HLS, póster y miniatura para la vista previa
+    hls_segment_seconds: int = 2          # Duración de cada segmento (= intervalo de keyframes)
+
+    # Resiliencia de proveedores externos
+    breaker_failure_threshold: int = 3        # Fallos seguidos para abrir el circuito
+    breaker_recovery_seconds: float = 60.0    # Tiempo abierto antes de probar de nuevo
+    provider_max_retries: int = 2             # Reintentos de errores transitorios
+    provider_backoff_base_seconds: float = 0.5
+    provider_backoff_max_seconds: float = 8.0
+
+    # Hedging: lanzar el proveedor secundario si el primario se demora
+    hedging_enabled: bool = False
+    hedge_percentile: float = 95.0        # Percentil de latencia del primario que dispara el hedge
+    hedge_budget_ratio: float = 0.1       # Fracción máxima de peticiones duplicadas por tenant
+    hedge_budget_burst: float = 5.0       # Hedges acumulables por tenant
+
+    # Música de fondo
+    music_loudness_lufs: float = -28.0    # Sonoridad objetivo de las camas musicales
+    music_ducking_db: float = -9.0        # Cuánto baja la música mientras hay voz
+    audio_crossfade_ms: int = 30          # Fundido cruzado entre clips de narración
+
+    # Procesamiento concurrente
+    max_inflight_jobs: int = 6            # Trabajos procesándose a la vez
+    max_queued_jobs: int = 100            # Trabajos en espera antes de responder 429
+    max_concurrent_api_jobs: int = 4      # Trabajos en etapas de APIs externas
+    max_concurrent_ffmpeg_jobs: int = 2   # Trabajos componiendo con FFmpeg
+    batch_script_chunk_size: int = 5      # Guiones por llamada a GPT en lotes
+
+    # Planificación justa entre tenants
+    tenant_weights: str = ""              # "tenantA=3,tenantB=1" (por defecto peso 1)
+    tenant_max_api_jobs: int = 2          # Trabajos de un tenant en etapas de APIs a la vez
+    tenant_max_ffmpeg_jobs: int = 1       # Trabajos de un tenant componiendo a la vez
+    tenant_idle_seconds: int = 1800       # Estado de un tenant inactivo que se descarta (cola justa, hedging)
+
+    # Trabajo fuera del event loop y vigilancia del loop
+    io_workers: int = 8                   # Hilos para E/S bloqueante (disco, boto3)
+    cpu_workers: int = 2                  # Procesos para cálculo (imágenes)
+    loop_watchdog_interval_ms: int = 100  # Latido del vigilante
+    loop_lag_threshold_ms: int = 250      # Bloqueo a partir del cual se imprime la pila
+
+    # Límites de cada proceso FFmpeg (0 = sin límite)
+    ffmpeg_max_memory_mb: int = 0         # RLIMIT_AS: memoria virtual (no RSS) máxima; 0 = sin límite
+    ffmpeg_max_cpu_seconds: int = 3600    # RLIMIT_CPU: segundos de CPU (suma de hilos)
+    ffmpeg_timeout_seconds: int = 1800    # Tiempo real máximo antes de matarlo
+
+    # Webhooks (callback_url de cada solicitud)
+    webhook_secret: str = ""              # Clave HMAC de la cabecera X-Reel-Signature (vacía = sin firma)
+    webhook_timeout_seconds: float = 10.0
+    webhook_max_attempts: int = 6         # Intentos por evento (reintenta red, 5xx y 429)
+    webhook_backoff_base_seconds: float = 2.0
+    webhook_backoff_max_seconds: float = 300.0
+    webhook_workers: int = 4              # Entregas simultáneas
+    webhook_allow_private_hosts: bool = False  # Permite callback_url a localhost o redes privadas (receptores de prueba)
 
     # AWS (opcional)
     aws_access_key_id: str = ""
@@ -42,6 +129,14 @@ class Settings(BaseSettings):
     aws_bucket_name: str = ""
     aws_region: str = "us-east-1"
 
+    # Almacenamiento de salidas: "local" (disco) o "s3" (S3, MinIO, moto...)
+    storage_backend: str = "local"
+    s3_endpoint_url: str = ""                 # p. ej. http://localhost:9000 para MinIO
+    s3_prefix: str = "reels/"
+    s3_multipart_chunk_mb: int = 8           # Tamaño de cada parte del upload
+    s3_upload_concurrency: int = 4           # Partes subiendo en paralelo
+    s3_presign_expiry_seconds: int = 3600    # Vigencia de las URLs de descarga
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -50,13 +145,27 @@ class Settings(BaseSettings):
     def cors_origins_list(self) -> List[str]:
         return [o.strip() for o in self.cors_origins.split(",")]
 
+    @field_validator("tenant_weights")
+    @classmethod
+    def _validate_tenant_weights(cls, value: str) -> str:
+        # Un valor mal formado impide arrancar, en vez de dar 500 en cada petición
+        _parse_tenant_weights(value)
+        return value
+
+    @cached_property
+    def tenant_weights_map(self) -> Dict[str, float]:
+        """Pesos por tenant, interpretados una sola vez."""
+        return _parse_tenant_weights(self.tenant_weights)
+
 
 # Instancia global de configuración
 settings = Settings()
 
-# Crear directorios necesarios al importar
-os.makedirs(settings.temp_dir, exist_ok=True)
-os.makedirs(settings.output_dir, exist_ok=True)
-os.makedirs(os.path.join(settings.temp_dir, "audio"), exist_ok=True)
-os.makedirs(os.path.join(settings.temp_dir, "images"), exist_ok=True)
-os.makedirs(os.path.join(settings.temp_dir, "music"), exist_ok=True)
+
+def ensure_directories() -> None:
+    """Crea los directorios de trabajo (se llama al iniciar, no al importar)."""
+    os.makedirs(settings.temp_dir, exist_ok=True)
+    os.makedirs(settings.output_dir, exist_ok=True)
+    os.makedirs(os.path.join(settings.temp_dir, "audio"), exist_ok=True)
+    os.makedirs(os.path.join(settings.temp_dir, "images"), exist_ok=True)
+    os.makedirs(os.path.join(settings.temp_dir, "music"), exist_ok=True)
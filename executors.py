@@ -0,0 +1,63 @@
+"""
+Pools dedicados para el trabajo que no debe correr en el event loop.
+- io: operaciones bloqueantes de disco y SDK síncronos (copias, borrados, boto3)
+- cpu: cálculo puro en procesos aparte, sin competir por el GIL con el loop
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import settings
+
+
+_io_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(
+            max_workers=settings.io_workers,
+            thread_name_prefix="reel-io"
+        )
+    return _io_pool
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        # spawn: los workers no heredan hilos ni el estado del loop del servidor
+        _cpu_pool = ProcessPoolExecutor(
+            max_workers=settings.cpu_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_pool
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Ejecuta una función bloqueante de E/S en el pool de hilos."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_pool(), functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu(func: Callable[..., Any], *args) -> Any:
+    """
+    Ejecuta una función de cálculo en el pool de procesos.
+    `func` y sus argumentos deben poder serializarse (funciones de módulo).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_pool(), func, *args)
+
+
+def shutdown_pools() -> None:
+    """Cierra los pools (al detener el servidor)."""
+    global _io_pool, _cpu_pool
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
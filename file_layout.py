@@ -0,0 +1,49 @@
+"""
+Ubicación en disco de los archivos de cada trabajo.
+Con sharded_layout cada trabajo cae en un subdirectorio de dos niveles
+tomado del hash de su ID (output_dir/3f/a9/...), así ningún directorio
+acumula cientos de miles de entradas y abrir o borrar un archivo no
+depende de cuántos haya. Las versiones en otros idiomas ({job_id}_en)
+van al mismo shard que su trabajo.
+"""
+
+import os
+import hashlib
+from app.config import settings
+
+
+# Directorios temporales de cada trabajo (ver temp_dir)
+TEMP_KINDS = ("work", "audio", "images")
+
+
+def base_job_id(file_id: str) -> str:
+    """ID del trabajo dueño de un archivo ({job_id}_{idioma} -> {job_id})."""
+    return file_id.split("_", 1)[0]
+
+
+def shard(file_id: str) -> str:
+    """Subdirectorio de dos niveles del trabajo ("" con el layout plano)."""
+    if not settings.sharded_layout:
+        return ""
+    digest = hashlib.sha1(base_job_id(file_id).encode()).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+
+def output_file(file_id: str, name: str) -> str:
+    """Ruta de un archivo de salida (video o ZIP) del trabajo."""
+    return os.path.join(settings.output_dir, shard(file_id), name)
+
+
+def preview_dir(job_id: str) -> str:
+    """Directorio de la vista previa empaquetada (HLS, póster y miniatura)."""
+    return os.path.join(settings.output_dir, "previews", shard(job_id), job_id)
+
+
+def temp_dir(kind: str, file_id: str) -> str:
+    """
+    Directorio temporal del trabajo: "work" (composición), "audio" o "images".
+    En el layout plano "work" es temp_dir/{job_id}, como antes.
+    """
+    if kind == "work" and not settings.sharded_layout:
+        return os.path.join(settings.temp_dir, file_id)
+    return os.path.join(settings.temp_dir, kind, shard(file_id), file_id)
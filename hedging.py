@@ -0,0 +1,149 @@
+"""
+Cadenas de fallback entre dos proveedores con hedging opcional.
+Si el primario tarda más que un percentil de su latencia reciente, se
+lanza el secundario en paralelo y gana la primera respuesta válida.
+Un presupuesto por tenant limita cuántas peticiones se duplican.
+"""
+
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.provider_health import ProviderUnavailable, provider_health
+
+Factory = Callable[[], Awaitable[Any]]
+
+
+class HedgeBudget:
+    """
+    Token bucket por tenant: cada petición primaria suma `ratio` fichas
+    (hasta `burst`) y cada hedge gasta una. Así los hedges no superan esa
+    fracción de las peticiones y el gasto extra queda acotado. Los tenants
+    sin peticiones en `idle_seconds` se olvidan (vuelven a empezar sin fichas).
+    """
+
+    def __init__(self, ratio: float, burst: float, idle_seconds: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.idle_seconds = idle_seconds
+        self._tokens: Dict[str, float] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._pruned_at = time.monotonic()
+
+    def earn(self, tenant_id: str) -> None:
+        now = time.monotonic()
+        self._tokens[tenant_id] = min(self.burst, self._tokens.get(tenant_id, 0.0) + self.ratio)
+        self._last_seen[tenant_id] = now
+        if now - self._pruned_at >= min(60.0, self.idle_seconds):
+            self._prune(now)
+
+    def try_spend(self, tenant_id: str) -> bool:
+        if self._tokens.get(tenant_id, 0.0) >= 1.0:
+            self._tokens[tenant_id] -= 1.0
+            return True
+        return False
+
+    def _prune(self, now: float) -> None:
+        self._pruned_at = now
+        cutoff = now - self.idle_seconds
+        for tenant_id in [t for t, seen in self._last_seen.items() if seen < cutoff]:
+            del self._last_seen[tenant_id]
+            self._tokens.pop(tenant_id, None)
+
+
+hedge_budget = HedgeBudget(
+    settings.hedge_budget_ratio, settings.hedge_budget_burst, settings.tenant_idle_seconds
+)
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    if not task.done():
+        task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def run_with_fallback(
+    primary_name: str,
+    primary: Optional[Factory],
+    secondary_name: str,
+    secondary: Optional[Factory],
+    tenant_id: str = "anonymous"
+) -> tuple[Any, str]:
+    """
+    Ejecuta el primario y, si falla o devuelve un resultado vacío, el secundario.
+    Con hedging activo, si el primario supera su percentil de latencia se
+    lanza también el secundario y se cancela el que pierda.
+    Un proveedor en None se considera no disponible y se salta.
+
+    Returns:
+        (resultado, nombre del proveedor que respondió)
+    """
+    last_error: Exception = ProviderUnavailable(
+        primary_name, f"ni {primary_name} ni {secondary_name} disponibles"
+    )
+
+    if primary is not None:
+        primary_task = asyncio.create_task(primary())
+        secondary_task: Optional[asyncio.Task] = None
+
+        try:
+            delay = _hedge_delay(primary_name, secondary, tenant_id)
+            if delay is not None:
+                await asyncio.wait({primary_task}, timeout=delay)
+                if not primary_task.done() and hedge_budget.try_spend(tenant_id):
+                    secondary_task = asyncio.create_task(secondary())
+                    metrics.increment("hedge_started", provider=primary_name)
+
+            pending = {t for t in (primary_task, secondary_task) if t is not None}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    winner = primary_name if task is primary_task else secondary_name
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"[Hedging] {winner} falló: {e}")
+                        last_error = e
+                        continue
+                    if not result:
+                        continue
+
+                    if secondary_task is not None:
+                        metrics.increment("hedge_won", provider=primary_name, winner=winner)
+                        print(f"[Hedging] {winner} ganó el hedge de {primary_name}")
+                    return result, winner
+        finally:
+            await _cancel(primary_task)
+            if secondary_task is not None:
+                await _cancel(secondary_task)
+
+        if secondary_task is not None:
+            # El secundario ya corrió como hedge y tampoco respondió
+            raise last_error
+
+    if secondary is None:
+        raise last_error
+
+    result = await secondary()
+    if not result:
+        raise ProviderUnavailable(secondary_name, "sin resultado")
+    return result, secondary_name
+
+
+def _hedge_delay(
+    primary_name: str,
+    secondary: Optional[Factory],
+    tenant_id: str
+) -> Optional[float]:
+    """Tiempo de espera antes de lanzar el hedge, o None si no se hace hedging."""
+    if not settings.hedging_enabled or secondary is None:
+        return None
+
+    hedge_budget.earn(tenant_id)
+    return provider_health.breaker(primary_name).latency_percentile(
+        settings.hedge_percentile
+    )
@@ -1,14 +1,20 @@
 """
 Servicio de generación de imágenes para las escenas del reel.
 Usa DALL-E 3 como principal y Pexels como fallback de imágenes stock.
+Con asset_library="reuse" consulta antes la biblioteca local de imágenes.
 """
 
 import os
 import httpx
 import aiofiles
+from typing import Optional
 from openai import AsyncOpenAI
 from app.config import settings
 from app.models.reel import ScriptScene, VideoStyle
+from app.services.provider_health import ProviderError, provider_health
+from app.services.hedging import run_with_fallback
+from app.services.backgrounds import STYLE_VARIANTS, background_frame
+from app.services import asset_library, file_layout
 
 
 class ImageGeneratorService:
@@ -22,9 +28,10 @@ class ImageGeneratorService:
         VideoStyle.DARK: "dark moody aesthetic, contrast lighting, dramatic shadows, cinematic dark tones, premium feel",
     }
 
-    def __init__(self):
-        self.openai = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.images_dir = os.path.join(settings.temp_dir, "images")
+    def __init__(self, tenant_id: str = "anonymous"):
+        # Los reintentos los gestiona provider_health, no el SDK
+        self.openai = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
+        self.tenant_id = tenant_id
 
     async def generate_scene_images(
         self,
@@ -43,43 +50,66 @@ class ImageGeneratorService:
         Returns:
             Lista de rutas a las imágenes generadas
         """
-        job_images_dir = os.path.join(self.images_dir, job_id)
+        job_images_dir = file_layout.temp_dir("images", job_id)
         os.makedirs(job_images_dir, exist_ok=True)
 
         image_files = []
         style_mod = self.STYLE_MODIFIERS.get(style, self.STYLE_MODIFIERS[VideoStyle.VIBRANT])
+        used_assets: set[int] = set()   # Imágenes de la biblioteca ya usadas en este reel
 
         for scene in scenes:
             output_path = os.path.join(job_images_dir, f"scene_{scene.order:02d}.png")
 
+            # Una imagen de un prompt parecido ya obtenida antes: sin coste ni espera
+            if settings.asset_library == "reuse":
+                reused = await asset_library.lookup(
+                    scene.visual_prompt, style.value, output_path, exclude=used_assets
+                )
+                if reused:
+                    used_assets.add(reused[0])
+                    image_files.append(output_path)
+                    continue
+
             # Construir prompt enriquecido con el estilo
             enhanced_prompt = (
                 f"{scene.visual_prompt}, {style_mod}, "
                 f"vertical composition 9:16 portrait format, high quality"
             )
 
-            # Intentar DALL-E 3, fallback a Pexels
-            success = await self._generate_dalle(enhanced_prompt, output_path)
-
-            if not success:
-                # Buscar imagen relacionada en Pexels
-                search_query = self._extract_keywords(scene.visual_prompt)
-                success = await self._fetch_pexels_image(search_query, output_path)
-
-            if not success:
-                # Último fallback: generar imagen sólida de color
-                await self._generate_placeholder(output_path, scene.order)
+            # Intentar DALL-E 3 (si está disponible), fallback a Pexels;
+            # con hedging, Pexels arranca en paralelo si DALL-E se demora
+            search_query = self._extract_keywords(scene.visual_prompt)
+            dalle = pexels = None
+            if settings.openai_api_key and provider_health.is_available("dalle"):
+                dalle = lambda: self._generate_dalle(enhanced_prompt)
+            if settings.pexels_api_key and provider_health.is_available("pexels"):
+                pexels = lambda: self._fetch_pexels_image(search_query)
+
+            try:
+                content, provider = await run_with_fallback(
+                    "dalle", dalle, "pexels", pexels, tenant_id=self.tenant_id
+                )
+                async with aiofiles.open(output_path, "wb") as f:
+                    await f.write(content)
+                if settings.asset_library != "off":
+                    asset_id = await asset_library.store(
+                        output_path, scene.visual_prompt, style.value, provider
+                    )
+                    if asset_id is not None:
+                        used_assets.add(asset_id)
+            except Exception as e:
+                # Último fallback: fondo procedural (cacheado, sin pasar por PNG)
+                print(f"[ImageGen] Sin imagen de proveedores para escena {scene.order}: {e}")
+                output_path = await self._generate_placeholder(scene, style, job_images_dir)
 
             image_files.append(output_path)
 
         return image_files
 
-    async def _generate_dalle(self, prompt: str, output_path: str) -> bool:
-        """Genera imagen con DALL-E 3."""
-        if not settings.openai_api_key:
-            return False
+    async def _generate_dalle(self, prompt: str) -> bytes:
+        """Genera imagen con DALL-E 3. Retorna la imagen descargada."""
 
-        try:
+        async def request() -> bytes:
             response = await self.openai.images.generate(
                 model="dall-e-3",
                 prompt=prompt[:4000],  # DALL-E tiene límite de caracteres
@@ -94,85 +124,64 @@ class ImageGeneratorService:
             # Descargar la imagen generada
             async with httpx.AsyncClient(timeout=60.0) as client:
                 img_response = await client.get(image_url)
-                if img_response.status_code == 200:
-                    async with aiofiles.open(output_path, "wb") as f:
-                        await f.write(img_response.content)
-                    return True
-
-            return False
-
-        except Exception as e:
-            print(f"[ImageGen] DALL-E falló para escena: {e}")
-            return False
-
-    async def _fetch_pexels_image(self, query: str, output_path: str) -> bool:
-        """Obtiene imagen de stock de Pexels como fallback."""
-        if not settings.pexels_api_key:
-            return False
-
-        try:
-            headers = {"Authorization": settings.pexels_api_key}
-            params = {
-                "query": query,
-                "per_page": 1,
-                "orientation": "portrait"  # Vertical para reels
-            }
-
+            if img_response.status_code != 200:
+                raise ProviderError("dalle", "descarga fallida", img_response.status_code)
+            return img_response.content
+
+        return await provider_health.call("dalle", request)
+
+    async def _fetch_pexels_image(self, query: str) -> Optional[bytes]:
+        """Obtiene imagen de stock de Pexels como fallback. None si no hay resultados."""
+        headers = {"Authorization": settings.pexels_api_key}
+        params = {
+            "query": query,
+            "per_page": 1,
+            "orientation": "portrait"  # Vertical para reels
+        }
+
+        async def request() -> Optional[bytes]:
             async with httpx.AsyncClient(timeout=30.0) as client:
                 response = await client.get(
                     "https://api.pexels.com/v1/search",
                     headers=headers,
                     params=params
                 )
+                if response.status_code != 200:
+                    raise ProviderError("pexels", response.text[:200], response.status_code)
 
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("photos"):
-                        img_url = data["photos"][0]["src"]["large2x"]
-                        img_response = await client.get(img_url)
-                        if img_response.status_code == 200:
-                            async with aiofiles.open(output_path, "wb") as f:
-                                await f.write(img_response.content)
-                            return True
-
-            return False
-
-        except Exception as e:
-            print(f"[ImageGen] Pexels falló: {e}")
-            return False
-
-    async def _generate_placeholder(self, output_path: str, scene_number: int) -> None:
-        """Genera imagen placeholder con gradiente como último recurso."""
-        from PIL import Image, ImageDraw, ImageFont
-        import random
-
-        # Paletas de colores para gradientes
-        color_palettes = [
-            [(48, 25, 52), (89, 57, 161)],    # Púrpura
-            [(26, 35, 126), (21, 101, 192)],   # Azul
-            [(27, 94, 32), (56, 142, 60)],     # Verde
-            [(183, 28, 28), (229, 57, 53)],    # Rojo
-            [(230, 81, 0), (255, 143, 0)],     # Naranja
-        ]
-
-        colors = color_palettes[scene_number % len(color_palettes)]
-
-        img = Image.new("RGB", (settings.video_width, settings.video_height))
-        draw = ImageDraw.Draw(img)
-
-        # Dibujar gradiente vertical
-        for y in range(settings.video_height):
-            ratio = y / settings.video_height
-            r = int(colors[0][0] + (colors[1][0] - colors[0][0]) * ratio)
-            g = int(colors[0][1] + (colors[1][1] - colors[0][1]) * ratio)
-            b = int(colors[0][2] + (colors[1][2] - colors[0][2]) * ratio)
-            draw.line([(0, y), (settings.video_width, y)], fill=(r, g, b))
-
-        img.save(output_path, "PNG")
+                data = response.json()
+                if not data.get("photos"):
+                    return None  # Sin resultados: no es un fallo del proveedor
+
+                img_url = data["photos"][0]["src"]["large2x"]
+                img_response = await client.get(img_url)
+                if img_response.status_code != 200:
+                    raise ProviderError("pexels", "descarga fallida", img_response.status_code)
+                return img_response.content
+
+        return await provider_health.call("pexels", request)
+
+    async def _generate_placeholder(
+        self,
+        scene: ScriptScene,
+        style: VideoStyle,
+        job_images_dir: str
+    ) -> str:
+        """
+        Fondo procedural como último recurso: se calcula una vez por variante,
+        paleta y resolución y se reutiliza (la tarjeta de texto, propia de la
+        escena, va al directorio del trabajo). Retorna la ruta del fotograma crudo.
+        """
+        return await background_frame(
+            STYLE_VARIANTS.get(style, "linear"),
+            scene.order,
+            settings.video_width,
+            settings.video_height,
+            text=scene.text,
+            work_dir=job_images_dir
+        )
 
     def _extract_keywords(self, visual_prompt: str) -> str:
         """Extrae palabras clave del prompt visual para buscar en Pexels."""
-        # Tomar las primeras 3-4 palabras más significativas
-        stop_words = {"a", "an", "the", "of", "in", "on", "at", "for", "with", "and"}
-        words = [w for w in visual_prompt.split()[:10] if w.lower() not in stop_words]
-        return " ".join(words[:4])
+        # Las primeras 4 palabras significativas (las mismas que indexa la biblioteca)
+        return " ".join(asset_library.extract_keywords(visual_prompt)[:4])
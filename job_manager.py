@@ -3,20 +3,79 @@ Gestor de trabajos en memoria (para desarrollo sin Redis).
 En producción, reemplazar con Celery + Redis.
 """
 
+import os
+import time
 import uuid
+import shutil
 import asyncio
+import zipfile
 from datetime import datetime
-from typing import Dict, Optional
-from app.models.reel import ReelJob, JobStatus, ReelRequest
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from app.config import settings
+from app.models.reel import (
+    ReelJob, JobStatus, ReelRequest, ReelResponse, ReelScript,
+    BatchJob, BatchItem, BatchStatus, ReelFormat, JobPriority, JobResources,
+    VideoOutput, PreviewAssets, LanguageVariant
+)
+from app.services.video_composer import output_path
+from app.services import artifact_index, file_layout, preview_packager
+from app.services.processes import current_job_id, kill_job_processes, pop_job_usage
+from app.services.scheduler import QueueFullError, scheduler
+from app.services.storage import get_storage
+from app.services.warmup import warm_up
+from app.services.webhooks import webhook_dispatcher
+from app.services.executors import run_io
+from app.services.metrics import metrics
 
 
 # Almacén de trabajos en memoria
 _jobs: Dict[str, ReelJob] = {}
 
+# Lotes: batch_id -> (job_ids, temas, fecha de creación, ZIP ya construido y su cerrojo)
+_batches: Dict[str, dict] = {}
 
-def create_job() -> str:
-    """Crea un nuevo trabajo y retorna su ID."""
+# Tarea asíncrona en curso de cada trabajo (para poder cancelarla)
+_tasks: Dict[str, asyncio.Task] = {}
+
+# Webhooks de cada trabajo: job_id -> (callback_url, estados a notificar)
+_webhooks: Dict[str, tuple[str, set[JobStatus]]] = {}
+
+# Versión en la que cambió por última vez cada campo: job_id -> {campo: versión}
+_field_versions: Dict[str, Dict[str, int]] = {}
+
+# Momento en que cada trabajo entró en su estado actual (para el modelo de ETA)
+_stage_started: Dict[str, float] = {}
+
+# Claves de idempotencia: "tenant:clave" -> (huella de la solicitud, respuesta, caducidad)
+_idempotency: Dict[str, tuple[str, ReelResponse, float]] = {}
+# Cerrojos de las claves con peticiones en curso: clave -> (cerrojo, usuarios)
+_idempotency_locks: Dict[str, tuple[asyncio.Lock, int]] = {}
+
+# Estados finales: el trabajo ya no consume recursos
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+# Cada cuánto se aplica la retención (max_file_age_hours) a los archivos
+RETENTION_INTERVAL_SECONDS = 3600
+
+# Las etapas de APIs externas (red) y las de FFmpeg (CPU) tienen cupos
+# separados (scheduler.api_slot / scheduler.ffmpeg_slot): mientras un trabajo
+# compone su video, otros pueden ir generando guion, voz e imágenes, y así
+# ambos recursos se mantienen ocupados sin que un tenant los acapare.
+
+
+def create_job(
+    video_seconds: int = 30,
+    tenant_id: str = "anonymous",
+    priority: JobPriority = JobPriority.INTERACTIVE
+) -> str:
+    """
+    Crea un nuevo trabajo, lo pone en la cola del planificador y retorna su ID.
+    Lanza QueueFullError si la cola está llena.
+    """
     job_id = str(uuid.uuid4())
+    scheduler.submit(job_id, video_seconds, tenant_id, priority)
+    _stage_started[job_id] = time.monotonic()
     _jobs[job_id] = ReelJob(
         job_id=job_id,
         status=JobStatus.PENDING,
@@ -24,12 +83,125 @@ def create_job() -> str:
         message="Trabajo en cola...",
         created_at=datetime.utcnow().isoformat()
     )
+    _field_versions[job_id] = {}
     return job_id
 
 
 def get_job(job_id: str) -> Optional[ReelJob]:
-    """Obtiene el estado actual de un trabajo."""
-    return _jobs.get(job_id)
+    """
+    Obtiene el estado actual de un trabajo, con su posición en cola y ETA.
+    Ambas se calculan al leer y no suben la versión (la ETA cambia cada segundo).
+    """
+    job = _jobs.get(job_id)
+    if job:
+        job.queue_position = scheduler.position(job_id)
+        job.eta_seconds = scheduler.eta(job_id)
+    return job
+
+
+def register_webhook(job_id: str, request: ReelRequest) -> None:
+    """Anota la callback_url del trabajo: se notifica al terminar y en las etapas pedidas."""
+    if request.callback_url:
+        events = TERMINAL_STATUSES | set(request.callback_events)
+        _webhooks[job_id] = (request.callback_url, events)
+
+
+def _notify(job: ReelJob) -> None:
+    """Encola el webhook del estado actual del trabajo si hay que notificarlo."""
+    webhook = _webhooks.get(job.job_id)
+    if not webhook or job.status not in webhook[1]:
+        return
+
+    payload = {"job": job.model_dump(mode="json", exclude={"webhooks", "script"})}
+    record = webhook_dispatcher.enqueue(
+        webhook[0],
+        f"job.{job.status.value}",
+        payload,
+        on_update=lambda: _mark_changed(job, "webhooks")
+    )
+    _set_fields(job, webhooks=[*job.webhooks, record])
+    if job.status in TERMINAL_STATUSES:
+        _webhooks.pop(job.job_id, None)
+
+
+def _mark_changed(job: ReelJob, *fields: str) -> None:
+    """Sube la versión del trabajo y la anota en cada campo modificado."""
+    job.version += 1
+    versions = _field_versions.setdefault(job.job_id, {})
+    for field in fields:
+        versions[field] = job.version
+
+
+def _set_fields(job: ReelJob, **values) -> None:
+    """Asigna campos del trabajo; la versión solo sube si alguno cambió de valor."""
+    changed = [key for key, value in values.items() if getattr(job, key) != value]
+    for key in changed:
+        setattr(job, key, values[key])
+    if changed:
+        _mark_changed(job, *changed)
+
+
+# Campos calculados en cada lectura: sin versión, van en todas las respuestas con cambios
+VOLATILE_FIELDS = {"queue_position", "eta_seconds"}
+
+
+def changed_fields(job: ReelJob, since: int) -> set[str]:
+    """Campos del trabajo que cambiaron después de la versión `since`."""
+    return {
+        field for field, version in _field_versions.get(job.job_id, {}).items()
+        if version > since
+    }
+
+
+@asynccontextmanager
+async def idempotency_lock(key: str) -> AsyncIterator[None]:
+    """
+    Cerrojo por clave: peticiones concurrentes con la misma clave se serializan.
+    Solo existe mientras alguien lo tiene o lo espera (la clave la elige el
+    cliente, así que no se guarda uno por cada clave vista).
+    """
+    lock, users = _idempotency_locks.get(key, (None, 0))
+    if lock is None:
+        lock = asyncio.Lock()
+    _idempotency_locks[key] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _idempotency_locks[key]
+        if users == 1:
+            del _idempotency_locks[key]
+        else:
+            _idempotency_locks[key] = (lock, users - 1)
+
+
+def get_idempotent_response(key: str, fingerprint: str) -> Optional[ReelResponse]:
+    """
+    Retorna la respuesta guardada para la clave, o None si no existe o caducó.
+    Lanza ValueError si la clave se reutiliza con una solicitud distinta.
+    """
+    _purge_idempotency()
+    entry = _idempotency.get(key)
+    if entry is None:
+        return None
+
+    stored_fingerprint, response, _ = entry
+    if stored_fingerprint != fingerprint:
+        raise ValueError("La clave de idempotencia ya se usó con otra solicitud")
+    return response
+
+
+def save_idempotent_response(key: str, fingerprint: str, response: ReelResponse) -> None:
+    """Guarda la respuesta original de una clave durante idempotency_ttl_seconds."""
+    expires_at = time.monotonic() + settings.idempotency_ttl_seconds
+    _idempotency[key] = (fingerprint, response, expires_at)
+
+
+def _purge_idempotency() -> None:
+    """Elimina las claves caducadas."""
+    now = time.monotonic()
+    for key in [k for k, (_, _, expires_at) in _idempotency.items() if expires_at <= now]:
+        del _idempotency[key]
 
 
 def update_job(
@@ -42,109 +214,708 @@ def update_job(
     """Actualiza el estado de un trabajo."""
     if job_id in _jobs:
         job = _jobs[job_id]
-        job.status = status
-        job.progress = progress
-        job.message = message
-        for key, value in kwargs.items():
-            setattr(job, key, value)
+        previous = job.status
+        if previous != status:
+            _record_stage(job_id, previous, status)
+        _set_fields(job, status=status, progress=progress, message=message, **kwargs)
+        if previous != status:
+            _notify(job)
 
 
 def fail_job(job_id: str, error: str) -> None:
     """Marca un trabajo como fallido."""
     if job_id in _jobs:
-        _jobs[job_id].status = JobStatus.FAILED
-        _jobs[job_id].error = error
-        _jobs[job_id].message = "Error en la generación"
-        _jobs[job_id].progress = 0
+        _record_stage(job_id, _jobs[job_id].status, JobStatus.FAILED)
+        _set_fields(
+            _jobs[job_id],
+            status=JobStatus.FAILED,
+            error=error,
+            message="Error en la generación",
+            progress=0
+        )
+        _notify(_jobs[job_id])
 
 
-async def process_reel_job(job_id: str, request: ReelRequest) -> None:
+async def _package_preview(
+    job_id: str,
+    video_path: str
+) -> tuple[Optional[PreviewAssets], list[str]]:
     """
-    Orquesta el proceso completo de generación del reel.
-    Se ejecuta en background como tarea asíncrona.
+    Empaqueta la vista previa (HLS, póster, miniatura). Es opcional: si
+    falla, el trabajo termina igual y el reproductor usa el MP4.
     """
-    from app.services.script_generator import ScriptGeneratorService
-    from app.services.tts_service import TTSService
-    from app.services.image_generator import ImageGeneratorService
-    from app.services.video_composer import VideoComposerService
-    from app.config import settings
-    import os
-
+    if not settings.preview_packaging:
+        return None, []
     try:
-        # PASO 1: Generar guion
-        update_job(job_id, JobStatus.GENERATING_SCRIPT, 10,
-                   "Generando guion viral con IA...")
-
-        script_svc = ScriptGeneratorService()
-        script = await script_svc.generate(
-            topic=request.topic,
-            language=request.language,
-            duration_seconds=request.duration_seconds,
-            style=request.style.value
-        )
+        files = await preview_packager.package_preview(video_path, job_id)
+    except Exception as e:
+        print(f"[JobManager] Sin vista previa HLS para {job_id}: {e}")
+        return None, []
+
+    base = f"/api/preview/{job_id}"
+    preview = PreviewAssets(
+        hls_url=f"{base}/{preview_packager.PLAYLIST}",
+        poster_url=f"{base}/{preview_packager.POSTER}",
+        thumbnail_url=f"{base}/{preview_packager.THUMBNAIL}"
+    )
+    return preview, files
+
+
+def variant_id(job_id: str, language: str) -> str:
+    """ID de archivos de la versión en otro idioma (audio, temporales y salidas)."""
+    return f"{job_id}_{language}"
 
-        update_job(job_id, JobStatus.GENERATING_SCRIPT, 25,
-                   "Guion generado. Generando voz en off...",
-                   script=script)
 
-        # PASO 2: Generar audio (TTS)
-        update_job(job_id, JobStatus.GENERATING_AUDIO, 30,
-                   "Convirtiendo guion a voz realista...")
+def _extra_languages(request: ReelRequest) -> List[str]:
+    """Idiomas adicionales pedidos, sin repetidos ni el idioma principal."""
+    return [
+        lang for lang in dict.fromkeys(request.extra_languages)
+        if lang != request.language
+    ]
 
-        tts_svc = TTSService()
-        audio_files = await tts_svc.generate_audio(
+
+def job_cost(request: ReelRequest) -> int:
+    """Segundos de video que el trabajo va a producir (para la cola y la ETA)."""
+    return request.duration_seconds * (1 + len(_extra_languages(request)))
+
+
+async def _narrate(tts_svc, script: ReelScript, audio_id: str, voice_gender):
+    """
+    Genera la voz de un guion. Con tts_mode="script" las escenas pasan a
+    durar lo que dura su narración.
+
+    Returns:
+        (archivos de audio, narración con tiempos o None)
+    """
+    narration = None
+    if settings.tts_mode == "script":
+        # Una sola petición: las escenas duran lo que dura su narración
+        narration = await tts_svc.generate_narration(
             script=script,
-            job_id=job_id,
-            voice_gender=request.voice_gender
+            job_id=audio_id,
+            voice_gender=voice_gender
+        )
+    if narration:
+        for scene, duration in zip(script.scenes, narration.scene_durations):
+            scene.duration = duration
+        script.total_duration = round(sum(narration.scene_durations), 3)
+        return [narration.audio_path], narration
+
+    audio_files = await tts_svc.generate_audio(
+        script=script,
+        job_id=audio_id,
+        voice_gender=voice_gender
+    )
+    return audio_files, None
+
+
+async def _describe_outputs(
+    composer,
+    video_paths: dict,
+    script: ReelScript,
+    profile: str,
+    max_file_mb: Optional[int] = None
+) -> Dict[str, VideoOutput]:
+    """Mide tamaño y bitrate real de cada formato exportado y si cumple max_file_mb."""
+    outputs = {}
+    for fmt, path in video_paths.items():
+        info = await composer.probe_output(path, script.total_duration)
+        within_max_size = None
+        if max_file_mb:
+            within_max_size = info["size_bytes"] <= max_file_mb * 10**6
+        outputs[fmt.value] = VideoOutput(
+            format=fmt.value, profile=profile, within_max_size=within_max_size, **info
+        )
+        metrics.observe("export_bitrate_kbps", info["bitrate_kbps"], profile=profile)
+        metrics.observe("export_size_mb", info["size_bytes"] / 1e6, profile=profile)
+    return outputs
+
+
+def _store_resources(job_id: str) -> None:
+    """Guarda en el trabajo (y en las métricas) lo que consumieron sus procesos FFmpeg."""
+    usage = pop_job_usage(job_id)
+    if not usage:
+        return
+
+    if job_id in _jobs:
+        _set_fields(_jobs[job_id], resources=JobResources(**usage))
+    metrics.observe("job_cpu_seconds", usage["cpu_seconds"])
+    metrics.observe("job_peak_rss_mb", usage["peak_rss_mb"])
+    metrics.observe("job_bytes_written", usage["bytes_written"])
+
+
+def _record_stage(job_id: str, previous: JobStatus, new: JobStatus) -> None:
+    """Registra la duración de la etapa que termina en el modelo de ETA."""
+    now = time.monotonic()
+    started = _stage_started.pop(job_id, None)
+    if started is not None and previous != JobStatus.PENDING:
+        scheduler.record_stage(job_id, previous.value, now - started)
+    if new not in TERMINAL_STATUSES:
+        _stage_started[job_id] = now
+
+
+def start_reel_job(
+    job_id: str,
+    request: ReelRequest,
+    script: Optional[ReelScript] = None,
+    tenant_id: str = "anonymous"
+) -> asyncio.Task:
+    """Lanza el procesamiento de un trabajo como tarea propia y la registra."""
+    task = asyncio.create_task(
+        process_reel_job(job_id, request, script=script, tenant_id=tenant_id),
+        name=f"reel-{job_id}"
+    )
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+    return task
+
+
+def start_batch_job(
+    batch_id: str,
+    requests: List[ReelRequest],
+    tenant_id: str = "anonymous"
+) -> asyncio.Task:
+    """Lanza el procesamiento de un lote como tarea en segundo plano."""
+    task = asyncio.create_task(
+        process_batch_job(batch_id, requests, tenant_id=tenant_id),
+        name=f"batch-{batch_id}"
+    )
+    _batches[batch_id]["task"] = task
+    return task
+
+
+async def cancel_job(job_id: str) -> bool:
+    """
+    Cancela un trabajo en curso: cancela su tarea (y con ella las llamadas
+    pendientes a proveedores), mata sus procesos FFmpeg y borra sus archivos.
+
+    Returns:
+        True si el trabajo seguía en curso y se canceló
+    """
+    job = _jobs.get(job_id)
+    if not job or job.status in TERMINAL_STATUSES:
+        return False
+
+    update_job(job_id, JobStatus.CANCELLED, 0, "Trabajo cancelado")
+
+    task = _tasks.get(job_id)
+    if task and not task.done():
+        task.cancel()
+        kill_job_processes(job_id)
+        await asyncio.wait({task}, timeout=10)
+    scheduler.release(job_id)
+
+    await cleanup_job_files(job_id)
+    return True
+
+
+def _file_ids(job_id: str) -> List[str]:
+    """IDs de archivos del trabajo: el suyo y el de cada versión en otro idioma."""
+    job = _jobs.get(job_id)
+    return [job_id] + [variant_id(job_id, lang) for lang in (job.variants if job else {})]
+
+
+def _temp_dirs(file_ids: List[str]) -> List[str]:
+    return [
+        file_layout.temp_dir(kind, file_id)
+        for file_id in file_ids
+        for kind in file_layout.TEMP_KINDS
+    ]
+
+
+async def _index_artifacts(job_id: str) -> None:
+    """Registra en el índice los archivos que dejó el trabajo (para borrarlos sin buscarlos)."""
+    file_ids = _file_ids(job_id)
+    outputs = [output_path(file_id, fmt) for file_id in file_ids for fmt in ReelFormat]
+    preview_dir = preview_packager.preview_dir(job_id)
+    try:
+        previews = await run_io(
+            lambda: [os.path.join(preview_dir, name) for name in os.listdir(preview_dir)]
+            if os.path.isdir(preview_dir) else []
         )
+        await artifact_index.record(job_id, outputs, "output")
+        await artifact_index.record(job_id, previews, "preview")
+        await artifact_index.record(job_id, _temp_dirs(file_ids), "temp")
+    except Exception as e:
+        print(f"[JobManager] No se pudieron indexar los archivos de {job_id}: {e}")
+
+
+async def cleanup_job_files(job_id: str) -> None:
+    """
+    Elimina los archivos temporales y de salida de un trabajo (y de sus idiomas).
+    Las rutas salen del índice de archivos; las calculadas cubren lo que no
+    llegó a registrarse (trabajo cancelado o fallido a medias).
+    """
+    file_ids = _file_ids(job_id)
+    indexed = await artifact_index.artifacts(job_id)
+
+    job_dirs = set(_temp_dirs(file_ids))
+    job_dirs.update(path for path, kind, _ in indexed if kind == "temp")
+    for job_dir in job_dirs:
+        if os.path.exists(job_dir):
+            await run_io(shutil.rmtree, job_dir, ignore_errors=True)
+
+    # Eliminar videos de salida (todos los formatos, también en el almacenamiento)
+    files = {output_path(file_id, fmt) for file_id in file_ids for fmt in ReelFormat}
+    files.update(path for path, kind, _ in indexed if kind != "temp")
+    preview_dir = preview_packager.preview_dir(job_id)
+    if os.path.isdir(preview_dir):
+        files.update(os.path.join(preview_dir, name) for name in os.listdir(preview_dir))
+
+    storage = get_storage()
+    for path in files:
+        try:
+            await storage.delete(path)
+        except Exception as e:
+            print(f"[JobManager] No se pudo borrar {os.path.basename(path)} de {job_id}: {e}")
+    if os.path.isdir(preview_dir):
+        await run_io(shutil.rmtree, preview_dir, ignore_errors=True)
+
+    await artifact_index.forget(job_id)
+
+
+async def retention_janitor() -> None:
+    """
+    Tarea de fondo: cada hora borra los archivos de los trabajos registrados
+    hace más de max_file_age_hours (consulta el índice, no recorre directorios).
+    """
+    while True:
+        try:
+            expired = await artifact_index.expired_jobs(settings.max_file_age_hours * 3600)
+            removed = 0
+            for job_id in expired:
+                job = _jobs.get(job_id)
+                if job and job.status not in TERMINAL_STATUSES:
+                    continue
+                await cleanup_job_files(job_id)
+                removed += 1
+            if removed:
+                metrics.increment("retention_jobs_removed", removed)
+                print(f"[JobManager] Archivos de {removed} trabajos caducados eliminados")
+
+            count, size = await artifact_index.totals()
+            metrics.set_gauge("artifact_files", count)
+            metrics.set_gauge("artifact_bytes", size)
+        except Exception as e:
+            print(f"[JobManager] Error en la limpieza por antigüedad: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+def create_batch(
+    requests: List[ReelRequest],
+    tenant_id: str = "anonymous"
+) -> tuple[str, List[str]]:
+    """
+    Crea un lote con un trabajo por solicitud, en el carril masivo.
+    Retorna (batch_id, job_ids).
+    Lanza QueueFullError si el lote completo no cabe en la cola.
+    """
+    if not scheduler.can_admit(len(requests)):
+        raise QueueFullError(scheduler.retry_after())
+
+    batch_id = str(uuid.uuid4())
+    job_ids = [
+        create_job(job_cost(r), tenant_id, JobPriority.BULK)
+        for r in requests
+    ]
+    for job_id, request in zip(job_ids, requests):
+        register_webhook(job_id, request)
+    _batches[batch_id] = {
+        "job_ids": job_ids,
+        "topics": [r.topic for r in requests],
+        "created_at": datetime.utcnow().isoformat(),
+        "archive": None,
+        "archive_lock": asyncio.Lock(),
+    }
+    return batch_id, job_ids
 
-        update_job(job_id, JobStatus.GENERATING_AUDIO, 50,
-                   "Voz generada. Creando escenas visuales con IA...")
 
-        # PASO 3: Generar imágenes
-        update_job(job_id, JobStatus.GENERATING_IMAGES, 55,
-                   "Generando imágenes para cada escena...")
+def get_batch(batch_id: str) -> Optional[BatchJob]:
+    """Obtiene el estado agregado de un lote."""
+    batch = _batches.get(batch_id)
+    if not batch:
+        return None
 
-        img_svc = ImageGeneratorService()
-        image_files = await img_svc.generate_scene_images(
-            scenes=script.scenes,
+    items = []
+    for job_id, topic in zip(batch["job_ids"], batch["topics"]):
+        job = _jobs[job_id]
+        items.append(BatchItem(
             job_id=job_id,
-            style=request.style
+            topic=topic,
+            status=job.status,
+            progress=job.progress,
+            download_url=job.download_url,
+            error=job.error
+        ))
+
+    total = len(items)
+    completed = sum(1 for i in items if i.status == JobStatus.COMPLETED)
+    failed = sum(1 for i in items if i.status in TERMINAL_STATUSES - {JobStatus.COMPLETED})
+
+    if completed + failed < total:
+        pending = all(i.status == JobStatus.PENDING for i in items)
+        status = BatchStatus.PENDING if pending else BatchStatus.PROCESSING
+    elif failed == total:
+        status = BatchStatus.FAILED
+    elif failed:
+        status = BatchStatus.PARTIAL
+    else:
+        status = BatchStatus.COMPLETED
+
+    finished = status in (BatchStatus.COMPLETED, BatchStatus.PARTIAL)
+
+    return BatchJob(
+        batch_id=batch_id,
+        status=status,
+        progress=sum(
+            100 if i.status in TERMINAL_STATUSES else i.progress for i in items
+        ) // total,
+        total=total,
+        completed=completed,
+        failed=failed,
+        items=items,
+        download_url=f"/api/batch/{batch_id}/download" if finished else None,
+        created_at=batch["created_at"]
+    )
+
+
+def build_batch_archive(batch: BatchJob) -> str:
+    """
+    Empaqueta en un ZIP los videos completados del lote junto al manifiesto.
+    Se escribe aparte y se mueve con os.replace: quien ya esté descargando
+    una versión anterior no la ve truncada.
+    Operación bloqueante: ejecutar con run_io.
+    """
+    archive_path = file_layout.output_file(batch.batch_id, f"batch_{batch.batch_id}.zip")
+    partial_path = f"{archive_path}.part"
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+
+    # Los MP4 ya están comprimidos: se almacenan sin recomprimir
+    with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr("manifest.json", batch.model_dump_json(indent=2))
+        for item in batch.items:
+            if item.status != JobStatus.COMPLETED:
+                continue
+            for fmt in _jobs[item.job_id].download_urls:
+                video_path = output_path(item.job_id, ReelFormat(fmt))
+                if os.path.exists(video_path):
+                    suffix = fmt.replace(":", "x")
+                    zf.write(video_path, arcname=f"reel_{item.job_id[:8]}_{suffix}.mp4")
+    os.replace(partial_path, archive_path)
+
+    # Así la retención también borra el ZIP
+    artifact_index.record_sync(batch.batch_id, [archive_path], "archive")
+    return archive_path
+
+
+async def ensure_batch_archive(batch_id: str) -> Optional[str]:
+    """
+    ZIP del lote terminado: se construye (y se sube al almacenamiento) una
+    sola vez; las descargas siguientes sirven el mismo archivo.
+
+    Returns:
+        Ruta del ZIP, o None si el lote no existe o no terminó
+    """
+    entry = _batches.get(batch_id)
+    batch = get_batch(batch_id)
+    if not entry or not batch or not batch.download_url:
+        return None
+
+    async with entry["archive_lock"]:
+        archive_path = entry["archive"]
+        if archive_path and os.path.exists(archive_path):
+            return archive_path
+
+        archive_path = await run_io(build_batch_archive, batch)
+        await get_storage().upload(archive_path, content_type="application/zip")
+        entry["archive"] = archive_path
+        return archive_path
+
+
+async def process_batch_job(
+    batch_id: str,
+    requests: List[ReelRequest],
+    tenant_id: str = "anonymous"
+) -> None:
+    """
+    Procesa un lote completo.
+    Genera los guiones agrupados en pocas llamadas a GPT y luego lanza todos
+    los trabajos a la vez; los cupos de API y FFmpeg intercalan sus etapas.
+    """
+    await warm_up()
+    from app.services.script_generator import ScriptGeneratorService
+
+    job_ids = _batches[batch_id]["job_ids"]
+
+    # Siguen en PENDING: la etapa de guion empieza cuando el planificador
+    # les da turno (así la espera en cola no cuenta en el modelo de ETA)
+    for job_id in job_ids:
+        if _jobs[job_id].status == JobStatus.PENDING:
+            update_job(job_id, JobStatus.PENDING, 0,
+                       "En cola. Generando guiones del lote con IA...")
+
+    try:
+        # Cada llamada agrupada ocupa su propio hueco de APIs (global y del tenant)
+        scripts = await ScriptGeneratorService().generate_many(
+            requests,
+            chunk_size=settings.batch_script_chunk_size,
+            slot=lambda: scheduler.api_slot(tenant_id)
         )
+    except Exception as e:
+        # Cada trabajo intentará generar su propio guion
+        print(f"[JobManager] Error generando guiones del lote {batch_id}: {e}")
+        scripts = [None] * len(requests)
+
+    # Cada reel en su propia tarea, cancelable por separado
+    tasks = [
+        start_reel_job(job_id, request, script=script, tenant_id=tenant_id)
+        for job_id, request, script in zip(job_ids, requests, scripts)
+        if _jobs[job_id].status not in TERMINAL_STATUSES
+    ]
+    if tasks:
+        await asyncio.wait(tasks)
+
+    # El ZIP se arma una vez al terminar el lote, no en cada descarga
+    try:
+        await ensure_batch_archive(batch_id)
+    except Exception as e:
+        print(f"[JobManager] No se pudo empaquetar el lote {batch_id}: {e}")
+
+
+async def process_reel_job(
+    job_id: str,
+    request: ReelRequest,
+    script: Optional[ReelScript] = None,
+    tenant_id: str = "anonymous"
+) -> None:
+    """
+    Orquesta el proceso completo de generación del reel.
+    Se ejecuta en background como tarea asíncrona.
+    Si se recibe `script` (ya generado en un lote) se omite el paso 1.
+    Con extra_languages el guion se traduce y cada idioma tiene su propia voz
+    y subtítulos, pero comparte las imágenes y se compone a la vez que el
+    principal.
+    """
+    # Los procesos FFmpeg que se lancen desde aquí quedan asociados al trabajo
+    current_job_id.set(job_id)
+
+    try:
+        # Esperar turno en la cola del planificador
+        await scheduler.wait_turn(job_id)
+
+        # Los servicios se importan en el calentamiento (fuera del event loop)
+        await warm_up()
+        from app.services.script_generator import ScriptGeneratorService
+        from app.services.tts_service import TTSService
+        from app.services.image_generator import ImageGeneratorService
+        from app.services.video_composer import VideoComposerService
+
+        async with scheduler.api_slot(tenant_id):
+            # PASO 1: Generar guion
+            script_svc = ScriptGeneratorService()
+
+            if script is None:
+                update_job(job_id, JobStatus.GENERATING_SCRIPT, 10,
+                           "Generando guion viral con IA...")
+
+                script = await script_svc.generate(
+                    topic=request.topic,
+                    language=request.language,
+                    duration_seconds=request.duration_seconds,
+                    style=request.style.value
+                )
+
+            update_job(job_id, JobStatus.GENERATING_SCRIPT, 25,
+                       "Guion generado. Generando voz en off...",
+                       script=script, language=request.language)
+
+            # PASO 2: Generar audio (TTS)
+            update_job(job_id, JobStatus.GENERATING_AUDIO, 30,
+                       "Convirtiendo guion a voz realista...")
 
-        update_job(job_id, JobStatus.GENERATING_IMAGES, 70,
-                   "Imágenes listas. Componiendo el video final...")
+            tts_svc = TTSService(tenant_id=tenant_id)
+            audio_files, narration = await _narrate(
+                tts_svc, script, job_id, request.voice_gender
+            )
+            if narration:
+                # Las duraciones del guion ya publicado cambiaron en su sitio
+                _mark_changed(_jobs[job_id], "script")
 
-        # PASO 4: Generar subtítulos SRT
-        srt_content = ""
-        if request.add_subtitles:
-            srt_content = await script_svc.generate_subtitles_srt(script)
+            # PASO 2b: Versiones en otros idiomas. Se traducen solo los textos
+            # (una llamada para todos) y se narran en paralelo; las imágenes
+            # del paso 3 sirven para todas porque visual_prompt no cambia.
+            languages = _extra_languages(request)
+            variant_scripts: Dict[str, ReelScript] = {}
+            variant_audio: Dict[str, tuple] = {}
+            if languages:
+                update_job(job_id, JobStatus.GENERATING_AUDIO, 40,
+                           f"Traduciendo el guion a: {', '.join(languages)}...",
+                           variants={lang: LanguageVariant(language=lang) for lang in languages})
+
+                try:
+                    variant_scripts = await script_svc.translate(script, languages)
+                except Exception as e:
+                    print(f"[JobManager] Traducción fallida en {job_id}: {e}")
+
+                results = await asyncio.gather(*(
+                    _narrate(tts_svc, variant_script, variant_id(job_id, lang),
+                             request.voice_gender)
+                    for lang, variant_script in variant_scripts.items()
+                ), return_exceptions=True)
+
+                variants = _jobs[job_id].variants
+                for lang, result in zip(variant_scripts, results):
+                    if isinstance(result, Exception):
+                        variants[lang].error = f"Voz no generada: {result}"
+                    else:
+                        variant_audio[lang] = result
+                        variants[lang].script = variant_scripts[lang]
+                for lang in languages:
+                    if lang not in variant_scripts:
+                        variants[lang].error = "No se pudo traducir el guion"
+                _mark_changed(_jobs[job_id], "variants")
+
+            update_job(job_id, JobStatus.GENERATING_AUDIO, 50,
+                       "Voz generada. Creando escenas visuales con IA...")
+
+            # PASO 3: Generar imágenes
+            update_job(job_id, JobStatus.GENERATING_IMAGES, 55,
+                       "Generando imágenes para cada escena...")
+
+            img_svc = ImageGeneratorService(tenant_id=tenant_id)
+            image_files = await img_svc.generate_scene_images(
+                scenes=script.scenes,
+                job_id=job_id,
+                style=request.style
+            )
+
+            update_job(job_id, JobStatus.GENERATING_IMAGES, 70,
+                       "Imágenes listas. Componiendo el video final...")
+
+            # PASO 4: Generar subtítulos SRT (uno por idioma)
+            srt_content = ""
+            variant_srt: Dict[str, str] = {}
+            if request.add_subtitles:
+                srt_content = await script_svc.generate_subtitles_srt(
+                    script, words=narration.words if narration else None
+                )
+                for lang, (_, variant_narration) in variant_audio.items():
+                    variant_srt[lang] = await script_svc.generate_subtitles_srt(
+                        variant_scripts[lang],
+                        words=variant_narration.words if variant_narration else None
+                    )
 
         # PASO 5: Componer video final
-        update_job(job_id, JobStatus.COMPOSING_VIDEO, 75,
-                   "Ensamblando video con FFmpeg...")
+        update_job(job_id, JobStatus.COMPOSING_VIDEO, 72,
+                   "Esperando turno para componer el video...")
 
         composer = VideoComposerService()
-        video_path = await composer.compose(
-            script=script,
-            image_files=image_files,
-            audio_files=audio_files,
-            job_id=job_id,
-            add_subtitles=request.add_subtitles,
-            music_genre=request.music,
-            srt_content=srt_content
+
+        async def compose(file_id, reel_script, reel_audio, srt):
+            # Cada versión ocupa su propio hueco de FFmpeg (global y del tenant)
+            async with scheduler.ffmpeg_slot(tenant_id):
+                if file_id == job_id:
+                    update_job(job_id, JobStatus.COMPOSING_VIDEO, 75,
+                               "Ensamblando video con FFmpeg...")
+                return await composer.compose(
+                    script=reel_script,
+                    image_files=image_files,
+                    audio_files=reel_audio,
+                    job_id=file_id,
+                    add_subtitles=request.add_subtitles,
+                    music_genre=request.music,
+                    srt_content=srt,
+                    formats=request.formats,
+                    export_profile=request.export_profile,
+                    max_file_mb=request.max_file_mb
+                )
+
+        # Los idiomas comparten imágenes y solo cambian voz y subtítulos: se
+        # componen a la vez que el principal si hay huecos libres, y si no
+        # esperan su turno como cualquier otro trabajo
+        results = await asyncio.gather(
+            compose(job_id, script, audio_files, srt_content),
+            *(compose(variant_id(job_id, lang), variant_scripts[lang],
+                      variant_audio[lang][0], variant_srt.get(lang, ""))
+              for lang in variant_audio),
+            return_exceptions=True
         )
 
+        if isinstance(results[0], BaseException):
+            raise results[0]
+        video_paths = results[0]
+
+        # Subir fuera del cupo de FFmpeg: el siguiente trabajo ya puede exportar
+        # mientras las partes de estos videos suben en paralelo
+        update_job(job_id, JobStatus.COMPOSING_VIDEO, 95, "Guardando video...")
+        profile = request.export_profile.value
+        outputs = await _describe_outputs(
+            composer, video_paths, script, profile, request.max_file_mb
+        )
+
+        variant_paths = {}
+        for lang, result in zip(variant_audio, results[1:]):
+            variant = _jobs[job_id].variants[lang]
+            if isinstance(result, BaseException):
+                print(f"[JobManager] Versión '{lang}' de {job_id} fallida: {result}")
+                variant.error = f"Video no compuesto: {result}"
+                continue
+            variant_paths[lang] = result
+            variant.outputs = await _describe_outputs(
+                composer, result, variant_scripts[lang], profile, request.max_file_mb
+            )
+            variant.download_url = f"/api/download/{job_id}?language={lang}"
+            variant.download_urls = {
+                fmt.value: f"/api/download/{job_id}?language={lang}&format={fmt.value}"
+                for fmt in result
+            }
+        if variant_audio:
+            _mark_changed(_jobs[job_id], "variants")
+
+        # Vista previa de arranque rápido a partir del primer formato pedido
+        # (el mismo que sirve /api/preview sin formato)
+        preview, preview_files = await _package_preview(
+            job_id, next(iter(video_paths.values()))
+        )
+
+        storage = get_storage()
+        await asyncio.gather(
+            *(storage.upload(path) for path in video_paths.values()),
+            *(storage.upload(path) for paths in variant_paths.values() for path in paths.values()),
+            *(storage.upload(
+                path,
+                preview_packager.media_type(os.path.basename(path)) or "application/octet-stream"
+            ) for path in preview_files)
+        )
+
+        download_urls = {
+            fmt.value: f"/api/download/{job_id}?format={fmt.value}"
+            for fmt in video_paths
+        }
+
         update_job(
             job_id,
             JobStatus.COMPLETED,
             100,
             "Reel generado exitosamente",
-            download_url=f"/api/download/{job_id}"
+            download_url=f"/api/download/{job_id}",
+            download_urls=download_urls,
+            outputs=outputs,
+            preview=preview
         )
 
+    except asyncio.CancelledError:
+        print(f"[JobManager] Job {job_id} cancelado")
+        raise
+
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
         print(f"[JobManager] Error en job {job_id}: {error_detail}")
         fail_job(job_id, str(e))
+
+    finally:
+        _store_resources(job_id)
+        scheduler.release(job_id)
+        if job_id in _jobs and _jobs[job_id].status != JobStatus.CANCELLED:
+            await _index_artifacts(job_id)
@@ -0,0 +1,272 @@
+"""
+Prueba de carga de la API HTTP de punta a punta.
+Llegadas de reels tipo Poisson a una tasa configurable; cada usuario
+simulado hace POST /api/generate, consulta /api/status hasta que el trabajo
+termina y descarga el video con /api/download. Al final informa:
+  - latencia p50/p95/p99 y tasa de errores por endpoint
+  - trabajos completados, fallidos y rechazados (429) y throughput
+  - lag del event loop del servidor (muestreado de /api/metrics)
+
+Por defecto levanta la app real en el mismo proceso (httpx + ASGI) con
+proveedores de prueba: guion y voz locales y fondos procedurales en lugar
+de imágenes, así que solo FFmpeg hace trabajo real. Con --url se ataca un
+servidor ya lanzado (arrancarlo con SCRIPT_STUB=true TTS_STUB=true
+TTS_MODE=script y sin API keys para medir lo mismo); así el generador de
+carga no comparte el event loop con el servidor.
+
+Uso (desde backend/):
+    python loadtest.py --rate 0.5 --duration 60
+    python loadtest.py --url http://127.0.0.1:8000 --rate 2 --duration 120 --json carga.json
+"""
+
+import os
+import math
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """Percentil por rango más cercano (0 si no hay valores)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class LoadStats:
+    """Latencias y resultados acumulados durante la prueba."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.jobs: Dict[str, int] = defaultdict(int)
+        self.job_seconds: List[float] = []
+        self.loop_lag: List[float] = []
+        self.server_metrics: dict = {}
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> Optional[httpx.Response]:
+        """Hace la petición midiendo su latencia; None si falló el transporte."""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            return None
+
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        # 429 es contrapresión esperada, no un error del servidor
+        if response.status_code >= 400 and response.status_code != 429:
+            self.errors[endpoint] += 1
+        return response
+
+
+async def simulate_user(
+    client: httpx.AsyncClient,
+    stats: LoadStats,
+    args: argparse.Namespace
+) -> None:
+    """Un reel completo: generar, esperar con polling y descargar."""
+    started = time.perf_counter()
+    response = await stats.request(client, "generate", "POST", "/api/generate", json={
+        "topic": random.choice(args.topics),
+        "duration_seconds": args.reel_seconds,
+    })
+    if response is None or response.status_code != 202:
+        stats.jobs["rejected" if response is not None and response.status_code == 429 else "error"] += 1
+        return
+
+    stats.jobs["submitted"] += 1
+    job_id = response.json()["job_id"]
+
+    deadline = started + args.job_timeout
+    status = "pending"
+    version = None
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        # Como el frontend: la primera consulta completa y después solo cambios
+        params = {} if version is None else {"since": version}
+        response = await stats.request(
+            client, "status", "GET", f"/api/status/{job_id}", params=params
+        )
+        if response is not None and response.status_code == 200:
+            data = response.json()
+            version = data["version"]
+            status = data.get("status", status)
+            if status in TERMINAL_STATUSES:
+                break
+    else:
+        status = "timeout"
+
+    stats.jobs[status] += 1
+    if status != "completed":
+        return
+
+    stats.job_seconds.append(time.perf_counter() - started)
+    # Con S3 responde 302 a la URL prefirmada: no se sigue la redirección
+    await stats.request(client, "download", "GET", f"/api/download/{job_id}")
+
+
+async def sample_server(client: httpx.AsyncClient, stats: LoadStats, stop: asyncio.Event) -> None:
+    """Lee el lag del event loop del servidor una vez por segundo."""
+    while not stop.is_set():
+        try:
+            response = await client.get("/api/metrics")
+            stats.server_metrics = response.json()
+            lag = stats.server_metrics.get("gauges", {}).get("event_loop_lag_seconds")
+            if lag is not None:
+                stats.loop_lag.append(lag)
+        except (httpx.HTTPError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(client: httpx.AsyncClient, args: argparse.Namespace) -> dict:
+    stats = LoadStats()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(client, stats, stop))
+
+    # Llegadas de Poisson: intervalos exponenciales con media 1/rate
+    users = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        users.append(asyncio.create_task(simulate_user(client, stats, args)))
+        await asyncio.sleep(random.expovariate(args.rate))
+
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    return build_report(stats, elapsed)
+
+
+def build_report(stats: LoadStats, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, values in stats.latencies.items():
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "error_rate": round(stats.errors[endpoint] / len(values), 4),
+            "p50_ms": round(_percentile(values, 50) * 1000, 1),
+            "p95_ms": round(_percentile(values, 95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 99) * 1000, 1),
+        }
+
+    server = stats.server_metrics
+    lag_summary = server.get("summaries", {}).get("event_loop_lag_seconds", {})
+    return {
+        "elapsed_seconds": round(elapsed, 1),
+        "endpoints": endpoints,
+        "jobs": dict(stats.jobs),
+        "throughput_jobs_per_minute": round(stats.jobs["completed"] / elapsed * 60, 2),
+        "job_seconds_p50": round(_percentile(stats.job_seconds, 50), 2),
+        "job_seconds_p95": round(_percentile(stats.job_seconds, 95), 2),
+        "event_loop_lag_ms": {
+            "p50": round(_percentile(stats.loop_lag, 50) * 1000, 1),
+            "p95": round(_percentile(stats.loop_lag, 95) * 1000, 1),
+            "max": round(lag_summary.get("max", 0.0) * 1000, 1),
+            "stalls": server.get("counters", {}).get("event_loop_stalls", 0),
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nDuración: {report['elapsed_seconds']}s")
+    print(f"\n{'endpoint':<10} {'peticiones':>10} {'errores':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<10} {row['requests']:>10} {row['error_rate']:>8.1%} "
+              f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms")
+
+    print("\nTrabajos: " + "  ".join(f"{k}={v}" for k, v in sorted(report["jobs"].items())))
+    print(f"Throughput: {report['throughput_jobs_per_minute']} reels/min  "
+          f"(duración p50 {report['job_seconds_p50']}s, p95 {report['job_seconds_p95']}s)")
+    lag = report["event_loop_lag_ms"]
+    print(f"Lag del event loop: p50 {lag['p50']}ms  p95 {lag['p95']}ms  "
+          f"máx {lag['max']}ms  bloqueos {lag['stalls']}")
+
+
+def _use_stub_providers() -> None:
+    """Proveedores de prueba para la app en proceso (antes de importarla)."""
+    os.environ.update({
+        "SCRIPT_STUB": "true",
+        "TTS_STUB": "true",
+        "TTS_MODE": "script",
+        # Sin claves: las imágenes salen de los fondos procedurales
+        "OPENAI_API_KEY": "",
+        "ELEVENLABS_API_KEY": "",
+        "PEXELS_API_KEY": "",
+    })
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    timeout = httpx.Timeout(args.request_timeout)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            return await run_load(client, args)
+
+    _use_stub_providers()
+    from app.main import app
+
+    # ASGITransport no ejecuta el lifespan: se abre a mano
+    async with app.router.lifespan_context(app):
+        from app.services.warmup import warm_up
+        await warm_up()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", limits=limits, timeout=timeout
+        ) as client:
+            return await run_load(client, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument("--url", help="Servidor a probar (por defecto, la app en proceso)")
+    parser.add_argument("--rate", type=float, default=0.5, help="Reels nuevos por segundo")
+    parser.add_argument("--duration", type=float, default=60.0, help="Segundos generando llegadas")
+    parser.add_argument("--reel-seconds", type=int, default=15, help="Duración de cada reel")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--job-timeout", type=float, default=600.0)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--topics", nargs="+", default=[
+        "Tres consejos para dormir mejor",
+        "Cómo ahorrar en el supermercado",
+        "Datos curiosos del océano",
+    ])
+    parser.add_argument("--seed", type=int, help="Semilla para repetir las llegadas")
+    parser.add_argument("--json", help="Guardar el informe en este archivo")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Vigilancia del lag del event loop.
+Una tarea del loop late cada intervalo y mide cuánto se retrasa; un hilo
+aparte comprueba ese latido y, si el loop lleva bloqueado más del umbral,
+imprime la pila del hilo del loop en ese momento (el código culpable).
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from typing import Optional
+from app.config import settings
+from app.services.metrics import metrics
+
+
+class LoopLagWatchdog:
+    """Mide el lag del event loop y registra quién lo bloquea."""
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Arranca el latido en el loop actual y el hilo vigilante."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+
+            metrics.set_gauge("event_loop_lag_seconds", round(lag, 4))
+            metrics.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self) -> None:
+        reported = False
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked < self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+
+            # Un solo aviso por bloqueo, con la pila del hilo del loop
+            reported = True
+            metrics.increment("event_loop_stalls")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(sin pila)"
+            print(f"[Watchdog] Event loop bloqueado {blocked * 1000:.0f}ms. Pila:\n{stack}")
+
+
+# Instancia global (se arranca en el lifespan)
+loop_watchdog = LoopLagWatchdog(
+    settings.loop_watchdog_interval_ms / 1000,
+    settings.loop_lag_threshold_ms / 1000
+)
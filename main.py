@@ -3,13 +3,18 @@ Punto de entrada principal de la aplicación FastAPI.
 Configura middleware, rutas y eventos de ciclo de vida.
 """
 
-import os
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.routes import router
-from app.config import settings
+from app.config import settings, ensure_directories
+from app.services.warmup import start_warm_up
+from app.services.executors import shutdown_pools
+from app.services.loop_watchdog import loop_watchdog
+from app.services import job_manager, render_cache
+from app.services.webhooks import webhook_dispatcher
 
 
 @asynccontextmanager
@@ -25,12 +30,43 @@ async def lifespan(app: FastAPI):
     print(f"   Directorio temporal: {settings.temp_dir}")
     print("=" * 50)
 
+    ensure_directories()
+    loop_watchdog.start()
+
+    # Cargar los SDK y servicios en segundo plano: el servidor ya responde
+    # mientras tanto y /api/ready indica cuándo puede procesar trabajos
+    warmup_task = start_warm_up()
+
+    # Preparar la biblioteca de música en segundo plano (mide y normaliza una vez)
+    app.state.music_task = asyncio.create_task(_prepare_music(warmup_task))
+
+    # Retención de la caché de renders (max_file_age_hours)
+    app.state.render_cache_janitor = asyncio.create_task(render_cache.janitor())
+
+    # Retención de los archivos de cada trabajo, vía el índice de archivos
+    app.state.retention_janitor = asyncio.create_task(job_manager.retention_janitor())
+
+    # Entrega de webhooks (callback_url) con reintentos
+    webhook_dispatcher.start()
+
     yield
 
     # Cierre: limpieza opcional
+    app.state.music_task.cancel()
+    app.state.render_cache_janitor.cancel()
+    app.state.retention_janitor.cancel()
+    await webhook_dispatcher.stop()
+    loop_watchdog.stop()
+    shutdown_pools()
     print("Servidor detenido.")
 
 
+async def _prepare_music(warmup_task: asyncio.Task) -> None:
+    await warmup_task
+    from app.services.music_library import MusicLibraryService
+    await MusicLibraryService().prepare_all()
+
+
 app = FastAPI(
     title="Reel AI Generator API",
     description="API para generación automática de Instagram Reels con IA",
@@ -51,8 +87,8 @@ app.add_middleware(
 app.include_router(router)
 
 # ---- Servir archivos estáticos generados ----
-os.makedirs(settings.output_dir, exist_ok=True)
-app.mount("/outputs", StaticFiles(directory=settings.output_dir), name="outputs")
+# El directorio se crea al iniciar (lifespan), no al importar
+app.mount("/outputs", StaticFiles(directory=settings.output_dir, check_dir=False), name="outputs")
 
 # ---- Ruta raíz ----
 @app.get("/")
@@ -61,7 +97,8 @@ async def root():
         "name": "Reel AI Generator API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "ready": "/api/ready"
     }
 
 
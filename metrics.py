@@ -0,0 +1,50 @@
+"""
+Métricas internas en memoria (contadores, gauges y resúmenes).
+Se exponen en formato JSON en /api/metrics.
+"""
+
+from collections import defaultdict
+from typing import Dict
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    parts = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{parts}}}"
+
+
+class MetricsRegistry:
+    """Registro de métricas del proceso."""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, dict] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Suma `value` a un contador."""
+        self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Fija el valor actual de un gauge."""
+        self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra una observación (cuenta, suma y máximo)."""
+        key = _key(name, labels)
+        summary = self._summaries.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+            "summaries": {k: dict(v) for k, v in self._summaries.items()},
+        }
+
+
+# Instancia global compartida por los servicios
+metrics = MetricsRegistry()
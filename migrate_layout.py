@@ -0,0 +1,109 @@
+"""
+Migra los archivos del layout plano al layout por shards y los indexa.
+Mueve (sin copiar, con os.replace) lo que quedó de versiones anteriores:
+  - output_dir/{job_id}[_{idioma}][_4x5|_1x1].mp4 y batch_{id}.zip
+  - output_dir/previews/{job_id}/
+  - temp_dir/audio/{id}/, temp_dir/images/{id}/ y temp_dir/{job_id}/
+a su ruta en file_layout y registra cada uno en el índice de archivos,
+así la retención y el borrado de trabajos también los encuentran.
+Es idempotente: lo ya migrado (directorios de shard) se salta.
+
+Uso (desde backend/, con el servidor parado):
+    python migrate_layout.py --dry-run
+    python migrate_layout.py
+"""
+
+import os
+import re
+import argparse
+from collections import Counter
+from app.config import settings
+from app.services import artifact_index, file_layout
+
+
+_UUID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+_VIDEO = re.compile(rf"^({_UUID}(?:_[a-z]{{2}})?)(?:_(?:4x5|1x1))?\.mp4$")
+_ARCHIVE = re.compile(rf"^batch_({_UUID})\.zip$")
+_JOB_DIR = re.compile(rf"^{_UUID}(?:_[a-z]{{2}})?$")
+
+
+def _entries(directory: str):
+    """Entradas de un directorio (vacío si no existe)."""
+    try:
+        with os.scandir(directory) as it:
+            return list(it)
+    except FileNotFoundError:
+        return []
+
+
+def _move(source: str, dest: str, job_id: str, kind: str, dry_run: bool, stats: Counter) -> None:
+    if os.path.abspath(source) == os.path.abspath(dest):
+        return
+    if os.path.exists(dest):
+        print(f"[Migrate] Ya existe {dest}: se deja {source}")
+        stats["skipped"] += 1
+        return
+
+    print(f"[Migrate] {source} -> {dest}")
+    stats[kind] += 1
+    if dry_run:
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(source, dest)
+
+    if kind == "preview":
+        paths = [os.path.join(dest, name) for name in os.listdir(dest)]
+    else:
+        paths = [dest]
+    # Con su fecha de modificación: la retención cuenta desde que se crearon
+    artifact_index.record_sync(job_id, paths, kind, from_mtime=True)
+
+
+def migrate(dry_run: bool) -> Counter:
+    stats: Counter = Counter()
+
+    for entry in _entries(settings.output_dir):
+        if not entry.is_file():
+            continue
+        video = _VIDEO.match(entry.name)
+        archive = _ARCHIVE.match(entry.name)
+        if video:
+            file_id = video.group(1)
+            dest = file_layout.output_file(file_id, entry.name)
+            _move(entry.path, dest, file_layout.base_job_id(file_id), "output", dry_run, stats)
+        elif archive:
+            batch_id = archive.group(1)
+            dest = file_layout.output_file(batch_id, entry.name)
+            _move(entry.path, dest, batch_id, "archive", dry_run, stats)
+
+    for entry in _entries(os.path.join(settings.output_dir, "previews")):
+        if entry.is_dir() and _JOB_DIR.match(entry.name):
+            dest = file_layout.preview_dir(entry.name)
+            _move(entry.path, dest, entry.name, "preview", dry_run, stats)
+
+    for kind in file_layout.TEMP_KINDS:
+        parent = settings.temp_dir if kind == "work" else os.path.join(settings.temp_dir, kind)
+        for entry in _entries(parent):
+            if entry.is_dir() and _JOB_DIR.match(entry.name):
+                dest = file_layout.temp_dir(kind, entry.name)
+                _move(entry.path, dest, file_layout.base_job_id(entry.name), "temp", dry_run, stats)
+
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrar al layout por shards")
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar qué se movería")
+    args = parser.parse_args()
+
+    if not settings.sharded_layout:
+        print("[Migrate] SHARDED_LAYOUT=false: no hay nada que migrar")
+        return
+
+    stats = migrate(args.dry_run)
+    summary = "  ".join(f"{kind}={count}" for kind, count in sorted(stats.items()))
+    print(f"[Migrate] {'Simulación' if args.dry_run else 'Migración'} terminada: {summary or 'nada que mover'}")
+
+
+if __name__ == "__main__":
+    main()
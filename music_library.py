@@ -0,0 +1,137 @@
+"""
+Biblioteca de música de fondo preprocesada.
+Mide la sonoridad de cada pista una sola vez (EBU R128) y guarda una
+versión normalizada en PCM (WAV); el motor de audio la lee directamente
+para hacer el loop, los fundidos y el ducking al mezclar.
+"""
+
+import os
+import json
+import asyncio
+from typing import Dict, Optional
+from app.config import settings
+from app.models.reel import MusicGenre
+from app.services.processes import run_ffmpeg
+
+
+# Evita que dos trabajos preparen la misma pista a la vez
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _lock_for(key: str) -> asyncio.Lock:
+    if key not in _locks:
+        _locks[key] = asyncio.Lock()
+    return _locks[key]
+
+
+class MusicLibraryService:
+    """Prepara y sirve la música de fondo normalizada."""
+
+    # Rutas de música de fondo incluidas (archivos locales)
+    MUSIC_FILES = {
+        MusicGenre.UPBEAT: "music/upbeat.mp3",
+        MusicGenre.AMBIENT: "music/ambient.mp3",
+        MusicGenre.DRAMATIC: "music/dramatic.mp3",
+        MusicGenre.MOTIVATIONAL: "music/motivational.mp3",
+    }
+
+    SAMPLE_RATE = 44100
+
+    def __init__(self):
+        self.assets_dir = os.path.join(os.path.dirname(__file__), "..", "..", "assets")
+        self.cache_dir = os.path.join(settings.temp_dir, "music")
+        self.target_lufs = settings.music_loudness_lufs
+
+    async def prepare_all(self) -> None:
+        """Prepara todas las pistas disponibles (se lanza al iniciar el servidor)."""
+        for genre in self.MUSIC_FILES:
+            try:
+                await self.prepare(genre)
+            except Exception as e:
+                print(f"[Music] No se pudo preparar '{genre.value}': {e}")
+
+    async def prepare(self, genre: MusicGenre) -> Optional[dict]:
+        """
+        Mide la sonoridad de la pista y guarda su versión normalizada en PCM
+        (la que usa el motor de audio para el loop y la mezcla).
+        Si ya está preparada y la fuente no cambió, no hace nada.
+
+        Returns:
+            Manifiesto de la pista preparada, o None si no hay archivo fuente
+        """
+        source = self._source_path(genre)
+        if not source or not os.path.exists(source):
+            return None
+
+        async with _lock_for(f"prepare:{genre.value}"):
+            manifest_path = os.path.join(self.cache_dir, f"{genre.value}.json")
+            stat = os.stat(source)
+            fingerprint = {
+                "source_size": stat.st_size,
+                "source_mtime": int(stat.st_mtime),
+                "target_lufs": self.target_lufs,
+            }
+
+            if os.path.exists(manifest_path):
+                with open(manifest_path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if all(manifest.get(k) == v for k, v in fingerprint.items()):
+                    return manifest
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Pasada 1: medir sonoridad integrada, pico real y rango
+            measured = await self._measure_loudness(source)
+
+            # Pasada 2: normalización lineal con los valores medidos
+            pcm_path = os.path.join(self.cache_dir, f"{genre.value}.wav")
+            loudnorm = (
+                f"loudnorm=I={self.target_lufs}:TP=-2:LRA=11"
+                f":measured_I={measured['input_i']}"
+                f":measured_TP={measured['input_tp']}"
+                f":measured_LRA={measured['input_lra']}"
+                f":measured_thresh={measured['input_thresh']}"
+                f":offset={measured['target_offset']}"
+                f":linear=true"
+            )
+            await run_ffmpeg([
+                "ffmpeg", "-y", "-i", source,
+                "-af", loudnorm,
+                "-ar", str(self.SAMPLE_RATE), "-ac", "2",
+                "-c:a", "pcm_s16le",
+                pcm_path
+            ])
+
+            manifest = {
+                **fingerprint,
+                "genre": genre.value,
+                "measured_lufs": float(measured["input_i"]),
+                "pcm_path": pcm_path,
+            }
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+            print(f"[Music] '{genre.value}' normalizada: "
+                  f"{manifest['measured_lufs']:.1f} → {self.target_lufs} LUFS")
+            return manifest
+
+    def _source_path(self, genre: MusicGenre) -> Optional[str]:
+        music_rel = self.MUSIC_FILES.get(genre)
+        if not music_rel:
+            return None
+        return os.path.join(self.assets_dir, music_rel)
+
+    async def _measure_loudness(self, source: str) -> dict:
+        """Mide la sonoridad EBU R128 con la primera pasada de loudnorm."""
+        output = await run_ffmpeg([
+            "ffmpeg", "-hide_banner", "-nostats",
+            "-i", source,
+            "-af", f"loudnorm=I={self.target_lufs}:TP=-2:LRA=11:print_format=json",
+            "-f", "null", "-"
+        ])
+
+        # loudnorm imprime el JSON al final del log
+        start = output.rfind("{")
+        if start == -1:
+            raise RuntimeError(f"No se pudo medir la sonoridad: {output[-500:]}")
+        return json.loads(output[start:output.rfind("}") + 1])
@@ -0,0 +1,79 @@
+"""
+Empaquetado de la vista previa del reel.
+A partir del video final, sin recodificarlo, genera segmentos HLS cortos
+con su playlist, un póster JPEG y una miniatura animada de baja resolución,
+todo en un solo proceso FFmpeg que lee el archivo una vez. Así el
+reproductor arranca con el primer segmento en lugar de esperar el MP4.
+"""
+
+import os
+import re
+from typing import Optional
+from app.config import settings
+from app.services.processes import run_ffmpeg
+from app.services import file_layout
+
+
+PLAYLIST = "index.m3u8"
+POSTER = "poster.jpg"
+THUMBNAIL = "thumb.gif"
+
+_SEGMENT_NAME = re.compile(r"^seg_\d{3}\.ts$")
+
+_MEDIA_TYPES = {
+    PLAYLIST: "application/vnd.apple.mpegurl",
+    POSTER: "image/jpeg",
+    THUMBNAIL: "image/gif",
+}
+
+
+def preview_dir(job_id: str) -> str:
+    return file_layout.preview_dir(job_id)
+
+
+def media_type(name: str) -> Optional[str]:
+    """Tipo MIME de un archivo de la vista previa; None si el nombre no es válido."""
+    if _SEGMENT_NAME.match(name):
+        return "video/mp2t"
+    return _MEDIA_TYPES.get(name)
+
+
+async def package_preview(video_path: str, job_id: str) -> list[str]:
+    """
+    Genera la vista previa de un video ya exportado.
+
+    El video se exporta con un fotograma clave cada hls_segment_seconds,
+    así los segmentos se cortan copiando el stream (sin codificar).
+
+    Returns:
+        Rutas de los archivos generados (playlist, segmentos, póster y miniatura)
+    """
+    out_dir = preview_dir(job_id)
+    os.makedirs(out_dir, exist_ok=True)
+
+    thumb_filter = (
+        "fps=8,scale=180:-2:flags=lanczos,"
+        "split[a][b];[a]palettegen=max_colors=64[p];[b][p]paletteuse"
+    )
+
+    await run_ffmpeg([
+        "ffmpeg", "-y", "-i", video_path,
+        # HLS: segmentos cortos copiados del video final
+        "-map", "0:v", "-map", "0:a?",
+        "-c", "copy",
+        "-f", "hls",
+        "-hls_time", str(settings.hls_segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(out_dir, "seg_%03d.ts"),
+        os.path.join(out_dir, PLAYLIST),
+        # Póster: un fotograma pasado el primer segundo (ya con el hook en pantalla)
+        "-map", "0:v", "-ss", "1", "-frames:v", "1",
+        "-vf", "scale=540:-2", "-q:v", "4",
+        os.path.join(out_dir, POSTER),
+        # Miniatura animada: 3 segundos a baja resolución
+        "-map", "0:v", "-t", "3",
+        "-vf", thumb_filter, "-loop", "0",
+        os.path.join(out_dir, THUMBNAIL),
+    ])
+
+    return [os.path.join(out_dir, name) for name in sorted(os.listdir(out_dir))]
@@ -0,0 +1,288 @@
+"""
+Ejecución de procesos FFmpeg asociados a un trabajo.
+Cada proceso corre en su propio grupo y queda registrado bajo el job_id
+del trabajo en curso, para poder terminarlo si el trabajo se cancela.
+Al terminar se recoge con os.wait4, que da su consumo total exacto (CPU,
+pico de memoria, bytes escritos) y se acumula por trabajo. Los límites de
+memoria virtual y CPU los fija un `sh` que luego hace exec de FFmpeg (sin
+Python en el hijo: el servidor tiene hilos), y el de tiempo real se vigila
+desde aquí, para que un trabajo patológico no tumbe el nodo.
+"""
+
+import os
+import signal
+import asyncio
+import subprocess
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+from app.config import settings
+from app.services.executors import run_io
+from app.services.metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Fuera de Unix: sin límites
+    resource = None
+
+# Trabajo al que pertenece la tarea asíncrona actual (se hereda en subtareas)
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+# Procesos hijos vivos de cada trabajo
+_processes: Dict[str, Set[subprocess.Popen]] = {}
+
+# Consumo acumulado de los procesos de cada trabajo
+_usage: Dict[str, dict] = {}
+
+
+class ProcessLimitError(RuntimeError):
+    """Un proceso FFmpeg superó uno de sus límites (memoria, CPU o tiempo)."""
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+class ProcessUsage:
+    """Consumo total de un proceso hijo, tomado de os.wait4 al recogerlo."""
+
+    def __init__(self, cpu_seconds: float = 0.0, peak_rss_bytes: int = 0, bytes_written: int = 0):
+        self.cpu_seconds = cpu_seconds
+        self.peak_rss_bytes = peak_rss_bytes
+        self.bytes_written = bytes_written
+
+    @classmethod
+    def from_rusage(cls, rusage) -> "ProcessUsage":
+        return cls(
+            cpu_seconds=rusage.ru_utime + rusage.ru_stime,
+            peak_rss_bytes=rusage.ru_maxrss * 1024,        # Linux lo da en KiB
+            bytes_written=rusage.ru_oublock * 512          # Bloques de 512 bytes (write_bytes)
+        )
+
+
+def job_usage(job_id: str) -> Optional[dict]:
+    """Consumo acumulado de los procesos de un trabajo hasta ahora."""
+    usage = _usage.get(job_id)
+    return dict(usage) if usage else None
+
+
+def pop_job_usage(job_id: str) -> Optional[dict]:
+    """Retorna el consumo final de un trabajo y lo olvida."""
+    return _usage.pop(job_id, None)
+
+
+def _record_usage(job_id: Optional[str], usage: ProcessUsage) -> None:
+    metrics.observe("ffmpeg_cpu_seconds", usage.cpu_seconds)
+    metrics.observe("ffmpeg_peak_rss_mb", usage.peak_rss_bytes / 2**20)
+    if not job_id:
+        return
+
+    totals = _usage.setdefault(job_id, {
+        "cpu_seconds": 0.0, "peak_rss_mb": 0.0, "bytes_written": 0, "processes": 0
+    })
+    totals["cpu_seconds"] = round(totals["cpu_seconds"] + usage.cpu_seconds, 2)
+    totals["peak_rss_mb"] = max(totals["peak_rss_mb"], round(usage.peak_rss_bytes / 2**20, 1))
+    totals["bytes_written"] += usage.bytes_written
+    totals["processes"] += 1
+
+
+def _rlimits() -> list[tuple[int, tuple[int, int]]]:
+    """Límites de memoria virtual y CPU para cada proceso FFmpeg."""
+    if resource is None:
+        return []
+
+    limits = []
+    if settings.ffmpeg_max_memory_mb > 0:
+        memory = settings.ffmpeg_max_memory_mb * 2**20
+        limits.append((resource.RLIMIT_AS, (memory, memory)))
+    if settings.ffmpeg_max_cpu_seconds > 0:
+        # Blando: SIGXCPU; duro (unos segundos después): SIGKILL
+        cpu = settings.ffmpeg_max_cpu_seconds
+        limits.append((resource.RLIMIT_CPU, (cpu, cpu + 5)))
+
+    # Sin privilegios no se puede subir el límite duro actual: se respeta
+    capped = []
+    for limit, (soft, hard) in limits:
+        _, current_hard = resource.getrlimit(limit)
+        if current_hard != resource.RLIM_INFINITY:
+            hard = min(hard, current_hard)
+            soft = min(soft, hard)
+        capped.append((limit, (soft, hard)))
+    return capped
+
+
+def _with_limits(cmd: list[str]) -> list[str]:
+    """
+    Antepone al comando un `sh` que fija los límites con ulimit y hace exec
+    del comando: mismo PID (wait4 y killpg siguen valiendo) y FFmpeg nunca
+    corre sin límites. No usa preexec_fn, inseguro con hilos y que obliga a
+    fork en vez de vfork/posix_spawn.
+    """
+    limits = dict(_rlimits())
+    if not limits:
+        return cmd
+
+    # Primero el blando: bajar el duro por debajo del blando actual falla
+    script = []
+    if resource.RLIMIT_AS in limits:
+        soft, hard = limits[resource.RLIMIT_AS]
+        script.append(f"ulimit -S -v {soft // 1024}; ulimit -H -v {hard // 1024}")
+    if resource.RLIMIT_CPU in limits:
+        soft, hard = limits[resource.RLIMIT_CPU]
+        script.append(f"ulimit -S -t {soft}; ulimit -H -t {hard}")
+    script.append('exec "$@"')
+    return ["sh", "-c", "; ".join(script), "sh", *cmd]
+
+
+async def _reap(proc: subprocess.Popen) -> ProcessUsage:
+    """
+    Espera a que el proceso termine y lo recoge con os.wait4, que incluye
+    todo su consumo hasta el final. Fija proc.returncode (-señal si lo mató una).
+    """
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        # Sin pidfd (Linux < 5.3): la espera bloqueante va al pool de E/S
+        _, status, rusage = await run_io(os.wait4, proc.pid, 0)
+    else:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+
+        def on_exit() -> None:
+            if not exited.done():
+                exited.set_result(None)
+
+        loop.add_reader(pidfd, on_exit)
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+        _, status, rusage = os.wait4(proc.pid, 0)   # Ya terminó: no bloquea
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return ProcessUsage.from_rusage(rusage)
+
+
+async def _read_pipe(pipe) -> bytes:
+    """Lee una tubería del proceso hasta EOF sin bloquear el loop."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe
+    )
+    try:
+        return await reader.read()
+    finally:
+        transport.close()
+
+
+def _limit_error(returncode: int, stderr: str, usage: ProcessUsage) -> Optional[ProcessLimitError]:
+    """Traduce la salida de un proceso que murió por un límite a un error claro."""
+    cpu_limit = settings.ffmpeg_max_cpu_seconds
+    if cpu_limit > 0 and (
+        returncode == -signal.SIGXCPU
+        or (returncode == -signal.SIGKILL and usage.cpu_seconds >= cpu_limit * 0.9)
+    ):
+        return ProcessLimitError(
+            "cpu", f"FFmpeg superó el límite de CPU ({cpu_limit} s de CPU)"
+        )
+
+    # Con RLIMIT_AS las reservas fallan: FFmpeg y x264 lo dicen en su log
+    memory_limit = settings.ffmpeg_max_memory_mb
+    out_of_memory = any(
+        text in stderr
+        for text in ("Cannot allocate memory", "Out of memory", "out of memory", "malloc of size")
+    )
+    if memory_limit > 0 and out_of_memory:
+        return ProcessLimitError(
+            "memory", f"FFmpeg superó el límite de memoria ({memory_limit} MB)"
+        )
+    return None
+
+
+def _kill_group(proc: subprocess.Popen, sig: int = signal.SIGKILL) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_job_processes(job_id: str) -> int:
+    """Termina todos los procesos hijos de un trabajo. Retorna cuántos había."""
+    procs = _processes.pop(job_id, set())
+    for proc in procs:
+        _kill_group(proc)
+    return len(procs)
+
+
+async def run_ffmpeg(cmd: list[str]) -> str:
+    """
+    Ejecuta un comando FFmpeg de forma asíncrona en su propio grupo de procesos.
+    Si la tarea se cancela, mata el grupo completo antes de propagar la cancelación.
+
+    Returns:
+        La salida de error de FFmpeg (donde escribe su log)
+    """
+    _, stderr = await _communicate(cmd)
+    return stderr.decode(errors="replace")
+
+
+async def ffmpeg_output(cmd: list[str]) -> bytes:
+    """Como run_ffmpeg, pero retorna lo que FFmpeg escribe en stdout (p. ej. PCM crudo)."""
+    stdout, _ = await _communicate(cmd)
+    return stdout
+
+
+async def _communicate(cmd: list[str]) -> tuple[bytes, bytes]:
+    job_id = current_job_id.get()
+    proc = subprocess.Popen(
+        _with_limits(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+    if job_id:
+        _processes.setdefault(job_id, set()).add(proc)
+
+    # Lo recoge _reap (no el watcher de asyncio) para tener su consumo exacto
+    reaped = asyncio.ensure_future(_reap(proc))
+    timeout = settings.ffmpeg_timeout_seconds or None
+    usage: Optional[ProcessUsage] = None
+
+    try:
+        stdout, stderr, usage = await asyncio.wait_for(
+            asyncio.gather(
+                _read_pipe(proc.stdout), _read_pipe(proc.stderr), asyncio.shield(reaped)
+            ),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        _kill_group(proc)
+        usage = await asyncio.shield(reaped)
+        metrics.increment("ffmpeg_limit_exceeded", limit="timeout")
+        raise ProcessLimitError(
+            "timeout", f"FFmpeg superó el tiempo máximo ({timeout:g} s) y se detuvo"
+        )
+    except asyncio.CancelledError:
+        _kill_group(proc)
+        usage = await asyncio.shield(reaped)
+        raise
+    finally:
+        if usage:
+            _record_usage(job_id, usage)
+        if job_id and job_id in _processes:
+            _processes[job_id].discard(proc)
+            if not _processes[job_id]:
+                del _processes[job_id]
+
+    if proc.returncode != 0:
+        error_msg = stderr.decode(errors="replace")
+        limit_error = _limit_error(proc.returncode, error_msg, usage)
+        if limit_error:
+            metrics.increment("ffmpeg_limit_exceeded", limit=limit_error.limit)
+            raise limit_error
+        raise RuntimeError(f"FFmpeg error (código {proc.returncode}): {error_msg[-500:]}")
+
+    return stdout, stderr
@@ -0,0 +1,215 @@
+"""
+Salud de los proveedores externos (ElevenLabs, OpenAI, Pexels...).
+Un circuit breaker por proveedor, reintentos con backoff exponencial y
+jitter para errores transitorios, y enrutamiento que salta de inmediato
+los proveedores que se sabe que están caídos.
+"""
+
+import time
+import random
+import asyncio
+from collections import deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import settings
+
+
+class ProviderError(Exception):
+    """Error devuelto por un proveedor externo."""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+
+class ProviderUnavailable(ProviderError):
+    """El circuito del proveedor está abierto: no se intenta la llamada."""
+
+
+class BreakerState(str, Enum):
+    """Estado de un circuit breaker."""
+    CLOSED = "closed"          # Funcionando: se envían peticiones
+    OPEN = "open"              # Caído: se salta sin llamar
+    HALF_OPEN = "half_open"    # Probando si se recuperó
+
+
+def _classify(exc: BaseException) -> tuple[bool, bool]:
+    """
+    Clasifica un error de proveedor.
+
+    Returns:
+        (reintentable, cuenta como fallo del proveedor)
+    """
+    import httpx
+
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True, True
+
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        # Errores de conexión y timeout del SDK de OpenAI
+        return type(exc).__name__ in ("APIConnectionError", "APITimeoutError"), True
+    if status == 429 or status >= 500:
+        return True, True
+    if status in (401, 402, 403):
+        # Clave inválida o cuota agotada: no sirve reintentar, pero el proveedor no está usable
+        return False, True
+    # Otros 4xx (prompt rechazado, etc.) dependen de la petición, no del proveedor
+    return False, False
+
+
+class CircuitBreaker:
+    """Circuit breaker de un proveedor."""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+        # Latencias recientes de las llamadas (segundos)
+        self.latencies: deque = deque(maxlen=200)
+
+    @property
+    def state(self) -> BreakerState:
+        if self.opened_at is None:
+            return BreakerState.CLOSED
+        if time.monotonic() - self.opened_at >= self.recovery_seconds:
+            return BreakerState.HALF_OPEN
+        return BreakerState.OPEN
+
+    def allow_request(self) -> bool:
+        """Indica si se puede llamar al proveedor; en half-open deja pasar una sola prueba."""
+        state = self.state
+        if state == BreakerState.CLOSED:
+            return True
+        if state == BreakerState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            print(f"[Providers] {self.name} recuperado, circuito cerrado")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException) -> None:
+        self.consecutive_failures += 1
+        self.last_error = str(error)[:200]
+        was_probe = self._probe_in_flight
+        self._probe_in_flight = False
+
+        if was_probe or self.consecutive_failures >= self.failure_threshold:
+            if self.state != BreakerState.OPEN:
+                print(f"[Providers] {self.name} abierto tras "
+                      f"{self.consecutive_failures} fallos: {self.last_error}")
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Libera la prueba half-open si la llamada terminó sin veredicto."""
+        self._probe_in_flight = False
+
+    def latency_percentile(self, percentile: float, min_samples: int = 10) -> Optional[float]:
+        """Percentil de la latencia reciente, o None si aún hay pocas muestras."""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        state = self.state
+        retry_in = None
+        if state == BreakerState.OPEN:
+            retry_in = round(self.recovery_seconds - (time.monotonic() - self.opened_at), 1)
+        return {
+            "state": state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": retry_in,
+            "last_error": self.last_error,
+            "latency_p50": self.latency_percentile(50),
+            "latency_p95": self.latency_percentile(95),
+        }
+
+
+class ProviderHealthRegistry:
+    """Registro de circuit breakers compartido por todos los servicios."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=settings.breaker_failure_threshold,
+                recovery_seconds=settings.breaker_recovery_seconds
+            )
+        return self._breakers[provider]
+
+    def is_available(self, provider: str) -> bool:
+        """True salvo que el circuito esté abierto (half-open cuenta como disponible)."""
+        return self.breaker(provider).state != BreakerState.OPEN
+
+    async def call(
+        self,
+        provider: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs
+    ) -> Any:
+        """
+        Llama al proveedor a través de su circuit breaker.
+
+        Reintenta los errores transitorios (timeouts, 429, 5xx) con backoff
+        exponencial y jitter completo. Si el circuito está abierto lanza
+        ProviderUnavailable sin llamar.
+        """
+        breaker = self.breaker(provider)
+        attempt = 0
+
+        while True:
+            if not breaker.allow_request():
+                raise ProviderUnavailable(provider, "circuito abierto, se omite")
+
+            started = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                # Cota inferior de la latencia (p. ej. perdió un hedge): también cuenta
+                breaker.latencies.append(time.monotonic() - started)
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                retryable, counts = _classify(e)
+                if counts:
+                    breaker.record_failure(e)
+                else:
+                    breaker.release_probe()
+
+                if not retryable or attempt >= settings.provider_max_retries:
+                    raise
+
+                delay = min(
+                    settings.provider_backoff_max_seconds,
+                    settings.provider_backoff_base_seconds * (2 ** attempt)
+                )
+                attempt += 1
+                await asyncio.sleep(random.uniform(0, delay))
+                continue
+
+            breaker.latencies.append(time.monotonic() - started)
+            breaker.record_success()
+            return result
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: b.snapshot() for name, b in self._breakers.items()}
+
+
+# Instancia global compartida por los servicios
+provider_health = ProviderHealthRegistry()
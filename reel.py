@@ -3,7 +3,7 @@ Modelos Pydantic para validación de datos del reel.
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Annotated, Optional, List, Dict
 from enum import Enum
 
 
@@ -30,6 +30,39 @@ class MusicGenre(str, Enum):
     MOTIVATIONAL = "motivational"
 
 
+class ReelFormat(str, Enum):
+    """Relación de aspecto del video exportado."""
+    VERTICAL = "9:16"    # Reels / Stories
+    PORTRAIT = "4:5"     # Feed
+    SQUARE = "1:1"       # Feed cuadrado
+
+
+class ExportProfile(str, Enum):
+    """Perfil de codificación de la exportación final."""
+    QUALITY = "quality"     # Máxima calidad, archivos más grandes
+    BALANCED = "balanced"   # Calidad alta con bitrate acotado
+    COMPACT = "compact"     # Archivos pequeños para subir desde el móvil
+    FAST = "fast"           # Preset rápido cuando la CPU es el cuello de botella
+
+
+class JobPriority(str, Enum):
+    """Carril de planificación del trabajo."""
+    INTERACTIVE = "interactive"   # Reels sueltos: se atienden primero
+    BULK = "bulk"                 # Lotes y trabajos masivos
+
+
+class JobStatus(str, Enum):
+    """Estado del trabajo de generación."""
+    PENDING = "pending"
+    GENERATING_SCRIPT = "generating_script"
+    GENERATING_AUDIO = "generating_audio"
+    GENERATING_IMAGES = "generating_images"
+    COMPOSING_VIDEO = "composing_video"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
 class ReelRequest(BaseModel):
     """Solicitud para crear un nuevo reel."""
     topic: str = Field(
@@ -65,6 +98,51 @@ class ReelRequest(BaseModel):
         default=True,
         description="Añadir subtítulos estilo TikTok"
     )
+    formats: List[ReelFormat] = Field(
+        default=[ReelFormat.VERTICAL],
+        min_length=1,
+        description="Relaciones de aspecto a exportar (reutilizan guion, voz e imágenes)"
+    )
+    priority: JobPriority = Field(
+        default=JobPriority.INTERACTIVE,
+        description="Carril de planificación (los lotes siempre van como bulk)"
+    )
+    extra_languages: List[Annotated[str, Field(pattern=r"^[a-z]{2}$")]] = Field(
+        default=[],
+        max_length=3,
+        description="Idiomas adicionales (mismas imágenes; voz y subtítulos propios)",
+        examples=[["en"]]
+    )
+    export_profile: ExportProfile = Field(
+        default=ExportProfile.BALANCED,
+        description="Perfil de codificación (calidad, tamaño y velocidad)"
+    )
+    max_file_mb: Optional[int] = Field(
+        default=None,
+        ge=5,
+        le=500,
+        description="Tamaño máximo de cada video en MB (baja el bitrate si hace falta)"
+    )
+    callback_url: Optional[str] = Field(
+        default=None,
+        max_length=2000,
+        pattern=r"^https?://",
+        description="URL que recibe un webhook al terminar el trabajo (completed, failed, cancelled)"
+    )
+    callback_events: List[JobStatus] = Field(
+        default=[],
+        description="Etapas intermedias que también se notifican por webhook"
+    )
+
+
+class BatchReelRequest(BaseModel):
+    """Solicitud para generar varios reels en una sola llamada."""
+    requests: List[ReelRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=50,
+        description="Reels a generar en el lote"
+    )
 
 
 class ScriptScene(BaseModel):
@@ -76,6 +154,20 @@ class ScriptScene(BaseModel):
     transition: str = "fade"     # Tipo de transición
 
 
+class WordTiming(BaseModel):
+    """Una palabra de la narración con su posición en el audio."""
+    word: str
+    start: float                 # Segundos desde el inicio de la narración
+    end: float
+
+
+class NarrationTiming(BaseModel):
+    """Narración completa en un solo audio, con tiempos de escenas y palabras."""
+    audio_path: str
+    scene_durations: List[float]
+    words: List[WordTiming]
+
+
 class ReelScript(BaseModel):
     """Guion completo generado por IA."""
     title: str
@@ -86,27 +178,72 @@ class ReelScript(BaseModel):
     total_duration: float
 
 
-class JobStatus(str, Enum):
-    """Estado del trabajo de generación."""
-    PENDING = "pending"
-    GENERATING_SCRIPT = "generating_script"
-    GENERATING_AUDIO = "generating_audio"
-    GENERATING_IMAGES = "generating_images"
-    COMPOSING_VIDEO = "composing_video"
-    COMPLETED = "completed"
-    FAILED = "failed"
+class JobResources(BaseModel):
+    """Recursos consumidos por los procesos FFmpeg de un trabajo."""
+    cpu_seconds: float = 0.0     # Suma de CPU (usuario + sistema)
+    peak_rss_mb: float = 0.0     # Mayor pico de memoria residente de un proceso
+    bytes_written: int = 0       # Bytes escritos a disco
+    processes: int = 0           # Procesos FFmpeg lanzados
+
+
+class VideoOutput(BaseModel):
+    """Video final de un formato, con su tamaño y bitrate reales."""
+    format: str
+    profile: str
+    size_bytes: int
+    duration_seconds: float
+    bitrate_kbps: int
+    within_max_size: Optional[bool] = None   # Si cumple max_file_mb (None sin tamaño máximo)
+
+
+class PreviewAssets(BaseModel):
+    """Vista previa empaquetada: HLS, póster y miniatura animada."""
+    hls_url: str
+    poster_url: str
+    thumbnail_url: str
+
+
+class LanguageVariant(BaseModel):
+    """Versión del reel en otro idioma: mismas imágenes, voz y subtítulos propios."""
+    language: str
+    script: Optional[ReelScript] = None
+    download_url: Optional[str] = None
+    download_urls: Dict[str, str] = {}   # Formato -> URL de descarga
+    outputs: Dict[str, VideoOutput] = {}
+    error: Optional[str] = None
+
+
+class WebhookDelivery(BaseModel):
+    """Entrega de un evento a la callback_url del trabajo."""
+    event: str                   # job.completed, job.failed, job.generating_audio...
+    url: str
+    attempts: int = 0
+    delivered: bool = False
+    status_code: Optional[int] = None   # Última respuesta HTTP del receptor
+    error: Optional[str] = None         # Último error (None si se entregó)
+    delivered_at: Optional[str] = None
 
 
 class ReelJob(BaseModel):
     """Trabajo de generación de reel."""
     job_id: str
+    version: int = 0                      # Sube con cada cambio (para ?since=)
     status: JobStatus
     progress: int = Field(default=0, ge=0, le=100)
     message: str = ""
     download_url: Optional[str] = None
+    download_urls: Dict[str, str] = {}   # Formato -> URL de descarga
+    outputs: Dict[str, VideoOutput] = {}  # Formato -> tamaño y bitrate del video
+    preview: Optional[PreviewAssets] = None  # Vista previa de arranque rápido
     script: Optional[ReelScript] = None
+    language: Optional[str] = None        # Idioma principal del reel
+    variants: Dict[str, LanguageVariant] = {}  # Idioma -> versión traducida
     error: Optional[str] = None
     created_at: Optional[str] = None
+    queue_position: Optional[int] = None  # 1 = el siguiente en arrancar
+    eta_seconds: Optional[int] = None     # Tiempo estimado hasta terminar
+    resources: Optional[JobResources] = None  # Consumo de FFmpeg (al terminar)
+    webhooks: List[WebhookDelivery] = []  # Entregas a callback_url
 
 
 class ReelResponse(BaseModel):
@@ -114,3 +251,44 @@ class ReelResponse(BaseModel):
     job_id: str
     message: str
     estimated_time_seconds: int
+    queue_position: Optional[int] = None
+
+
+class BatchStatus(str, Enum):
+    """Estado agregado de un lote de reels."""
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    PARTIAL = "partial"          # Terminó con algunos reels fallidos
+    FAILED = "failed"
+
+
+class BatchItem(BaseModel):
+    """Estado de un reel dentro de un lote."""
+    job_id: str
+    topic: str
+    status: JobStatus
+    progress: int = 0
+    download_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchJob(BaseModel):
+    """Lote de reels con su estado agregado (sirve también de manifiesto)."""
+    batch_id: str
+    status: BatchStatus
+    progress: int = Field(default=0, ge=0, le=100)
+    total: int
+    completed: int = 0
+    failed: int = 0
+    items: List[BatchItem]
+    download_url: Optional[str] = None
+    created_at: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """Respuesta inicial al crear un lote."""
+    batch_id: str
+    job_ids: List[str]
+    message: str
+    estimated_time_seconds: int
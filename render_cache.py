@@ -0,0 +1,173 @@
+"""
+Caché de renders completos.
+Si el guion, el contenido de los archivos de entrada y las opciones de
+render coinciden con un render anterior, el MP4 ya existe: se enlaza (hard
+link) en la ruta de salida del nuevo trabajo sin lanzar FFmpeg. Las entradas
+caducan con la misma retención que los archivos de salida (max_file_age_hours).
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from app.config import settings
+from app.models.reel import ReelScript, ReelFormat
+from app.services.metrics import metrics
+from app.services.executors import run_io
+
+
+# Cada cuánto revisa el conserje las entradas caducadas
+JANITOR_INTERVAL_SECONDS = 3600
+
+# Hashes de contenido ya calculados: ruta -> (tamaño, mtime_ns, sha256).
+# LRU acotado: las entradas de trabajos ya terminados van saliendo solas
+FILE_HASHES_MAX_ENTRIES = 2048
+_file_hashes: "OrderedDict[str, tuple]" = OrderedDict()
+_file_hashes_lock = threading.Lock()   # Se usa desde varios hilos del pool de E/S
+
+
+def cache_dir() -> str:
+    return os.path.join(settings.temp_dir, "render_cache")
+
+
+def entry_path(fingerprint: str, fmt: ReelFormat) -> str:
+    suffix = fmt.value.replace(":", "x")
+    return os.path.join(cache_dir(), fingerprint[:2], f"{fingerprint}_{suffix}.mp4")
+
+
+async def fingerprint(
+    script: ReelScript,
+    image_files: list[str],
+    audio_files: list[str],
+    options: dict
+) -> str:
+    """
+    Huella determinista del render: guion, hash de contenido de cada imagen
+    y audio (en orden) y opciones de render. Los nombres de archivo no
+    cuentan, así dos trabajos con las mismas entradas comparten resultado.
+    """
+    assets = await run_io(lambda: {
+        "images": [_file_digest(path) for path in image_files],
+        "audio": [_file_digest(path) for path in audio_files],
+    })
+    payload = json.dumps(
+        {
+            "script": script.model_dump(mode="json"),
+            "assets": assets,
+            "options": options,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _file_digest(path: str) -> str:
+    """sha256 del contenido; se recalcula solo si cambia el tamaño o el mtime."""
+    stat = os.stat(path)
+    with _file_hashes_lock:
+        cached = _file_hashes.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            _file_hashes.move_to_end(path)
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    with _file_hashes_lock:
+        _file_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        _file_hashes.move_to_end(path)
+        while len(_file_hashes) > FILE_HASHES_MAX_ENTRIES:
+            _file_hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+async def fetch(fingerprint: str, fmt: ReelFormat, dest: str) -> bool:
+    """
+    Enlaza el render en caché en `dest` si existe.
+
+    Returns:
+        True si hubo acierto y `dest` ya tiene el video final
+    """
+    if not settings.render_cache_enabled:
+        return False
+
+    path = entry_path(fingerprint, fmt)
+    try:
+        await run_io(_link, path, dest)
+    except FileNotFoundError:
+        metrics.increment("render_cache_misses", format=fmt.value)
+        return False
+
+    # Un acierto renueva la entrada: caduca contando desde su último uso
+    await run_io(os.utime, path)
+    metrics.increment("render_cache_hits", format=fmt.value)
+    return True
+
+
+async def store(fingerprint: str, fmt: ReelFormat, source: str) -> None:
+    """Guarda el video recién exportado en la caché (otro enlace al mismo archivo)."""
+    if not settings.render_cache_enabled:
+        return
+    try:
+        await run_io(_link, source, entry_path(fingerprint, fmt))
+    except OSError as e:
+        print(f"[RenderCache] No se pudo guardar {fingerprint[:12]} ({fmt.value}): {e}")
+
+
+def _link(source: str, dest: str) -> None:
+    """
+    Hard link atómico de `source` en `dest`; si están en sistemas de archivos
+    distintos se copia. Sin la fuente lanza FileNotFoundError.
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    partial_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.part"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    try:
+        os.link(source, partial_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, partial_path)
+    os.replace(partial_path, dest)
+
+
+def evict_expired() -> int:
+    """Borra las entradas sin usar desde hace más de max_file_age_hours."""
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - settings.max_file_age_hours * 3600
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+async def janitor() -> None:
+    """Tarea de fondo: aplica la retención a la caché cada hora."""
+    while True:
+        try:
+            removed = await run_io(evict_expired)
+            if removed:
+                metrics.increment("render_cache_evictions", removed)
+                print(f"[RenderCache] {removed} renders caducados eliminados")
+        except Exception as e:
+            print(f"[RenderCache] Error en la limpieza: {e}")
+        await asyncio.sleep(JANITOR_INTERVAL_SECONDS)
@@ -4,20 +4,47 @@ Endpoints para crear reels, consultar estado y descargar.
 """
 
 import os
-import asyncio
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
-from app.models.reel import ReelRequest, ReelResponse, ReelJob
+import math
+import hashlib
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Header, Depends, Response
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from app.models.reel import (
+    ReelRequest, ReelResponse, ReelJob, ReelFormat,
+    BatchReelRequest, BatchResponse, BatchJob
+)
 from app.services import job_manager
+from app.services.scheduler import QueueFullError, scheduler
+from app.services.storage import get_storage
+from app.services.video_composer import min_file_mb, output_path
+from app.services.webhooks import check_callback_url
+from app.services import preview_packager
 from app.config import settings
 
 router = APIRouter(prefix="/api", tags=["reels"])
 
 
+def get_tenant_id(
+    x_tenant_id: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None)
+) -> str:
+    """
+    Identifica al cliente que hace la petición.
+    Usa X-Tenant-ID si viene; si no, un hash de X-API-Key (nunca la clave en claro).
+    """
+    if x_tenant_id:
+        return x_tenant_id[:64]
+    if x_api_key:
+        return "key-" + hashlib.sha256(x_api_key.encode()).hexdigest()[:12]
+    return "anonymous"
+
+
 @router.post("/generate", response_model=ReelResponse, status_code=202)
 async def generate_reel(
     request: ReelRequest,
-    background_tasks: BackgroundTasks
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255)
 ):
     """
     Inicia la generación de un reel.
@@ -25,29 +52,169 @@ async def generate_reel(
     - Crea un trabajo en cola
     - Procesa en background (asíncrono)
     - Retorna el job_id para consultar el estado
+
+    Con cabecera `Idempotency-Key`, los reintentos con la misma clave
+    devuelven la respuesta original sin crear otro trabajo.
     """
-    # Crear trabajo y obtener ID
-    job_id = job_manager.create_job()
+    if not idempotency_key:
+        return _start_reel(request, tenant_id)
 
-    # Lanzar procesamiento en background
-    background_tasks.add_task(
-        job_manager.process_reel_job,
-        job_id,
-        request
-    )
+    # La clave es propia de cada tenant; la huella detecta reutilizaciones
+    key = f"{tenant_id}:{idempotency_key}"
+    fingerprint = hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+
+    async with job_manager.idempotency_lock(key):
+        try:
+            original = job_manager.get_idempotent_response(key, fingerprint)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        if original is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return original
+
+        # Un 429 no se guarda: el cliente debe poder reintentar con la misma clave
+        reel_response = _start_reel(request, tenant_id)
+        job_manager.save_idempotent_response(key, fingerprint, reel_response)
+        return reel_response
+
+
+def _validate_requests(requests: list[ReelRequest]) -> None:
+    """
+    422 si alguna callback_url apunta a un host interno o si max_file_mb no
+    se puede cumplir ni con el bitrate mínimo para la duración pedida.
+    """
+    for request in requests:
+        if request.max_file_mb:
+            minimum = min_file_mb(request.duration_seconds, request.export_profile)
+            if request.max_file_mb < minimum:
+                raise HTTPException(
+                    status_code=422,
+                    detail=(
+                        f"max_file_mb={request.max_file_mb} no alcanza para "
+                        f"{request.duration_seconds}s con el perfil "
+                        f"{request.export_profile.value} (mínimo {math.ceil(minimum)} MB)"
+                    )
+                )
+        if request.callback_url:
+            try:
+                check_callback_url(request.callback_url)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
 
-    # Estimar tiempo según cantidad de escenas
-    estimated = request.duration_seconds * 4  # ~4s de procesamiento por segundo de video
 
+def _start_reel(request: ReelRequest, tenant_id: str) -> ReelResponse:
+    """Crea el trabajo, lanza su procesamiento y arma la respuesta."""
+    _validate_requests([request])
+
+    # Crear trabajo y obtener ID (rechazar si la cola está llena)
+    try:
+        job_id = job_manager.create_job(
+            job_manager.job_cost(request), tenant_id, request.priority
+        )
+    except QueueFullError as e:
+        raise _queue_full(e)
+    job_manager.register_webhook(job_id, request)
+
+    # Lanzar procesamiento en background (tarea propia, cancelable)
+    job_manager.start_reel_job(job_id, request, tenant_id=tenant_id)
+
+    # Estimar tiempo con el modelo de duración de etapas y la cola actual
     return ReelResponse(
         job_id=job_id,
         message="Generación iniciada. Consulta el estado con el job_id.",
-        estimated_time_seconds=estimated
+        estimated_time_seconds=scheduler.eta(job_id),
+        queue_position=scheduler.position(job_id)
+    )
+
+
+@router.post("/generate/batch", response_model=BatchResponse, status_code=202)
+async def generate_batch(
+    batch: BatchReelRequest,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    Inicia la generación de un lote de reels (hasta 50 temas).
+
+    - Crea un trabajo por tema, agrupados bajo un batch_id
+    - Los guiones se generan agrupados en pocas llamadas a GPT
+    - Retorna el batch_id para consultar el estado agregado
+    """
+    _validate_requests(batch.requests)
+    try:
+        batch_id, job_ids = job_manager.create_batch(batch.requests, tenant_id)
+    except QueueFullError as e:
+        raise _queue_full(e)
+
+    job_manager.start_batch_job(batch_id, batch.requests, tenant_id=tenant_id)
+
+    # El lote termina cuando termina su último trabajo en la cola
+    return BatchResponse(
+        batch_id=batch_id,
+        job_ids=job_ids,
+        message="Lote iniciado. Consulta el estado con el batch_id.",
+        estimated_time_seconds=max(scheduler.eta(j) for j in job_ids)
+    )
+
+
+@router.get("/batch/{batch_id}", response_model=BatchJob)
+async def get_batch_status(batch_id: str):
+    """
+    Consulta el estado agregado de un lote.
+    Incluye el estado y la URL de descarga de cada reel (manifiesto).
+    """
+    batch = job_manager.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return batch
+
+
+@router.get("/batch/{batch_id}/download")
+async def download_batch(batch_id: str):
+    """
+    Descarga un ZIP con los reels completados del lote y su manifiesto.
+    Solo disponible cuando todos los trabajos del lote terminaron.
+    """
+    batch = job_manager.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+
+    if not batch.download_url:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote no está listo. Estado actual: {batch.status.value}"
+        )
+
+    # Normalmente ya existe (se arma al terminar el lote); si no, se arma una vez
+    archive_path = await job_manager.ensure_batch_archive(batch_id)
+    filename = f"reels_{batch_id[:8]}.zip"
+
+    # Con almacenamiento de objetos, el cliente descarga directo del bucket
+    url = await get_storage().presigned_url(archive_path, filename=filename)
+    if url:
+        return RedirectResponse(url, status_code=302)
+
+    return FileResponse(
+        path=archive_path,
+        media_type="application/zip",
+        filename=filename
     )
 
 
 @router.get("/status/{job_id}", response_model=ReelJob)
-async def get_job_status(job_id: str):
+async def get_job_status(
+    job_id: str,
+    fields: Optional[str] = Query(
+        default=None,
+        description="Campos a devolver separados por comas (p. ej. status,progress,message)"
+    ),
+    since: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Última versión recibida: 304 si no hay cambios, o solo los campos cambiados"
+    ),
+    if_none_match: Optional[str] = Header(default=None)
+):
     """
     Consulta el estado actual de un trabajo de generación.
 
@@ -59,15 +226,93 @@ async def get_job_status(job_id: str):
     - composing_video: Ensamblando video con FFmpeg
     - completed: Listo para descargar
     - failed: Error durante la generación
+    - cancelled: Cancelado por el usuario
+
+    Para un polling barato: `fields` limita los campos serializados y
+    `since` devuelve solo los campos modificados desde esa versión (más
+    job_id, version y los calculados al leer: queue_position y eta_seconds).
+    Si la versión no cambió, 304 mientras no haya posición ni ETA; si las
+    hay (en cola o en curso), solo esas dos. El ETag incluye versión,
+    posición y ETA: con If-None-Match el 304 también tiene en cuenta ambas.
     """
     job = job_manager.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Trabajo no encontrado")
-    return job
+
+    etag = f'"{job.version}-{job.queue_position}-{job.eta_seconds}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    if fields is None and since is None:
+        return JSONResponse(job.model_dump(mode="json"), headers=headers)
+
+    include = set(ReelJob.model_fields)
+    if fields is not None:
+        include = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = include - set(ReelJob.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos desconocidos: {', '.join(sorted(unknown))}"
+            )
+
+    if since is not None:
+        if job.version <= since:
+            # Sin cambios versionados: solo pueden haber avanzado posición y ETA
+            volatile = {
+                name for name in job_manager.VOLATILE_FIELDS
+                if getattr(job, name) is not None
+            }
+            include &= volatile
+            if not include:
+                return Response(status_code=304, headers=headers)
+        else:
+            include &= job_manager.changed_fields(job, since) | job_manager.VOLATILE_FIELDS
+
+    return JSONResponse(
+        job.model_dump(mode="json", include=include | {"job_id", "version"}),
+        headers=headers
+    )
+
+
+def _queue_full(error: QueueFullError) -> HTTPException:
+    """Respuesta 429 con Retry-After cuando la cola está llena."""
+    return HTTPException(
+        status_code=429,
+        detail="El servidor está al máximo de trabajos. Reintenta más tarde.",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def _job_video_path(
+    job: ReelJob,
+    fmt: Optional[ReelFormat],
+    language: Optional[str] = None
+) -> str:
+    """
+    Ruta del video de un trabajo; sin formato, el primero que se pidió.
+    Con `language` (distinto del principal), la de esa versión traducida.
+    """
+    file_id = job.job_id
+    if language and language != job.language:
+        variant = job.variants.get(language)
+        if not variant or not variant.download_urls:
+            raise HTTPException(status_code=404, detail=f"Versión en '{language}' no disponible")
+        file_id = job_manager.variant_id(job.job_id, language)
+
+    if fmt is None:
+        fmt = ReelFormat(next(iter(job.download_urls), ReelFormat.VERTICAL.value))
+    elif job.download_urls and fmt.value not in job.download_urls:
+        raise HTTPException(status_code=404, detail=f"Formato {fmt.value} no generado")
+    return output_path(file_id, fmt)
 
 
 @router.get("/download/{job_id}")
-async def download_reel(job_id: str):
+async def download_reel(
+    job_id: str,
+    format: Optional[ReelFormat] = Query(default=None, description="Formato a descargar"),
+    language: Optional[str] = Query(default=None, description="Idioma de la versión a descargar")
+):
     """
     Descarga el video MP4 generado.
     Solo disponible cuando el estado es 'completed'.
@@ -82,7 +327,19 @@ async def download_reel(job_id: str):
             detail=f"El video no está listo. Estado actual: {job.status.value}"
         )
 
-    video_path = os.path.join(settings.output_dir, f"{job_id}.mp4")
+    video_path = _job_video_path(job, format, language)
+
+    stem = f"reel_{job_id[:8]}"
+    if language and language != job.language:
+        stem = f"{stem}_{language}"
+    filename = f"{stem}.mp4"
+    if format is not None and format != ReelFormat.VERTICAL:
+        filename = f"{stem}_{format.value.replace(':', 'x')}.mp4"
+
+    # Con almacenamiento de objetos, redirigir a la URL prefirmada
+    url = await get_storage().presigned_url(video_path, filename=filename)
+    if url:
+        return RedirectResponse(url, status_code=302)
 
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Archivo de video no encontrado")
@@ -90,13 +347,17 @@ async def download_reel(job_id: str):
     return FileResponse(
         path=video_path,
         media_type="video/mp4",
-        filename=f"reel_{job_id[:8]}.mp4",
-        headers={"Content-Disposition": f"attachment; filename=reel_{job_id[:8]}.mp4"}
+        filename=filename,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
 @router.get("/preview/{job_id}")
-async def preview_reel(job_id: str):
+async def preview_reel(
+    job_id: str,
+    format: Optional[ReelFormat] = Query(default=None, description="Formato a reproducir"),
+    language: Optional[str] = Query(default=None, description="Idioma de la versión a reproducir")
+):
     """
     Vista previa del video (stream en el navegador, sin descargar).
     """
@@ -104,7 +365,13 @@ async def preview_reel(job_id: str):
     if not job or job.status.value != "completed":
         raise HTTPException(status_code=404, detail="Video no disponible")
 
-    video_path = os.path.join(settings.output_dir, f"{job_id}.mp4")
+    video_path = _job_video_path(job, format, language)
+
+    url = await get_storage().presigned_url(
+        video_path, filename=os.path.basename(video_path), inline=True
+    )
+    if url:
+        return RedirectResponse(url, status_code=302)
 
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
@@ -116,32 +383,77 @@ async def preview_reel(job_id: str):
     )
 
 
-@router.delete("/job/{job_id}")
-async def delete_job(job_id: str):
-    """Elimina un trabajo y sus archivos asociados."""
-    import shutil
-    from app.services import job_manager
+# Los archivos de la vista previa no cambian nunca para un mismo trabajo
+PREVIEW_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
 
+
+@router.get("/preview/{job_id}/{asset}")
+async def preview_asset(job_id: str, asset: str):
+    """
+    Vista previa empaquetada: playlist HLS, segmentos, póster y miniatura.
+    Con almacenamiento de objetos, todo menos la playlist redirige a una URL
+    prefirmada; la playlist se sirve siempre desde aquí para que las rutas
+    relativas de los segmentos apunten a esta API.
+    """
+    job = job_manager.get_job(job_id)
+    if not job or job.status.value != "completed" or not job.preview:
+        raise HTTPException(status_code=404, detail="Vista previa no disponible")
+
+    media_type = preview_packager.media_type(asset)
+    if not media_type:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    path = os.path.join(preview_packager.preview_dir(job_id), asset)
+    if asset != preview_packager.PLAYLIST:
+        url = await get_storage().presigned_url(path, inline=True)
+        if url:
+            return RedirectResponse(url, status_code=302)
+
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    return FileResponse(path=path, media_type=media_type, headers=PREVIEW_CACHE_HEADERS)
+
+
+@router.post("/job/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancela un trabajo en curso.
+    Corta las llamadas pendientes a proveedores, termina los procesos FFmpeg
+    y elimina los archivos generados hasta el momento.
+    """
     job = job_manager.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Trabajo no encontrado")
 
-    # Eliminar archivos temporales
-    job_temp_dir = os.path.join(settings.temp_dir, job_id)
-    if os.path.exists(job_temp_dir):
-        shutil.rmtree(job_temp_dir)
+    if not await job_manager.cancel_job(job_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"El trabajo ya terminó. Estado actual: {job.status.value}"
+        )
+
+    return {"message": "Trabajo cancelado correctamente"}
+
+
+@router.delete("/job/{job_id}")
+async def delete_job(job_id: str):
+    """Elimina un trabajo y sus archivos asociados (cancelándolo si sigue en curso)."""
+    job = job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
 
-    # Eliminar video de salida
-    video_path = os.path.join(settings.output_dir, f"{job_id}.mp4")
-    if os.path.exists(video_path):
-        os.remove(video_path)
+    # Detener el procesamiento antes de borrar sus archivos
+    await job_manager.cancel_job(job_id)
+    await job_manager.cleanup_job_files(job_id)
 
     return {"message": "Trabajo eliminado correctamente"}
 
 
 @router.get("/health")
 async def health_check():
-    """Verificación de salud del servidor."""
+    """Verificación de salud del servidor y del circuito de cada proveedor."""
+    from app.services.provider_health import provider_health
+
     return {
         "status": "ok",
         "version": "1.0.0",
@@ -150,5 +462,28 @@ async def health_check():
             "elevenlabs": bool(settings.elevenlabs_api_key),
             "stability": bool(settings.stability_api_key),
             "pexels": bool(settings.pexels_api_key),
-        }
+        },
+        "providers": provider_health.snapshot()
     }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Indica si el servidor puede procesar trabajos (servicios ya cargados).
+    A diferencia de /api/health, responde 503 mientras dura el calentamiento.
+    """
+    from app.services.warmup import is_ready
+
+    ready = is_ready() and os.path.isdir(settings.output_dir)
+    if not ready:
+        raise HTTPException(status_code=503, detail="Servidor iniciando")
+    return {"status": "ready"}
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Métricas internas del proceso (hedging, proveedores, etc.)."""
+    from app.services.metrics import metrics
+
+    return metrics.snapshot()
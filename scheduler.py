@@ -0,0 +1,286 @@
+"""
+Planificador de trabajos: control de admisión, cola de espera y ETA.
+Limita cuántos trabajos se procesan a la vez y cuántos esperan en cola,
+y estima tiempos con un modelo móvil de la duración real de cada etapa.
+
+La cola es justa entre tenants (weighted fair queuing por etiquetas de
+inicio): un tenant que envía 50 reels no retrasa a los demás más que su
+peso. Los trabajos interactivos van en un carril prioritario por delante
+de los masivos, y cada tenant tiene topes propios de huecos de APIs y FFmpeg.
+El estado por tenant solo vive mientras hace falta: los huecos se borran al
+quedar sin uso, y la etiqueta de fin cuando el tiempo virtual la alcanza o
+el tenant lleva tenant_idle_seconds sin enviar ni tener trabajos en cola.
+"""
+
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from app.config import settings
+from app.models.reel import JobPriority
+from app.services.metrics import metrics
+
+
+# Etapas de procesamiento que alimentan el modelo de duración
+MODELED_STAGES = ("generating_script", "generating_audio", "generating_images", "composing_video")
+
+# Estimación inicial mientras no hay datos: ~4s de procesamiento por segundo de video
+DEFAULT_SECONDS_PER_VIDEO_SECOND = 4.0
+
+# Cada cuánto se revisan las etiquetas de fin que ya no hacen falta
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class QueueFullError(Exception):
+    """La cola de espera está llena: el trabajo no se admite."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Cola de trabajos llena")
+        self.retry_after = retry_after
+
+
+class _TenantSlots:
+    """Huecos de un tenant y cuántas tareas los usan o esperan."""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+def tenant_label(tenant_id: str) -> str:
+    """
+    Etiqueta de métrica de un tenant: los configurados en tenant_weights y
+    "anonymous" van por nombre; el resto, agrupados en "other" (acotado).
+    """
+    if tenant_id == "anonymous" or tenant_id in settings.tenant_weights_map:
+        return tenant_id
+    return "other"
+
+
+class JobScheduler:
+    """Cola de trabajos con límite de trabajos en curso y en espera."""
+
+    # Orden de los carriles: el interactivo siempre se atiende primero
+    LANES = (JobPriority.INTERACTIVE, JobPriority.BULK)
+
+    def __init__(self, max_inflight: int, max_queued: int):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self._waiting: List[str] = []                 # En orden de despacho
+        self._running: Dict[str, float] = {}          # job_id -> inicio
+        self._turns: Dict[str, asyncio.Future] = {}
+        self._video_seconds: Dict[str, int] = {}      # Duración pedida de cada trabajo
+        # Segundos de procesamiento por segundo de video, por etapa
+        self._stage_samples: Dict[str, deque] = {
+            stage: deque(maxlen=50) for stage in MODELED_STAGES
+        }
+
+        # Weighted fair queuing: etiqueta (carril, inicio virtual, flujo) de cada trabajo
+        self._tags: Dict[str, tuple[int, float, tuple[JobPriority, str]]] = {}
+        self._virtual_time = 0.0
+        self._last_finish: Dict[tuple[JobPriority, str], float] = {}
+        self._flow_seen: Dict[tuple[JobPriority, str], float] = {}   # Último envío
+        self._pruned_at = time.monotonic()
+
+        # Huecos globales de etapas de APIs externas (red) y de FFmpeg (CPU)
+        self._api_slots = asyncio.Semaphore(settings.max_concurrent_api_jobs)
+        self._ffmpeg_slots = asyncio.Semaphore(settings.max_concurrent_ffmpeg_jobs)
+        self._tenant_api_slots: Dict[str, _TenantSlots] = {}
+        self._tenant_ffmpeg_slots: Dict[str, _TenantSlots] = {}
+
+    # ---- Admisión y turnos ----
+
+    def can_admit(self, count: int = 1) -> bool:
+        """Indica si caben `count` trabajos más (en curso o en cola)."""
+        free_slots = max(0, self.max_inflight - len(self._running))
+        return max(0, count - free_slots) + len(self._waiting) <= self.max_queued
+
+    def submit(
+        self,
+        job_id: str,
+        video_seconds: int,
+        tenant_id: str = "anonymous",
+        priority: JobPriority = JobPriority.INTERACTIVE
+    ) -> None:
+        """
+        Registra un trabajo admitido. Si hay hueco arranca ya; si no, queda en
+        cola en el lugar que le toca según su carril y el peso de su tenant.
+        Lanza QueueFullError si no cabe.
+        """
+        if not self.can_admit():
+            metrics.increment("jobs_rejected", tenant=tenant_label(tenant_id))
+            raise QueueFullError(self.retry_after())
+
+        self._video_seconds[job_id] = video_seconds
+        self._turns[job_id] = asyncio.get_running_loop().create_future()
+
+        # Etiqueta de inicio: el trabajo no puede empezar (en tiempo virtual)
+        # antes de que termine el anterior de su tenant en el mismo carril
+        weight = settings.tenant_weights_map.get(tenant_id, 1.0)
+        flow = (priority, tenant_id)
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        self._last_finish[flow] = start + self.expected_seconds(video_seconds) / weight
+        self._flow_seen[flow] = time.monotonic()
+        self._tags[job_id] = (self.LANES.index(priority), start, flow)
+
+        self._waiting.append(job_id)
+        self._waiting.sort(key=self._tags.__getitem__)
+        self._dispatch()
+
+    async def wait_turn(self, job_id: str) -> None:
+        """Espera a que el trabajo tenga un hueco para procesarse."""
+        turn = self._turns.get(job_id)
+        if turn is not None:
+            await turn
+
+    def release(self, job_id: str) -> None:
+        """Libera el hueco del trabajo (terminado, fallido o cancelado)."""
+        self._running.pop(job_id, None)
+        if job_id in self._waiting:
+            self._waiting.remove(job_id)
+        turn = self._turns.pop(job_id, None)
+        if turn is not None and not turn.done():
+            turn.cancel()
+        self._video_seconds.pop(job_id, None)
+        self._tags.pop(job_id, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Arranca trabajos en espera (en orden de etiqueta) mientras haya huecos."""
+        while self._waiting and len(self._running) < self.max_inflight:
+            job_id = self._waiting.pop(0)
+            self._virtual_time = max(self._virtual_time, self._tags[job_id][1])
+            self._running[job_id] = time.monotonic()
+            self._turns[job_id].set_result(None)
+
+        if time.monotonic() - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+            self._prune_flows()
+
+        metrics.set_gauge("jobs_inflight", len(self._running))
+        metrics.set_gauge("jobs_queued", len(self._waiting))
+
+    def _prune_flows(self) -> None:
+        """
+        Olvida las etiquetas de fin que ya no cuentan: las que el tiempo virtual
+        alcanzó (el max con él da lo mismo) y las de tenants inactivos sin
+        trabajos en cola.
+        """
+        now = time.monotonic()
+        self._pruned_at = now
+        cutoff = now - settings.tenant_idle_seconds
+        queued = {self._tags[job_id][2] for job_id in self._waiting}
+        stale = [
+            flow for flow, end in self._last_finish.items()
+            if end <= self._virtual_time
+            or (flow not in queued and self._flow_seen[flow] < cutoff)
+        ]
+        for flow in stale:
+            del self._last_finish[flow]
+            del self._flow_seen[flow]
+
+    # ---- Huecos por etapa ----
+
+    @asynccontextmanager
+    async def api_slot(self, tenant_id: str) -> AsyncIterator[None]:
+        """Hueco para etapas de APIs externas, con tope por tenant."""
+        # Primero el tope del tenant: quien lo agotó no retiene huecos globales
+        async with self._tenant_slot(
+            self._tenant_api_slots, tenant_id, settings.tenant_max_api_jobs
+        ):
+            async with self._api_slots:
+                yield
+
+    @asynccontextmanager
+    async def ffmpeg_slot(self, tenant_id: str) -> AsyncIterator[None]:
+        """Hueco para composición con FFmpeg, con tope por tenant."""
+        async with self._tenant_slot(
+            self._tenant_ffmpeg_slots, tenant_id, settings.tenant_max_ffmpeg_jobs
+        ):
+            async with self._ffmpeg_slots:
+                yield
+
+    @asynccontextmanager
+    async def _tenant_slot(
+        self,
+        pool: Dict[str, _TenantSlots],
+        tenant_id: str,
+        limit: int
+    ) -> AsyncIterator[None]:
+        """Hueco del tope del tenant; sus huecos se borran cuando nadie los usa ni espera."""
+        slots = pool.get(tenant_id)
+        if slots is None:
+            slots = pool[tenant_id] = _TenantSlots(limit)
+        slots.users += 1
+        try:
+            async with slots.semaphore:
+                yield
+        finally:
+            slots.users -= 1
+            if slots.users == 0 and pool.get(tenant_id) is slots:
+                del pool[tenant_id]
+
+    # ---- Posición y estimaciones ----
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posición en la cola (1 = el siguiente), o None si no está esperando."""
+        if job_id in self._waiting:
+            return self._waiting.index(job_id) + 1
+        return None
+
+    def record_stage(self, job_id: str, stage: str, seconds: float) -> None:
+        """Registra cuánto tardó una etapa de un trabajo."""
+        video_seconds = self._video_seconds.get(job_id)
+        if stage in self._stage_samples and video_seconds:
+            self._stage_samples[stage].append(seconds / video_seconds)
+            metrics.observe("stage_seconds", seconds, stage=stage)
+
+    def expected_seconds(self, video_seconds: int) -> float:
+        """Tiempo de procesamiento esperado para un reel de `video_seconds`."""
+        if all(self._stage_samples[s] for s in MODELED_STAGES):
+            rate = sum(
+                sum(samples) / len(samples)
+                for samples in self._stage_samples.values()
+            )
+        else:
+            rate = DEFAULT_SECONDS_PER_VIDEO_SECOND
+        return rate * video_seconds
+
+    def eta(self, job_id: str) -> Optional[int]:
+        """
+        Segundos estimados hasta que el trabajo termine: su propio tiempo
+        restante más el trabajo pendiente por delante repartido entre los
+        huecos de procesamiento.
+        """
+        video_seconds = self._video_seconds.get(job_id)
+        if video_seconds is None:
+            return None
+
+        own = self.expected_seconds(video_seconds)
+        if job_id in self._running:
+            elapsed = time.monotonic() - self._running[job_id]
+            return int(max(1.0, own - elapsed))
+
+        ahead = sum(self._remaining(j) for j in self._running)
+        position = self.position(job_id) or 1
+        ahead += sum(
+            self.expected_seconds(self._video_seconds[j])
+            for j in self._waiting[:position - 1]
+        )
+        return int(ahead / self.max_inflight + own)
+
+    def retry_after(self) -> int:
+        """Segundos sugeridos antes de reintentar cuando la cola está llena."""
+        if not self._running:
+            return 1
+        soonest = min(self._remaining(j) for j in self._running)
+        return max(1, math.ceil(soonest))
+
+    def _remaining(self, job_id: str) -> float:
+        elapsed = time.monotonic() - self._running[job_id]
+        return max(0.0, self.expected_seconds(self._video_seconds[job_id]) - elapsed)
+
+
+# Instancia global del planificador
+scheduler = JobScheduler(settings.max_inflight_jobs, settings.max_queued_jobs)
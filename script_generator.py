@@ -5,10 +5,23 @@ Produce guiones virales optimizados para Instagram Reels / TikTok.
 
 import json
 import re
-from typing import Optional
+import asyncio
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable, Optional
 from openai import AsyncOpenAI
 from app.config import settings
-from app.models.reel import ReelScript, ScriptScene
+from app.models.reel import ReelRequest, ReelScript, ScriptScene, WordTiming
+
+
+# Nombre de cada idioma tal como se le pide a GPT
+LANGUAGE_NAMES = {
+    "es": "español",
+    "en": "English",
+    "pt": "português",
+    "fr": "français",
+    "it": "italiano",
+    "de": "Deutsch",
+}
 
 
 class ScriptGeneratorService:
@@ -36,8 +49,11 @@ class ScriptGeneratorService:
         Returns:
             ReelScript con todas las escenas generadas
         """
-        lang_name = "español" if language == "es" else "English"
-        scenes_count = max(3, duration_seconds // 8)  # ~8 segundos por escena
+        if settings.script_stub:
+            return self._generate_stub(topic, duration_seconds)
+
+        lang_name = self._language_name(language)
+        scenes_count = self._scenes_count(duration_seconds)
 
         prompt = f"""Eres un experto en content marketing viral para Instagram Reels y TikTok.
 
@@ -53,26 +69,168 @@ REQUISITOS:
 - Optimizado para retención y shares
 
 Responde ÚNICAMENTE con JSON válido siguiendo esta estructura exacta:
-{{
-  "title": "Título corto del reel",
-  "hook": "Frase inicial de enganche muy impactante (máx 10 palabras)",
-  "scenes": [
-    {{
-      "order": 1,
-      "text": "Texto que se narrará en voz alta en esta escena",
-      "visual_prompt": "Descripción detallada en inglés de la imagen para esta escena, estilo fotográfico/cinematográfico",
-      "duration": 8.0,
-      "transition": "fade"
-    }}
-  ],
-  "call_to_action": "Llamada a la acción final (sigue para más contenido así)",
-  "hashtags": ["#hashtag1", "#hashtag2", "#hashtag3", "#hashtag4", "#hashtag5"],
-  "total_duration": {duration_seconds}.0
-}}
+{self._script_schema(f"{duration_seconds}.0")}
 
 REGLAS PARA visual_prompt: siempre en inglés, estilo cinematográfico, incluye iluminación y composición.
 REGLAS para text: en {lang_name}, natural y hablado, sin signos difíciles de pronunciar."""
 
+        data = await self._complete_json(prompt)
+        return self._parse_script(data, duration_seconds)
+
+    async def generate_many(
+        self,
+        requests: list[ReelRequest],
+        chunk_size: int = 5,
+        slot: Callable[[], AsyncContextManager] = nullcontext
+    ) -> list[Optional[ReelScript]]:
+        """
+        Genera los guiones de un lote de reels con pocas llamadas a GPT.
+
+        Agrupa los temas de a `chunk_size` por petición y lanza los grupos
+        en paralelo, cada uno dentro de su propio `slot()`. Los guiones que
+        no lleguen en la respuesta agrupada quedan en None para que cada
+        trabajo los genere por su cuenta.
+
+        Args:
+            requests: Solicitudes del lote
+            chunk_size: Guiones pedidos en cada llamada
+            slot: Hueco que ocupa cada llamada (p. ej. scheduler.api_slot del tenant)
+
+        Returns:
+            Lista alineada con `requests`; None donde no se pudo generar
+        """
+        if settings.script_stub:
+            return [self._generate_stub(r.topic, r.duration_seconds) for r in requests]
+
+        chunks = [
+            requests[i:i + chunk_size]
+            for i in range(0, len(requests), chunk_size)
+        ]
+
+        async def generate(chunk: list[ReelRequest]) -> list[Optional[ReelScript]]:
+            async with slot():
+                return await self._generate_chunk(chunk)
+
+        results = await asyncio.gather(*(generate(chunk) for chunk in chunks))
+        return [script for chunk_scripts in results for script in chunk_scripts]
+
+    async def _generate_chunk(
+        self,
+        requests: list[ReelRequest]
+    ) -> list[Optional[ReelScript]]:
+        """Genera varios guiones en una sola llamada a GPT."""
+        scripts: list[Optional[ReelScript]] = [None] * len(requests)
+
+        if len(requests) > 1:
+            topics = "\n".join(
+                f"{i}. \"{r.topic}\" — idioma: {self._language_name(r.language)}, "
+                f"duración: ~{r.duration_seconds} segundos, "
+                f"escenas: {self._scenes_count(r.duration_seconds)}, estilo: {r.style.value}"
+                for i, r in enumerate(requests)
+            )
+
+            prompt = f"""Eres un experto en content marketing viral para Instagram Reels y TikTok.
+
+Crea un guion completo e independiente para CADA uno de estos reels:
+{topics}
+
+REQUISITOS (para cada guion):
+- Respeta el idioma, la duración, el número de escenas y el estilo indicados
+- El hook debe capturar la atención en los primeros 3 segundos
+- Lenguaje cercano, directo y con energía
+- Optimizado para retención y shares
+
+Responde ÚNICAMENTE con JSON válido con esta forma:
+{{"scripts": [{{"index": 0, ...guion...}}, ...]}}
+
+Donde cada guion sigue esta estructura exacta:
+{self._script_schema("<duración en segundos>")}
+
+REGLAS PARA visual_prompt: siempre en inglés, estilo cinematográfico, incluye iluminación y composición.
+REGLAS para text: en el idioma de cada reel, natural y hablado, sin signos difíciles de pronunciar."""
+
+            try:
+                data = await self._complete_json(prompt)
+            except Exception as e:
+                print(f"[ScriptGen] Falló la generación agrupada: {e}")
+                return scripts
+
+            for item in data.get("scripts", []):
+                index = item.get("index")
+                if not isinstance(index, int) or not 0 <= index < len(requests):
+                    continue
+                try:
+                    scripts[index] = self._parse_script(
+                        item, requests[index].duration_seconds
+                    )
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"[ScriptGen] Guion {index} del lote inválido: {e}")
+
+        return scripts
+
+    async def translate(
+        self,
+        script: ReelScript,
+        languages: list[str]
+    ) -> dict[str, ReelScript]:
+        """
+        Traduce el guion a varios idiomas en una sola llamada a GPT.
+
+        Solo cambian los textos (escenas, título, hook y llamada a la acción);
+        visual_prompt, duraciones y transiciones se conservan, así cada versión
+        reutiliza las mismas imágenes.
+
+        Returns:
+            Guion traducido por idioma; faltan los idiomas que no llegaron bien
+        """
+        if settings.script_stub:
+            return {lang: script.model_copy(deep=True) for lang in languages}
+
+        source = {
+            "title": script.title,
+            "hook": script.hook,
+            "call_to_action": script.call_to_action,
+            "scenes": [scene.text for scene in script.scenes],
+        }
+        targets = ", ".join(f"{lang} ({LANGUAGE_NAMES.get(lang, lang)})" for lang in languages)
+
+        prompt = f"""Traduce este guion de reel a estos idiomas: {targets}.
+
+GUION ORIGINAL (JSON):
+{json.dumps(source, ensure_ascii=False)}
+
+REGLAS:
+- Adapta el texto para que suene natural y hablado en cada idioma, con la misma energía
+- Mantén exactamente {len(script.scenes)} escenas, en el mismo orden
+- Cada escena debe durar lo mismo al narrarla: no alargues el texto
+- Sin signos difíciles de pronunciar
+
+Responde ÚNICAMENTE con JSON válido con esta forma:
+{{"translations": {{"<código de idioma>": {{"title": "...", "hook": "...", "call_to_action": "...", "scenes": ["...", ...]}}}}}}"""
+
+        data = await self._complete_json(prompt)
+        translations = data.get("translations", {})
+
+        result = {}
+        for lang in languages:
+            item = translations.get(lang)
+            texts = item.get("scenes") if isinstance(item, dict) else None
+            if not isinstance(texts, list) or len(texts) != len(script.scenes):
+                print(f"[ScriptGen] Traducción a '{lang}' incompleta o ausente")
+                continue
+
+            translated = script.model_copy(deep=True)
+            for scene, text in zip(translated.scenes, texts):
+                scene.text = str(text)
+            translated.title = item.get("title", script.title)
+            translated.hook = item.get("hook", script.hook)
+            translated.call_to_action = item.get("call_to_action", script.call_to_action)
+            result[lang] = translated
+
+        return result
+
+    async def _complete_json(self, prompt: str) -> dict:
+        """Envía el prompt a GPT y devuelve la respuesta JSON decodificada."""
         response = await self.client.chat.completions.create(
             model="gpt-4o",
             messages=[
@@ -87,9 +245,41 @@ REGLAS para text: en {lang_name}, natural y hablado, sin signos difíciles de pr
         )
 
         raw = response.choices[0].message.content
-        data = json.loads(raw)
+        return json.loads(raw)
+
+    def _generate_stub(self, topic: str, duration_seconds: int) -> ReelScript:
+        """
+        Guion local de prueba: escenas con texto de relleno del largo que la
+        voz de prueba (15 caracteres/s) necesita para cubrir la duración.
+        """
+        scenes_count = self._scenes_count(duration_seconds)
+        scene_duration = duration_seconds / scenes_count
+        chars = int(scene_duration * 15)
+
+        scenes = []
+        for order in range(1, scenes_count + 1):
+            sentence = f"Escena {order} sobre {topic}."
+            text = " ".join([sentence] * (chars // (len(sentence) + 1) + 1))[:chars].rstrip()
+            scenes.append(ScriptScene(
+                order=order,
+                text=text,
+                visual_prompt=f"{topic}, scene {order}",
+                duration=scene_duration
+            ))
+
+        return ReelScript(
+            title=topic[:60],
+            hook=f"Escena 1 sobre {topic}",
+            scenes=scenes,
+            call_to_action="Sigue para más contenido así",
+            hashtags=["#reel"],
+            total_duration=float(duration_seconds)
+        )
+
+    def _parse_script(self, data: dict, duration_seconds: int) -> ReelScript:
+        """Construye un ReelScript validado a partir del JSON de GPT."""
+        scenes_count = self._scenes_count(duration_seconds)
 
-        # Construir modelo de datos validado
         scenes = [
             ScriptScene(
                 order=s["order"],
@@ -110,16 +300,50 @@ REGLAS para text: en {lang_name}, natural y hablado, sin signos difíciles de pr
             total_duration=float(data.get("total_duration", duration_seconds))
         )
 
-    async def generate_subtitles_srt(self, script: ReelScript) -> str:
+    def _script_schema(self, total_duration: str) -> str:
+        """Estructura JSON que se pide a GPT para cada guion."""
+        return f"""{{
+  "title": "Título corto del reel",
+  "hook": "Frase inicial de enganche muy impactante (máx 10 palabras)",
+  "scenes": [
+    {{
+      "order": 1,
+      "text": "Texto que se narrará en voz alta en esta escena",
+      "visual_prompt": "Descripción detallada en inglés de la imagen para esta escena, estilo fotográfico/cinematográfico",
+      "duration": 8.0,
+      "transition": "fade"
+    }}
+  ],
+  "call_to_action": "Llamada a la acción final (sigue para más contenido así)",
+  "hashtags": ["#hashtag1", "#hashtag2", "#hashtag3", "#hashtag4", "#hashtag5"],
+  "total_duration": {total_duration}
+}}"""
+
+    def _language_name(self, language: str) -> str:
+        return LANGUAGE_NAMES.get(language, "English")
+
+    def _scenes_count(self, duration_seconds: int) -> int:
+        return max(3, duration_seconds // 8)  # ~8 segundos por escena
+
+    async def generate_subtitles_srt(
+        self,
+        script: ReelScript,
+        words: Optional[list[WordTiming]] = None
+    ) -> str:
         """
         Genera el contenido SRT de subtítulos sincronizados.
 
         Args:
             script: El guion completo del reel
+            words: Tiempos reales de cada palabra (narración con marcas de
+                tiempo); sin ellos se reparte la duración de cada escena
 
         Returns:
             Contenido del archivo SRT como string
         """
+        if words:
+            return self._subtitles_from_words(words)
+
         srt_lines = []
         index = 1
         current_time = 0.0
@@ -152,6 +376,36 @@ REGLAS para text: en {lang_name}, natural y hablado, sin signos difíciles de pr
 
         return "\n".join(srt_lines)
 
+    def _subtitles_from_words(self, words: list[WordTiming], chunk_size: int = 5) -> str:
+        """
+        SRT con los tiempos reales de la narración: hasta 5 palabras por
+        subtítulo, cortando también en fin de frase para no mezclar escenas.
+        """
+        chunks, current = [], []
+        for word in words:
+            current.append(word)
+            if len(current) == chunk_size or word.word.endswith((".", "!", "?", "…")):
+                chunks.append(current)
+                current = []
+        if current:
+            chunks.append(current)
+
+        srt_lines = []
+
+        for index, chunk in enumerate(chunks, start=1):
+            start = chunk[0].start
+            # Mantener el subtítulo hasta que empiece el siguiente (sin parpadeos)
+            end = chunks[index][0].start if index < len(chunks) else chunk[-1].end
+
+            srt_lines.append(str(index))
+            srt_lines.append(
+                f"{self._seconds_to_srt_time(start)} --> {self._seconds_to_srt_time(end)}"
+            )
+            srt_lines.append(" ".join(w.word for w in chunk).upper())  # Mayúsculas estilo TikTok
+            srt_lines.append("")
+
+        return "\n".join(srt_lines)
+
     def _seconds_to_srt_time(self, seconds: float) -> str:
         """Convierte segundos a formato SRT HH:MM:SS,mmm."""
         h = int(seconds // 3600)
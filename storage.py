@@ -0,0 +1,117 @@
+"""
+Almacenamiento de los archivos de salida (videos y ZIP de lotes).
+Con el backend local los archivos se sirven desde el disco del servidor;
+con S3 (o compatible: MinIO, moto...) se suben con multipart y las
+descargas se redirigen a URLs prefirmadas, sin pasar por la API.
+"""
+
+import os
+from typing import Optional
+from app.config import settings
+from app.services.executors import run_io
+
+
+class LocalStorage:
+    """Los archivos quedan en output_dir y los sirve la propia API."""
+
+    async def upload(self, local_path: str, content_type: str = "video/mp4") -> None:
+        """Nada que subir: el archivo ya está en su sitio."""
+
+    async def presigned_url(
+        self,
+        local_path: str,
+        filename: Optional[str] = None,
+        inline: bool = False
+    ) -> Optional[str]:
+        """Sin URL externa: la ruta de la API responde con el archivo."""
+        return None
+
+    async def delete(self, local_path: str) -> None:
+        if os.path.exists(local_path):
+            await run_io(os.remove, local_path)
+
+
+class S3Storage:
+    """Bucket S3 o compatible (MinIO con s3_endpoint_url)."""
+
+    def __init__(self):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.bucket = settings.aws_bucket_name
+        self.prefix = settings.s3_prefix
+        self.client = boto3.client(
+            "s3",
+            region_name=settings.aws_region,
+            endpoint_url=settings.s3_endpoint_url or None,
+            aws_access_key_id=settings.aws_access_key_id or None,
+            aws_secret_access_key=settings.aws_secret_access_key or None,
+            # Direcciones tipo ruta: las que entienden MinIO y moto
+            config=Config(s3={"addressing_style": "path"}, signature_version="s3v4")
+        )
+        chunk_size = settings.s3_multipart_chunk_mb * 1024 * 1024
+        self.transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=settings.s3_upload_concurrency
+        )
+
+    def key_for(self, local_path: str) -> str:
+        """Clave del objeto: la ruta relativa a output_dir bajo el prefijo."""
+        relative = os.path.relpath(local_path, settings.output_dir)
+        return self.prefix + relative.replace(os.sep, "/")
+
+    async def upload(self, local_path: str, content_type: str = "video/mp4") -> None:
+        """Sube el archivo en partes paralelas (boto3 corre en el pool de E/S)."""
+        await run_io(
+            self.client.upload_file,
+            local_path,
+            self.bucket,
+            self.key_for(local_path),
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config
+        )
+
+    async def presigned_url(
+        self,
+        local_path: str,
+        filename: Optional[str] = None,
+        inline: bool = False
+    ) -> Optional[str]:
+        """URL prefirmada de descarga (o de reproducción en el navegador si inline)."""
+        params = {"Bucket": self.bucket, "Key": self.key_for(local_path)}
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            params["ResponseContentDisposition"] = f'{disposition}; filename="{filename}"'
+
+        return await run_io(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params=params,
+            ExpiresIn=settings.s3_presign_expiry_seconds
+        )
+
+    async def delete(self, local_path: str) -> None:
+        """Borra el objeto remoto y la copia local si existe."""
+        await run_io(
+            self.client.delete_object,
+            Bucket=self.bucket,
+            Key=self.key_for(local_path)
+        )
+        if os.path.exists(local_path):
+            await run_io(os.remove, local_path)
+
+
+_storage = None
+
+
+def get_storage():
+    """Backend configurado en storage_backend ("local" o "s3")."""
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "s3":
+            _storage = S3Storage()
+        else:
+            _storage = LocalStorage()
+    return _storage
@@ -1,14 +1,23 @@
 """
 Servicio de Text-to-Speech.
 Usa ElevenLabs como primaria y OpenAI TTS como fallback.
+En modo "script" narra todo el guion en una sola petición con marcas de
+tiempo por carácter, de las que salen los cortes de escena y los subtítulos.
 """
 
+import io
 import os
+import wave
+import base64
 import aiofiles
 from pathlib import Path
+from typing import Optional
 from openai import AsyncOpenAI
 from app.config import settings
-from app.models.reel import ReelScript, VoiceGender
+from app.models.reel import ReelScript, VoiceGender, NarrationTiming, WordTiming
+from app.services.provider_health import ProviderError, provider_health
+from app.services.hedging import run_with_fallback
+from app.services import file_layout
 
 
 class TTSService:
@@ -26,9 +35,10 @@ class TTSService:
         VoiceGender.MALE: "onyx",
     }
 
-    def __init__(self):
-        self.openai = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.audio_dir = os.path.join(settings.temp_dir, "audio")
+    def __init__(self, tenant_id: str = "anonymous"):
+        # Los reintentos los gestiona provider_health, no el SDK
+        self.openai = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
+        self.tenant_id = tenant_id
 
     async def generate_audio(
         self,
@@ -50,7 +60,7 @@ class TTSService:
         audio_files = []
 
         # Crear directorio para este job
-        job_audio_dir = os.path.join(self.audio_dir, job_id)
+        job_audio_dir = file_layout.temp_dir("audio", job_id)
         os.makedirs(job_audio_dir, exist_ok=True)
 
         # Incluir el hook en la primera escena si no está
@@ -61,88 +71,232 @@ class TTSService:
         for order, text, duration in all_texts:
             output_path = os.path.join(job_audio_dir, f"scene_{order:02d}.mp3")
 
-            # Intentar ElevenLabs primero, fallback a OpenAI
-            if settings.elevenlabs_api_key:
-                success = await self._generate_elevenlabs(
-                    text, output_path, voice_gender
-                )
-            else:
-                success = False
+            # Intentar ElevenLabs primero (si su circuito no está abierto), fallback a OpenAI;
+            # con hedging, OpenAI arranca en paralelo si ElevenLabs se demora
+            elevenlabs = None
+            if settings.elevenlabs_api_key and provider_health.is_available("elevenlabs"):
+                elevenlabs = lambda: self._generate_elevenlabs(text, voice_gender)
+
+            content, _ = await run_with_fallback(
+                "elevenlabs", elevenlabs,
+                "openai_tts", lambda: self._generate_openai_tts(text, voice_gender),
+                tenant_id=self.tenant_id
+            )
 
-            if not success:
-                await self._generate_openai_tts(text, output_path, voice_gender)
+            async with aiofiles.open(output_path, "wb") as f:
+                await f.write(content)
 
             audio_files.append(output_path)
 
         return audio_files
 
-    async def _generate_elevenlabs(
+    async def generate_narration(
+        self,
+        script: ReelScript,
+        job_id: str,
+        voice_gender: VoiceGender = VoiceGender.FEMALE
+    ) -> Optional[NarrationTiming]:
+        """
+        Narra el guion completo en una sola petición con marcas de tiempo.
+        Los límites de escena y de palabra salen del alineamiento, así que
+        no hay cortes de prosodia entre escenas.
+
+        Returns:
+            Audio y tiempos, o None si no hay proveedor con marcas de tiempo
+            disponible (el llamador usa entonces generate_audio por escena)
+        """
+        # Texto completo y posición de cada escena dentro de él
+        texts = [scene.text.strip() for scene in script.scenes]
+        full_text = " ".join(texts)
+        offsets, position = [], 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + 1
+
+        if settings.tts_stub:
+            audio, extension, alignment = self._generate_stub(full_text)
+        elif settings.elevenlabs_api_key and provider_health.is_available("elevenlabs"):
+            try:
+                audio, alignment = await self._generate_elevenlabs_timestamps(
+                    full_text, voice_gender
+                )
+                extension = "mp3"
+            except Exception as e:
+                print(f"[TTS] Narración completa falló, se usará una petición por escena: {e}")
+                return None
+        else:
+            return None
+
+        job_audio_dir = file_layout.temp_dir("audio", job_id)
+        os.makedirs(job_audio_dir, exist_ok=True)
+        audio_path = os.path.join(job_audio_dir, f"narration.{extension}")
+        async with aiofiles.open(audio_path, "wb") as f:
+            await f.write(audio)
+
+        starts = alignment["character_start_times_seconds"]
+        ends = alignment["character_end_times_seconds"]
+
+        # Cada escena dura desde su primer carácter hasta el primero de la siguiente
+        scene_starts = [0.0] + [starts[min(o, len(starts) - 1)] for o in offsets[1:]]
+        total = ends[-1] if ends else 0.0
+        scene_ends = scene_starts[1:] + [total]
+        scene_durations = [round(max(0.1, e - s), 3) for s, e in zip(scene_starts, scene_ends)]
+
+        return NarrationTiming(
+            audio_path=audio_path,
+            scene_durations=scene_durations,
+            words=self._words_from_alignment(alignment)
+        )
+
+    def _words_from_alignment(self, alignment: dict) -> list[WordTiming]:
+        """Agrupa el alineamiento por carácter en palabras con inicio y fin."""
+        words = []
+        current, start, end = "", 0.0, 0.0
+        for char, char_start, char_end in zip(
+            alignment["characters"],
+            alignment["character_start_times_seconds"],
+            alignment["character_end_times_seconds"]
+        ):
+            if char.isspace():
+                if current:
+                    words.append(WordTiming(word=current, start=start, end=end))
+                current = ""
+                continue
+            if not current:
+                start = char_start
+            current += char
+            end = char_end
+
+        if current:
+            words.append(WordTiming(word=current, start=start, end=end))
+        return words
+
+    async def _generate_elevenlabs_timestamps(
         self,
         text: str,
-        output_path: str,
         voice_gender: VoiceGender
-    ) -> bool:
+    ) -> tuple[bytes, dict]:
+        """Genera audio con ElevenLabs y su alineamiento por carácter (endpoint with-timestamps)."""
+        import httpx
+
+        voice_id = self.ELEVENLABS_VOICES.get(
+            voice_gender,
+            settings.elevenlabs_voice_id
+        )
+
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/with-timestamps"
+        headers = {
+            "xi-api-key": settings.elevenlabs_api_key,
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.8,
+                "style": 0.3,
+                "use_speaker_boost": True
+            }
+        }
+
+        async def request() -> tuple[bytes, dict]:
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                response = await client.post(url, json=payload, headers=headers)
+            if response.status_code != 200:
+                raise ProviderError(
+                    "elevenlabs", response.text[:200], response.status_code
+                )
+            data = response.json()
+            alignment = data.get("alignment")
+            if not alignment or not alignment.get("characters"):
+                raise ProviderError("elevenlabs", "respuesta sin alineamiento")
+            return base64.b64decode(data["audio_base64"]), alignment
+
+        return await provider_health.call("elevenlabs", request)
+
+    def _generate_stub(
+        self,
+        text: str,
+        chars_per_second: float = 15.0,
+        sample_rate: int = 22050
+    ) -> tuple[bytes, str, dict]:
         """
-        Genera audio con ElevenLabs API.
-        Retorna True si fue exitoso.
+        Voz local de prueba: WAV en silencio con el alineamiento que tendría
+        una lectura a ritmo constante. Sin red ni costes.
         """
-        try:
-            import httpx
+        step = 1.0 / chars_per_second
+        alignment = {
+            "characters": list(text),
+            "character_start_times_seconds": [i * step for i in range(len(text))],
+            "character_end_times_seconds": [(i + 1) * step for i in range(len(text))],
+        }
 
-            voice_id = self.ELEVENLABS_VOICES.get(
-                voice_gender,
-                settings.elevenlabs_voice_id
-            )
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(b"\x00\x00" * int(len(text) * step * sample_rate))
+        return buffer.getvalue(), "wav", alignment
 
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-            headers = {
-                "xi-api-key": settings.elevenlabs_api_key,
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "text": text,
-                "model_id": "eleven_multilingual_v2",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.8,
-                    "style": 0.3,
-                    "use_speaker_boost": True
-                }
+    async def _generate_elevenlabs(
+        self,
+        text: str,
+        voice_gender: VoiceGender
+    ) -> bytes:
+        """Genera audio con ElevenLabs API. Retorna el MP3."""
+        import httpx
+
+        voice_id = self.ELEVENLABS_VOICES.get(
+            voice_gender,
+            settings.elevenlabs_voice_id
+        )
+
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        headers = {
+            "xi-api-key": settings.elevenlabs_api_key,
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.8,
+                "style": 0.3,
+                "use_speaker_boost": True
             }
+        }
 
+        async def request() -> bytes:
             async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(url, json=payload, headers=headers)
+            if response.status_code != 200:
+                raise ProviderError(
+                    "elevenlabs", response.text[:200], response.status_code
+                )
+            return response.content
 
-                if response.status_code == 200:
-                    async with aiofiles.open(output_path, "wb") as f:
-                        await f.write(response.content)
-                    return True
-
-            return False
-
-        except Exception as e:
-            print(f"[TTS] ElevenLabs falló: {e}. Usando OpenAI TTS.")
-            return False
+        return await provider_health.call("elevenlabs", request)
 
     async def _generate_openai_tts(
         self,
         text: str,
-        output_path: str,
         voice_gender: VoiceGender
-    ) -> None:
-        """Genera audio con OpenAI TTS como fallback."""
+    ) -> bytes:
+        """Genera audio con OpenAI TTS como fallback. Retorna el MP3."""
         voice = self.OPENAI_VOICES.get(voice_gender, "nova")
 
-        response = await self.openai.audio.speech.create(
+        response = await provider_health.call(
+            "openai_tts",
+            self.openai.audio.speech.create,
             model="tts-1-hd",
             voice=voice,
             input=text,
             speed=1.05  # Ligeramente más rápido para reels
         )
-
-        # Guardar archivo de audio
-        async with aiofiles.open(output_path, "wb") as f:
-            await f.write(response.content)
+        return response.content
 
     async def get_audio_duration(self, audio_path: str) -> float:
         """Obtiene la duración de un archivo de audio usando ffprobe."""
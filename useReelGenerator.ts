@@ -9,9 +9,12 @@ import {
   pollJobStatus,
   getDownloadUrl,
   getPreviewUrl,
+  getPreviewAssets,
   type ReelRequest,
   type ReelJob,
   type ReelScript,
+  type VideoOutput,
+  type PreviewAssets,
 } from '../services/api'
 
 type GenerationPhase =
@@ -32,6 +35,8 @@ interface UseReelGeneratorReturn {
   jobId: string | null
   downloadUrl: string | null
   previewUrl: string | null
+  videoInfo: VideoOutput | null
+  previewAssets: PreviewAssets | null
   errorMessage: string | null
   generate: (request: ReelRequest) => Promise<void>
   reset: () => void
@@ -45,6 +50,8 @@ export function useReelGenerator(): UseReelGeneratorReturn {
   const [jobId, setJobId] = useState<string | null>(null)
   const [downloadUrl, setDownloadUrl] = useState<string | null>(null)
   const [previewUrl, setPreviewUrl] = useState<string | null>(null)
+  const [videoInfo, setVideoInfo] = useState<VideoOutput | null>(null)
+  const [previewAssets, setPreviewAssets] = useState<PreviewAssets | null>(null)
   const [errorMessage, setErrorMessage] = useState<string | null>(null)
 
   const generate = useCallback(async (request: ReelRequest) => {
@@ -55,6 +62,8 @@ export function useReelGenerator(): UseReelGeneratorReturn {
     setScript(null)
     setDownloadUrl(null)
     setPreviewUrl(null)
+    setVideoInfo(null)
+    setPreviewAssets(null)
 
     try {
       // 1. Iniciar la generación
@@ -64,7 +73,7 @@ export function useReelGenerator(): UseReelGeneratorReturn {
       toast.success('Generación iniciada correctamente')
 
       // 2. Polling del estado hasta completar
-      await pollJobStatus(
+      const finalJob = await pollJobStatus(
         job_id,
         (job: ReelJob) => {
           // Actualizar UI con cada cambio de estado
@@ -84,6 +93,7 @@ export function useReelGenerator(): UseReelGeneratorReturn {
             composing_video: 'composing_video',
             completed: 'completed',
             failed: 'error',
+            cancelled: 'error',
           }
           setPhase(phaseMap[job.status] || 'submitting')
         },
@@ -93,6 +103,8 @@ export function useReelGenerator(): UseReelGeneratorReturn {
       // 3. Completado: configurar URLs de descarga y preview
       setDownloadUrl(getDownloadUrl(job_id))
       setPreviewUrl(getPreviewUrl(job_id))
+      setVideoInfo(finalJob.outputs?.['9:16'] ?? null)
+      setPreviewAssets(finalJob.preview ? getPreviewAssets(job_id) : null)
       setProgress(100)
       toast.success('¡Reel generado exitosamente! 🎬')
 
@@ -113,6 +125,8 @@ export function useReelGenerator(): UseReelGeneratorReturn {
     setJobId(null)
     setDownloadUrl(null)
     setPreviewUrl(null)
+    setVideoInfo(null)
+    setPreviewAssets(null)
     setErrorMessage(null)
   }, [])
 
@@ -124,6 +138,8 @@ export function useReelGenerator(): UseReelGeneratorReturn {
     jobId,
     downloadUrl,
     previewUrl,
+    videoInfo,
+    previewAssets,
     errorMessage,
     generate,
     reset,
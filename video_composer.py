@@ -4,24 +4,76 @@ Ensambla imágenes, audio, subtítulos y música en un reel vertical 9:16.
 """
 
 import os
-import asyncio
+import json
 import aiofiles
 from pathlib import Path
+from typing import Optional
 from app.config import settings
-from app.models.reel import ReelScript, MusicGenre
+from app.models.reel import ReelScript, MusicGenre, ReelFormat, ExportProfile
+from app.services.processes import run_ffmpeg, ffmpeg_output
+from app.services.backgrounds import is_raw_frame, raw_input_args
+from app.services import audio_engine, file_layout, render_cache
+
+
+def output_path(job_id: str, fmt: ReelFormat = ReelFormat.VERTICAL) -> str:
+    """Ruta del video final de un trabajo en el formato indicado."""
+    if fmt == ReelFormat.VERTICAL:
+        return file_layout.output_file(job_id, f"{job_id}.mp4")
+    suffix = fmt.value.replace(":", "x")
+    return file_layout.output_file(job_id, f"{job_id}_{suffix}.mp4")
+
+
+def min_file_mb(duration: float, export_profile: ExportProfile) -> float:
+    """
+    Tamaño mínimo que puede garantizar max_file_mb para un reel de `duration`
+    segundos: el de MIN_VIDEO_KBPS con el mismo cálculo que _encoder_settings.
+    """
+    composer = VideoComposerService
+    audio_kbps = composer.EXPORT_PROFILES[export_profile]["audio_kbps"]
+    kbits = (
+        composer.MIN_VIDEO_KBPS * (duration + composer.VBV_BUFFER_SECONDS)
+        + audio_kbps * duration
+    )
+    return kbits / (1 - composer.CONTAINER_OVERHEAD) / 8000
 
 
 class VideoComposerService:
     """Compone el video final del reel usando FFmpeg."""
 
-    # Rutas de música de fondo incluidas (archivos locales)
-    MUSIC_FILES = {
-        MusicGenre.UPBEAT: "music/upbeat.mp3",
-        MusicGenre.AMBIENT: "music/ambient.mp3",
-        MusicGenre.DRAMATIC: "music/dramatic.mp3",
-        MusicGenre.MOTIVATIONAL: "music/motivational.mp3",
+    # Relación de aspecto (ancho, alto) de cada formato de salida
+    FORMAT_ASPECTS = {
+        ReelFormat.VERTICAL: (9, 16),
+        ReelFormat.PORTRAIT: (4, 5),
+        ReelFormat.SQUARE: (1, 1),
     }
 
+    # Perfiles de exportación: CRF con tope de bitrate (VBV), así las escenas
+    # sencillas pesan poco y las complejas no disparan el tamaño. Forman parte
+    # de la huella del render: si cambian, la caché deja de coincidir.
+    EXPORT_PROFILES = {
+        ExportProfile.QUALITY: {
+            "preset": "slow", "crf": 20, "maxrate_kbps": 10000, "audio_kbps": 192,
+        },
+        ExportProfile.BALANCED: {
+            "preset": "medium", "crf": 23, "maxrate_kbps": 5000, "audio_kbps": 160,
+        },
+        ExportProfile.COMPACT: {
+            "preset": "slow", "crf": 26, "maxrate_kbps": 2500, "audio_kbps": 128,
+        },
+        ExportProfile.FAST: {
+            "preset": "veryfast", "crf": 23, "maxrate_kbps": 5000, "audio_kbps": 160,
+        },
+    }
+
+    # Bitrate de video mínimo aunque el tamaño máximo pida menos
+    MIN_VIDEO_KBPS = 600
+
+    # Búfer VBV en segundos de tope: permite picos cortos sin pasar del tope medio
+    VBV_BUFFER_SECONDS = 2
+
+    # Fracción del tamaño máximo reservada al contenedor MP4
+    CONTAINER_OVERHEAD = 0.02
+
     def __init__(self):
         self.output_dir = settings.output_dir
         self.temp_dir = settings.temp_dir
@@ -37,11 +89,20 @@ class VideoComposerService:
         job_id: str,
         add_subtitles: bool = True,
         music_genre: MusicGenre = MusicGenre.UPBEAT,
-        srt_content: str = ""
-    ) -> str:
+        srt_content: str = "",
+        formats: Optional[list[ReelFormat]] = None,
+        export_profile: ExportProfile = ExportProfile.BALANCED,
+        max_file_mb: Optional[int] = None
+    ) -> dict[ReelFormat, str]:
         """
         Ensambla el video completo del reel.
 
+        La pista de audio (narración y música) se mezcla en memoria y se
+        codifica una sola vez; el slideshow vertical se arma una vez y cada
+        formato pedido es solo un recorte más una codificación final, todas
+        en un único proceso FFmpeg que decodifica el slideshow una vez.
+        Si un render con la misma huella ya existe, se reutiliza sin FFmpeg.
+
         Args:
             script: El guion con metadatos
             image_files: Rutas a las imágenes de cada escena
@@ -50,95 +111,145 @@ class VideoComposerService:
             add_subtitles: Si se añaden subtítulos estilo TikTok
             music_genre: Tipo de música de fondo
             srt_content: Contenido del archivo SRT
+            formats: Relaciones de aspecto a exportar (por defecto 9:16)
+            export_profile: Perfil de codificación
+            max_file_mb: Tamaño máximo de cada video (acota el bitrate)
 
         Returns:
-            Ruta al video final MP4
+            Ruta al video final MP4 de cada formato
         """
-        job_dir = os.path.join(self.temp_dir, job_id)
-        os.makedirs(job_dir, exist_ok=True)
-
-        # Paso 1: Combinar audio de todas las escenas en uno solo
-        combined_audio = os.path.join(job_dir, "narration.mp3")
-        await self._concat_audio(audio_files, combined_audio)
-
-        # Paso 2: Obtener duración total del audio
-        total_duration = await self._get_duration(combined_audio)
+        formats = list(dict.fromkeys(formats or [ReelFormat.VERTICAL]))
 
-        # Paso 3: Crear video con imágenes (slideshow animado)
+        manifest = None
+        if music_genre != MusicGenre.NONE:
+            from app.services.music_library import MusicLibraryService
+            manifest = await MusicLibraryService().prepare(music_genre)
+        music_pcm = manifest["pcm_path"] if manifest else None
+
+        # Si un render idéntico ya existe se enlaza y no se lanza FFmpeg
+        outputs = {fmt: output_path(job_id, fmt) for fmt in formats}
+        fingerprint = await render_cache.fingerprint(
+            script, image_files, audio_files,
+            self._render_options(
+                add_subtitles, srt_content, music_genre, manifest,
+                export_profile, max_file_mb
+            )
+        )
+        pending = {
+            fmt: path for fmt, path in outputs.items()
+            if not await render_cache.fetch(fingerprint, fmt, path)
+        }
+        if not pending:
+            print(f"[Composer] Render {fingerprint[:12]} reutilizado desde la caché")
+            return outputs
+
+        job_dir = file_layout.temp_dir("work", job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        for path in pending.values():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Paso 1: Pista de audio final en memoria: narración decodificada una
+        # vez, unida con fundidos cruzados y con la música mezclada con ducking
+        mix_wav = os.path.join(job_dir, "mix.wav")
+        clip_durations = await audio_engine.render_mix(audio_files, music_pcm, mix_wav)
+        total_duration = sum(clip_durations)
+        encoder = self._encoder_settings(export_profile, max_file_mb, total_duration)
+
+        # Paso 2: Única codificación del audio (la exportación solo lo copia)
+        mix_audio = os.path.join(job_dir, "mix.m4a")
+        await self._encode_audio(mix_wav, mix_audio, encoder["audio_kbps"])
+
+        # Paso 3: Crear video con imágenes (slideshow animado); con un clip
+        # por escena, cada imagen dura exactamente lo que su narración
+        if len(clip_durations) == len(image_files):
+            durations = clip_durations
+        else:
+            durations = [s.duration for s in script.scenes]
         raw_video = os.path.join(job_dir, "raw_video.mp4")
         await self._create_image_slideshow(
-            image_files, script.scenes, raw_video, total_duration
+            image_files, durations, raw_video, total_duration
         )
 
-        # Paso 4: Agregar audio de narración al video
-        video_with_audio = os.path.join(job_dir, "with_audio.mp4")
-        await self._add_audio_to_video(raw_video, combined_audio, video_with_audio)
-
-        # Paso 5: Agregar subtítulos si se requieren
+        # Paso 4: Subtítulos (se queman por formato durante la exportación)
+        srt_path = None
         if add_subtitles and srt_content:
             srt_path = os.path.join(job_dir, "subtitles.srt")
             async with aiofiles.open(srt_path, "w", encoding="utf-8") as f:
                 await f.write(srt_content)
 
-            video_with_subs = os.path.join(job_dir, "with_subs.mp4")
-            await self._add_subtitles(video_with_audio, srt_path, video_with_subs)
-            current_video = video_with_subs
-        else:
-            current_video = video_with_audio
-
-        # Paso 6: Agregar música de fondo (si se seleccionó)
-        if music_genre != MusicGenre.NONE:
-            video_with_music = os.path.join(job_dir, "with_music.mp4")
-            await self._add_background_music(
-                current_video, music_genre, video_with_music
-            )
-            current_video = video_with_music
-
-        # Paso 7: Exportación final optimizada para Instagram
-        final_output = os.path.join(self.output_dir, f"{job_id}.mp4")
-        await self._export_final(current_video, final_output)
-
-        return final_output
+        # Paso 5: Exportación final optimizada para Instagram, un archivo por
+        # formato (solo los que no estaban en la caché)
+        await self._export_final(raw_video, mix_audio, pending, encoder, srt_path)
+        for fmt, path in pending.items():
+            await render_cache.store(fingerprint, fmt, path)
 
-    async def _concat_audio(self, audio_files: list[str], output: str) -> None:
-        """Concatena múltiples archivos de audio en uno."""
-        # Crear archivo de lista para FFmpeg
-        list_file = output.replace(".mp3", "_list.txt")
-        async with aiofiles.open(list_file, "w") as f:
-            for af in audio_files:
-                await f.write(f"file '{af}'\n")
+        return outputs
 
-        cmd = [
-            "ffmpeg", "-y",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", list_file,
-            "-c", "copy",
-            output
-        ]
-        await self._run_ffmpeg(cmd)
-
-    async def _get_duration(self, media_file: str) -> float:
-        """Obtiene la duración de un archivo de media."""
-        proc = await asyncio.create_subprocess_exec(
-            "ffprobe",
-            "-v", "quiet",
-            "-show_entries", "format=duration",
-            "-of", "csv=p=0",
-            media_file,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, _ = await proc.communicate()
-        try:
-            return float(stdout.decode().strip())
-        except ValueError:
-            return 30.0
+    def _render_options(
+        self,
+        add_subtitles: bool,
+        srt_content: str,
+        music_genre: MusicGenre,
+        music_manifest: Optional[dict],
+        export_profile: ExportProfile,
+        max_file_mb: Optional[int]
+    ) -> dict:
+        """Todo lo que, además del guion y los archivos, cambia el video final."""
+        return {
+            "subtitles": srt_content if add_subtitles else "",
+            "music_genre": music_genre.value,
+            # La pista normalizada depende de la fuente y de la sonoridad objetivo
+            "music": {
+                k: music_manifest[k]
+                for k in ("source_size", "source_mtime", "target_lufs")
+            } if music_manifest else None,
+            "ducking_db": settings.music_ducking_db,
+            "crossfade_ms": settings.audio_crossfade_ms,
+            "resolution": [self.width, self.height, self.fps],
+            "keyframe_seconds": settings.hls_segment_seconds,
+            "encoder": {
+                "profile": export_profile.value,
+                **self.EXPORT_PROFILES[export_profile],
+                "max_file_mb": max_file_mb,
+            },
+        }
+
+    def _encoder_settings(
+        self,
+        export_profile: ExportProfile,
+        max_file_mb: Optional[int],
+        duration: float
+    ) -> dict:
+        """
+        Parámetros de codificación del perfil. Con tamaño máximo, el tope de
+        bitrate de video se baja hasta que quepa el peor caso que permite el
+        VBV (tope x duración más el búfer entero), el audio y el contenedor,
+        para la duración real del reel. Si ni con MIN_VIDEO_KBPS cabe, se usa
+        ese mínimo y el resultado lo refleja (VideoOutput.within_max_size).
+        """
+        encoder = dict(self.EXPORT_PROFILES[export_profile])
+        if max_file_mb and duration > 0:
+            budget_kbits = max_file_mb * 8000 * (1 - self.CONTAINER_OVERHEAD)
+            video_kbps = int(
+                (budget_kbits - encoder["audio_kbps"] * duration)
+                / (duration + self.VBV_BUFFER_SECONDS)
+            )
+            if video_kbps < self.MIN_VIDEO_KBPS:
+                print(
+                    f"[Composer] {max_file_mb} MB no alcanza para {duration:.0f}s "
+                    f"(mínimo {min_file_mb(duration, export_profile):.1f} MB): "
+                    f"se usa {self.MIN_VIDEO_KBPS} kbps"
+                )
+            encoder["maxrate_kbps"] = max(
+                self.MIN_VIDEO_KBPS, min(encoder["maxrate_kbps"], video_kbps)
+            )
+        encoder["bufsize_kbps"] = encoder["maxrate_kbps"] * self.VBV_BUFFER_SECONDS
+        return encoder
 
     async def _create_image_slideshow(
         self,
         image_files: list[str],
-        scenes,
+        durations: list[float],
         output: str,
         total_duration: float
     ) -> None:
@@ -148,8 +259,7 @@ class VideoComposerService:
         if not image_files:
             raise ValueError("No hay imágenes para crear el video")
 
-        # Calcular duración de cada escena
-        durations = [s.duration for s in scenes]
+        # Si no hay una duración por imagen, repartir el total
         if len(durations) != len(image_files):
             per_image = total_duration / len(image_files)
             durations = [per_image] * len(image_files)
@@ -160,7 +270,12 @@ class VideoComposerService:
         concat_inputs = []
 
         for i, (img_path, duration) in enumerate(zip(image_files, durations)):
-            inputs.extend(["-loop", "1", "-t", str(duration), "-i", img_path])
+            if is_raw_frame(img_path):
+                # Fondo procedural: un fotograma RGB crudo repetido
+                inputs.extend(raw_input_args(img_path) +
+                              ["-stream_loop", "-1", "-t", str(duration), "-i", img_path])
+            else:
+                inputs.extend(["-loop", "1", "-t", str(duration), "-i", img_path])
 
             # Efecto Ken Burns: zoom in sutil
             zoom_filter = (
@@ -195,33 +310,116 @@ class VideoComposerService:
         )
         await self._run_ffmpeg(cmd)
 
-    async def _add_audio_to_video(
+    async def _encode_audio(self, wav: str, output: str, bitrate_kbps: int) -> None:
+        """Codifica la mezcla final a AAC (la única codificación de audio del pipeline)."""
+        await self._run_ffmpeg([
+            "ffmpeg", "-y",
+            "-i", wav,
+            "-c:a", "aac",
+            "-b:a", f"{bitrate_kbps}k",
+            "-ar", "44100",
+            output
+        ])
+
+    async def _export_final(
         self,
         video: str,
         audio: str,
-        output: str
+        outputs: dict[ReelFormat, str],
+        encoder: dict,
+        srt_path: Optional[str] = None
     ) -> None:
-        """Combina video e audio de narración."""
+        """
+        Exporta el video final optimizado para Instagram en cada formato.
+        Formato: H.264 (CRF con tope VBV del perfil) y AAC;
+        1080x1920 (9:16), 1080x1350 (4:5) o 1080x1080 (1:1).
+
+        Un solo FFmpeg decodifica el slideshow una vez y lo reparte con `split`:
+        cada rama recorta al centro, escala, quema subtítulos y se codifica.
+        El audio ya viene codificado y se copia tal cual en cada salida.
+        """
+        formats = list(outputs)
+        filter_parts = [
+            f"[0:v]split={len(formats)}" + "".join(f"[s{i}]" for i in range(len(formats)))
+        ]
+
+        for i, fmt in enumerate(formats):
+            out_w, out_h = self._format_size(fmt)
+            crop_w, crop_h = self._center_crop_size(out_w, out_h)
+
+            chain = f"[s{i}]crop={crop_w}:{crop_h},scale={out_w}:{out_h},setsar=1"
+            if srt_path:
+                chain += f",{self._subtitles_filter(srt_path)}"
+            filter_parts.append(f"{chain}[o{i}]")
+
         cmd = [
-            "ffmpeg", "-y",
-            "-i", video,
-            "-i", audio,
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            "-shortest",
-            output
+            "ffmpeg", "-y", "-i", video, "-i", audio,
+            "-filter_complex", ";".join(filter_parts)
         ]
+
+        for i, fmt in enumerate(formats):
+            cmd += [
+                "-map", f"[o{i}]",
+                "-map", "1:a",
+                "-c:v", "libx264",
+                "-preset", encoder["preset"],
+                "-crf", str(encoder["crf"]),
+                "-maxrate", f"{encoder['maxrate_kbps']}k",
+                "-bufsize", f"{encoder['bufsize_kbps']}k",
+                # Keyframes regulares: la vista previa HLS se corta sin recodificar
+                "-force_key_frames", f"expr:gte(t,n_forced*{settings.hls_segment_seconds})",
+                "-profile:v", "high",
+                "-level", "4.0",
+                "-c:a", "copy",
+                "-shortest",
+                "-movflags", "+faststart",  # Optimizado para streaming web
+                "-r", str(self.fps),
+                "-pix_fmt", "yuv420p",
+                outputs[fmt]
+            ]
+
         await self._run_ffmpeg(cmd)
 
-    async def _add_subtitles(
-        self,
-        video: str,
-        srt_path: str,
-        output: str
-    ) -> None:
+    async def probe_output(self, path: str, fallback_duration: float = 0.0) -> dict:
         """
-        Añade subtítulos estilo TikTok: texto grande, negrita, con sombra.
+        Tamaño, duración y bitrate real de un video exportado (ffprobe).
+        Si ffprobe falla se usa la duración estimada del guion.
+        """
+        size_bytes = os.path.getsize(path)
+        duration = fallback_duration
+        try:
+            output = await ffmpeg_output([
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "json",
+                path
+            ])
+            duration = float(json.loads(output)["format"]["duration"])
+        except (OSError, RuntimeError, ValueError, KeyError) as e:
+            print(f"[Composer] No se pudo medir {os.path.basename(path)}: {e}")
+
+        return {
+            "size_bytes": size_bytes,
+            "duration_seconds": round(duration, 2),
+            "bitrate_kbps": int(size_bytes * 8 / 1000 / duration) if duration > 0 else 0,
+        }
+
+    def _format_size(self, fmt: ReelFormat) -> tuple[int, int]:
+        """Tamaño de salida de un formato: mismo ancho que el master, alto par."""
+        aspect_w, aspect_h = self.FORMAT_ASPECTS[fmt]
+        out_h = min(self.height, self.width * aspect_h // aspect_w)
+        out_w = self.width if out_h < self.height else self.height * aspect_w // aspect_h
+        return out_w - out_w % 2, out_h - out_h % 2
+
+    def _center_crop_size(self, out_w: int, out_h: int) -> tuple[int, int]:
+        """Mayor recorte del master con la relación de aspecto de salida (pares)."""
+        crop_w = min(self.width, self.height * out_w // out_h)
+        crop_h = min(self.height, self.width * out_h // out_w)
+        return crop_w - crop_w % 2, crop_h - crop_h % 2
+
+    def _subtitles_filter(self, srt_path: str) -> str:
+        """
+        Filtro de subtítulos estilo TikTok: texto grande, negrita, con sombra.
         Usa el filtro subtitles de FFmpeg.
         """
         # Estilo de subtítulos: blanco, negrita, sombra negra, posición inferior-centro
@@ -241,88 +439,8 @@ class VideoComposerService:
         # Escapar la ruta del archivo SRT para FFmpeg
         srt_escaped = srt_path.replace("\\", "/").replace(":", "\\:")
 
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", video,
-            "-vf", f"subtitles={srt_escaped}:force_style='{subtitle_style}'",
-            "-c:a", "copy",
-            "-c:v", "libx264",
-            "-preset", "fast",
-            "-crf", "22",
-            output
-        ]
-        await self._run_ffmpeg(cmd)
-
-    async def _add_background_music(
-        self,
-        video: str,
-        music_genre: MusicGenre,
-        output: str
-    ) -> None:
-        """Mezcla música de fondo con el audio de narración."""
-        # Buscar archivo de música (incluido en el proyecto)
-        music_rel = self.MUSIC_FILES.get(music_genre)
-        music_path = os.path.join(
-            os.path.dirname(__file__), "..", "..", "assets", music_rel or ""
-        )
-
-        if not os.path.exists(music_path):
-            # Si no existe el archivo de música, copiar el video sin cambios
-            import shutil
-            shutil.copy(video, output)
-            return
-
-        # Mezclar: narración al 100%, música al 20% de volumen
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", video,
-            "-stream_loop", "-1",   # Loop infinito de música
-            "-i", music_path,
-            "-filter_complex",
-            "[1:a]volume=0.2[music];[0:a][music]amix=inputs=2:duration=first:dropout_transition=3[aout]",
-            "-map", "0:v",
-            "-map", "[aout]",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            "-shortest",
-            output
-        ]
-        await self._run_ffmpeg(cmd)
-
-    async def _export_final(self, video: str, output: str) -> None:
-        """
-        Exporta el video final optimizado para Instagram.
-        Formato: H.264, 1080x1920, AAC 192kbps.
-        """
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", video,
-            "-c:v", "libx264",
-            "-preset", "slow",       # Mayor compresión para menor tamaño
-            "-crf", "20",            # Alta calidad visual
-            "-profile:v", "high",
-            "-level", "4.0",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            "-ar", "44100",
-            "-movflags", "+faststart",  # Optimizado para streaming web
-            "-vf", f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease,pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2",
-            "-r", str(self.fps),
-            "-pix_fmt", "yuv420p",
-            output
-        ]
-        await self._run_ffmpeg(cmd)
+        return f"subtitles={srt_escaped}:force_style='{subtitle_style}'"
 
     async def _run_ffmpeg(self, cmd: list[str]) -> None:
-        """Ejecuta un comando FFmpeg de forma asíncrona."""
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        _, stderr = await proc.communicate()
-
-        if proc.returncode != 0:
-            error_msg = stderr.decode()
-            raise RuntimeError(f"FFmpeg error (código {proc.returncode}): {error_msg[-500:]}")
+        """Ejecuta un comando FFmpeg de forma asíncrona (cancelable con el trabajo)."""
+        await run_ffmpeg(cmd)
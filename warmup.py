@@ -0,0 +1,64 @@
+"""
+Calentamiento del proceso tras el arranque.
+Los SDK pesados (OpenAI, httpx, PIL) y los servicios del pipeline se
+importan en un hilo en segundo plano, para que el servidor responda de
+inmediato y el primer trabajo no pague el coste de importarlos.
+"""
+
+import time
+import asyncio
+import importlib
+from typing import Optional
+from app.services.metrics import metrics
+from app.services.executors import run_io
+
+
+# Módulos que el pipeline necesita, de más a menos pesados
+WARM_MODULES = (
+    "openai",
+    "httpx",
+    "PIL.Image",
+    "app.services.script_generator",
+    "app.services.tts_service",
+    "app.services.image_generator",
+    "app.services.video_composer",
+    "app.services.music_library",
+)
+
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def _import_all() -> float:
+    started = time.perf_counter()
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - started
+
+
+async def _run() -> None:
+    seconds = await run_io(_import_all)
+    metrics.set_gauge("warmup_seconds", round(seconds, 3))
+    print(f"[Warmup] Servicios cargados en {seconds:.2f}s")
+
+
+def start_warm_up() -> asyncio.Task:
+    """Lanza el calentamiento (una sola vez por proceso)."""
+    global _warmup_task
+    if _warmup_task is None:
+        _warmup_task = asyncio.create_task(_run(), name="warmup")
+    return _warmup_task
+
+
+async def warm_up() -> None:
+    """Espera a que el calentamiento termine (lo lanza si aún no empezó)."""
+    await asyncio.shield(start_warm_up())
+
+
+def is_ready() -> bool:
+    """True cuando los servicios ya están cargados."""
+    return (
+        _warmup_task is not None
+        and _warmup_task.done()
+        and not _warmup_task.cancelled()
+        and _warmup_task.exception() is None
+    )
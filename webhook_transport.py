@@ -0,0 +1,79 @@
+"""
+Transporte HTTP de los webhooks que solo conecta a direcciones públicas.
+El nombre del host se resuelve una vez, en el mismo paso que abre la
+conexión, y se conecta a la IP comprobada: un DNS que cambie de respuesta
+entre la comprobación y la conexión (DNS rebinding) no lleva a loopback ni
+a la red privada. TLS (SNI y certificado) y la cabecera Host siguen usando
+el nombre original.
+Se importa al hacer el primer envío, no al arrancar (httpx y httpcore).
+"""
+
+import socket
+import asyncio
+from typing import Iterable, Optional
+import httpx
+import httpcore
+from app.config import settings
+from app.services.webhooks import InternalHostError, is_internal_address
+
+
+class VettedNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Backend de red que resuelve, comprueba y conecta a la IP ya comprobada."""
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable] = None
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM),
+                timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise httpcore.ConnectError(f"No se pudo resolver {host}: {e}") from e
+
+        addresses = list(dict.fromkeys(sockaddr[0] for *_, sockaddr in infos))
+        if not settings.webhook_allow_private_hosts:
+            for address in addresses:
+                if is_internal_address(address):
+                    raise InternalHostError(
+                        f"callback_url resuelve a una dirección interna ({address})"
+                    )
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout,
+                    local_address=local_address, socket_options=socket_options
+                )
+            except httpcore.ConnectError as e:
+                error = e
+        raise error or httpcore.ConnectError(f"{host} sin direcciones")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        raise httpcore.ConnectError("Los webhooks no usan sockets Unix")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def vetted_transport(limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    """Transporte httpx normal cuyo pool conecta a través de VettedNetworkBackend."""
+    transport = httpx.AsyncHTTPTransport(limits=limits)
+    # httpx 0.27 no expone network_backend: se rehace su pool con el mismo TLS
+    transport._pool = httpcore.AsyncConnectionPool(
+        ssl_context=httpx.create_ssl_context(),
+        max_connections=limits.max_connections,
+        max_keepalive_connections=limits.max_keepalive_connections,
+        keepalive_expiry=limits.keepalive_expiry,
+        network_backend=VettedNetworkBackend()
+    )
+    return transport
@@ -0,0 +1,220 @@
+"""
+Entrega de webhooks cuando un trabajo termina o cambia de etapa.
+Un despachador en segundo plano envía cada evento a la callback_url del
+trabajo con un cliente HTTP compartido (pool de conexiones), firma el
+cuerpo con HMAC-SHA256 (webhook_secret) y reintenta con espera
+exponencial los fallos de red, 5xx y 429. Cada intento queda registrado
+en el WebhookDelivery del trabajo.
+
+Cabecera de firma: X-Reel-Signature: t=<unix>,v1=<hex>, donde <hex> es
+HMAC-SHA256(webhook_secret, "<unix>.<cuerpo>"). El receptor debe
+recalcularla y rechazar marcas de tiempo antiguas.
+
+Las callback_url a loopback, enlace local o redes privadas se rechazan al
+crear el trabajo y, al conectar, se comprueba la IP resuelta y se conecta a
+esa misma IP (webhook_transport), salvo con webhook_allow_private_hosts,
+para receptores de prueba locales.
+"""
+
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import ipaddress
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+from app.config import settings
+from app.models.reel import WebhookDelivery
+from app.services.metrics import metrics
+
+
+@dataclass
+class _Pending:
+    """Un evento por entregar con su registro en el trabajo."""
+    url: str
+    body: bytes
+    record: WebhookDelivery
+    on_update: Callable[[], None]
+
+
+def sign(body: bytes, timestamp: int, secret: str) -> str:
+    """Valor de la cabecera X-Reel-Signature para un cuerpo y un instante."""
+    digest = hmac.new(
+        secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+class InternalHostError(ValueError):
+    """La callback_url apunta (o resuelve) a una dirección interna."""
+
+
+def is_internal_address(address: str) -> bool:
+    """True si la IP no es pública (loopback, enlace local, privada, reservada...)."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not ip.is_global or ip.is_multicast
+
+
+def check_callback_url(url: str) -> None:
+    """
+    Lanza InternalHostError si la callback_url apunta a un host interno. Los
+    nombres DNS se comprueban al conectar (webhook_transport), con la IP
+    a la que de verdad se conecta.
+    """
+    if settings.webhook_allow_private_hosts:
+        return
+    host = (urlsplit(url).hostname or "").rstrip(".")
+    if not host:
+        raise InternalHostError("callback_url sin host")
+    if host == "localhost" or host.endswith(".localhost"):
+        raise InternalHostError("callback_url no puede apuntar a localhost")
+    try:
+        internal = is_internal_address(host)
+    except ValueError:
+        return  # Es un nombre, no una IP
+    if internal:
+        raise InternalHostError(f"callback_url no puede apuntar a una dirección interna ({host})")
+
+
+class WebhookDispatcher:
+    """
+    Cola de entregas atendida por webhook_workers tareas. Las esperas entre
+    reintentos no ocupan una tarea: el evento vuelve a la cola cuando toca.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._client = None   # httpx.AsyncClient, creado con el primer envío
+        self._retries: set[asyncio.TimerHandle] = set()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"webhook-{i}")
+            for i in range(settings.webhook_workers)
+        ]
+
+    async def stop(self, drain_seconds: float = 5.0) -> None:
+        """Espera un poco a que salgan los eventos en cola y cierra el cliente."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_seconds)
+        except asyncio.TimeoutError:
+            print(f"[Webhooks] {self._queue.qsize()} entregas sin enviar al cerrar")
+        for handle in self._retries:
+            handle.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._queue = None
+
+    def enqueue(
+        self,
+        url: str,
+        event: str,
+        payload: dict,
+        on_update: Callable[[], None] = lambda: None
+    ) -> WebhookDelivery:
+        """
+        Encola un evento. El registro devuelto se actualiza en cada intento
+        y se llama a `on_update` para que el trabajo publique el cambio.
+        """
+        record = WebhookDelivery(event=event, url=url)
+        if self._queue is None:
+            record.error = "Despachador de webhooks detenido"
+            return record
+
+        body = json.dumps(
+            {"event": event, "sent_at": datetime.utcnow().isoformat(), **payload},
+            ensure_ascii=False
+        ).encode()
+        self._queue.put_nowait(_Pending(url, body, record, on_update))
+        return record
+
+    def _get_client(self):
+        """Cliente HTTP compartido; httpx se importa aquí, fuera del arranque."""
+        if self._client is None:
+            import httpx
+            from app.services.webhook_transport import vetted_transport
+            self._client = httpx.AsyncClient(
+                timeout=settings.webhook_timeout_seconds,
+                transport=vetted_transport(
+                    httpx.Limits(max_connections=settings.webhook_workers * 2)
+                ),
+                follow_redirects=False,
+                trust_env=False   # Sin proxies del entorno: resolverían el host por su cuenta
+            )
+        return self._client
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                print(f"[Webhooks] Error inesperado entregando {item.record.event}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: _Pending) -> None:
+        import httpx
+        record = item.record
+        record.attempts += 1
+
+        headers = {"Content-Type": "application/json", "User-Agent": "reel-ai-webhooks/1.0"}
+        if settings.webhook_secret:
+            headers["X-Reel-Signature"] = sign(item.body, int(time.time()), settings.webhook_secret)
+
+        retry = True
+        try:
+            check_callback_url(item.url)
+            response = await self._get_client().post(item.url, content=item.body, headers=headers)
+            record.status_code = response.status_code
+            record.error = None if response.is_success else f"HTTP {response.status_code}"
+            retry = response.status_code >= 500 or response.status_code == 429
+        except InternalHostError as e:
+            record.error = str(e)
+            retry = False
+        except (httpx.HTTPError, OSError) as e:
+            record.error = f"{type(e).__name__}: {e}"
+
+        if record.error is None:
+            record.delivered = True
+            record.delivered_at = datetime.utcnow().isoformat()
+            metrics.increment("webhook_deliveries", result="delivered")
+        elif retry and record.attempts < settings.webhook_max_attempts:
+            delay = min(
+                settings.webhook_backoff_max_seconds,
+                settings.webhook_backoff_base_seconds * 2 ** (record.attempts - 1)
+            )
+            self._schedule_retry(item, delay)
+            metrics.increment("webhook_deliveries", result="retry")
+        else:
+            print(f"[Webhooks] Entrega de {record.event} a {item.url} abandonada: {record.error}")
+            metrics.increment("webhook_deliveries", result="failed")
+        item.on_update()
+
+    def _schedule_retry(self, item: _Pending, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+
+        def requeue() -> None:
+            self._retries.discard(handle)
+            if self._queue is not None:
+                self._queue.put_nowait(item)
+
+        handle = loop.call_later(delay, requeue)
+        self._retries.add(handle)
+
+
+# Instancia global (se arranca en el lifespan de la app)
+webhook_dispatcher = WebhookDispatcher()